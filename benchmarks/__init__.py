@@ -0,0 +1,44 @@
+import sys
+import timeit
+
+__doc__ = """
+Micro benchmarks for the hot paths of a transform.
+
+Each module can be run on its own, for example::
+
+    python -m benchmarks.survey_model
+
+They print their results and are not part of the test suite.
+"""
+
+
+def deep_size(*objects):
+    """Return the total size of `objects` and everything they refer to, counting shared objects once."""
+    seen = set()
+    stack = list(objects)
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+def time_per_call(fn, number=1000, repeat=5):
+    """Return the best time per call of `fn`, in microseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def report(title, rows):
+    """Print a titled table of `(name, value)` rows."""
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, value in rows:
+        print(f"  {name:<{width}}  {value}")
@@ -0,0 +1,37 @@
+import datetime
+
+import arrow
+import dateutil.parser
+
+from benchmarks import report, time_per_call
+from transform.utilities.dates import LOCALISED_FORMAT, LONG_FORMAT, format_datetime, parse_datetime
+
+SUBMITTED_AT = "2016-03-12T10:39:40.123456+00:00"
+
+
+def main():
+    now = datetime.datetime.utcnow()
+    assert arrow.get(SUBMITTED_AT).to("Europe/London").format("DD MMMM YYYY HH:mm:ss") == \
+        format_datetime(SUBMITTED_AT, LOCALISED_FORMAT)
+    assert dateutil.parser.parse(SUBMITTED_AT) == parse_datetime(SUBMITTED_AT)
+
+    report(f"Localised date: {SUBMITTED_AT}", [
+        ("arrow (us)", round(time_per_call(
+            lambda: arrow.get(SUBMITTED_AT).to("Europe/London").format("DD MMMM YYYY HH:mm:ss")), 2)),
+        ("uncached (us)", round(time_per_call(
+            lambda: format_datetime(parse_datetime.__wrapped__(SUBMITTED_AT), LOCALISED_FORMAT)), 2)),
+        ("cached (us)", round(time_per_call(lambda: format_datetime(SUBMITTED_AT, LOCALISED_FORMAT)), 2)),
+    ])
+    report("Index date: datetime.utcnow()", [
+        ("arrow (us)", round(time_per_call(lambda: arrow.get(now).to("Europe/London").format("DD/MM/YYYY HH:mm:ss")), 2)),
+        ("format_datetime (us)", round(time_per_call(lambda: format_datetime(now, LONG_FORMAT)), 2)),
+    ])
+    report(f"Submission date: {SUBMITTED_AT}", [
+        ("dateutil (us)", round(time_per_call(lambda: dateutil.parser.parse(SUBMITTED_AT)), 2)),
+        ("uncached (us)", round(time_per_call(lambda: parse_datetime.__wrapped__(SUBMITTED_AT)), 2)),
+        ("cached (us)", round(time_per_call(lambda: parse_datetime(SUBMITTED_AT)), 2)),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import json
+import subprocess
+
+from benchmarks import report, time_per_call
+from benchmarks.pdf import answer_everything
+from transform import settings
+from transform.transformers.pdf_transformer import PDFTransformer
+from transform.transformers.rasterisers import PROFILES, RASTERISERS, PillowRasteriser
+from transform.transformers.rasterisers.command import memory_file
+from transform.transformers.rasterisers.pillow import render_page
+from transform.transformers.rasterisers.pool import RasteriserPool
+
+SURVEYS = ["134.0005", "144.0001"]
+
+
+def make_images(rasteriser, pdf_transformer, profile=PROFILES["default"]):
+    page_count, images = rasteriser.images(pdf_transformer, profile)
+    return page_count, [len(image) for image in images]
+
+
+def pipe_handoff(pdf_transformer):
+    """Pass the PDF down a pipe, as to pdftoppm, with `wc` standing in for it."""
+    pdf, _ = pdf_transformer.render_pages()
+    subprocess.Popen(["wc", "-c"], stdin=subprocess.PIPE, stdout=subprocess.PIPE).communicate(pdf)
+
+
+def file_handoff(pdf_transformer):
+    """Pass the PDF as an in-memory file, as to pdftoppm, with `wc` standing in for it."""
+    with memory_file() as pdf_file:
+        pdf_transformer.write_pages(pdf_file)
+        fd = pdf_file.fileno()
+        subprocess.run(["wc", "-c", "/dev/fd/{0}".format(fd)], pass_fds=(fd,), stdout=subprocess.PIPE)
+
+
+def main():
+    pool = RasteriserPool(settings.IMAGE_PARALLELISM, render_page)
+    for name in SURVEYS:
+        with open(f"./transform/surveys/{name}.json") as fh:
+            survey = json.load(fh)
+        pdf_transformer = PDFTransformer(survey, answer_everything(survey))
+
+        rows = []
+        for backend, rasteriser_class in sorted(RASTERISERS.items()):
+            if not rasteriser_class.available():
+                rows.append((f"{backend} (ms)", "not installed"))
+                continue
+            rasteriser = rasteriser_class()
+            page_count, sizes = make_images(rasteriser, pdf_transformer)
+            rows.append((f"{backend} (ms)", round(time_per_call(
+                lambda: make_images(rasteriser, pdf_transformer), number=1, repeat=3) / 1000, 1)))
+            rows.append((f"{backend} size (bytes)", sum(sizes)))
+            if backend == "pdftoppm":
+                settings.IMAGE_HANDOFF, handoff = "file", settings.IMAGE_HANDOFF
+                rows.append((f"{backend}, file handoff (ms)", round(time_per_call(
+                    lambda: make_images(rasteriser, pdf_transformer), number=1, repeat=3) / 1000, 1)))
+                settings.IMAGE_HANDOFF = handoff
+
+        for handoff in (pipe_handoff, file_handoff):
+            rows.append((f"{handoff.__name__}, PDF only (ms)", round(time_per_call(
+                lambda: handoff(pdf_transformer), number=5, repeat=3) / 1000, 1)))
+
+        rasteriser = PillowRasteriser(pool)
+        rows.append((f"pillow, {pool.size} pooled workers (ms)", round(time_per_call(
+            lambda: make_images(rasteriser, pdf_transformer), number=1, repeat=3) / 1000, 1)))
+        report(f"Images for {name} ({page_count} pages)", rows)
+    report("Rasteriser pool", sorted(pool.stats().items()))
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import json
+
+from benchmarks import report, time_per_call
+from transform.transformers.pdf_transformer import PDFTransformer
+
+SURVEYS = ["007.0009", "144.0001", "134.0005"]
+
+
+def answer_everything(survey):
+    """Return a response answering every question in `survey`."""
+    return {
+        "tx_id": "0f534ffc-9442-414c-b39f-a756b4adc6cb",
+        "survey_id": survey["survey_id"],
+        "submitted_at": "2017-03-01T14:25:46.101447+00:00",
+        "collection": {"instrument_id": survey["form_type"], "period": "201605"},
+        "metadata": {"user_id": "K5O86M2NU1", "ru_ref": "12346789012A"},
+        "data": {
+            question["question_id"]: "Answer to question {0}".format(question["question_id"])
+            for question_group in survey["question_groups"]
+            for question in question_group["questions"]
+        },
+    }
+
+
+def main():
+    for name in SURVEYS:
+        with open(f"./transform/surveys/{name}.json") as fh:
+            survey = json.load(fh)
+        response = answer_everything(survey)
+        transformer = PDFTransformer(survey, response)
+        pdf, pages = transformer.render_pages()
+        report(f"PDF for {name} ({len(response['data'])} answers, {pages} pages)", [
+            ("get_elements (ms)", round(time_per_call(transformer.get_elements, number=10) / 1000, 2)),
+            ("render_pages (ms)", round(time_per_call(transformer.render_pages, number=10) / 1000, 2)),
+        ])
+
+
+if __name__ == "__main__":
+    main()
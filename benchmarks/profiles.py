@@ -0,0 +1,33 @@
+import json
+
+from benchmarks import report, time_per_call
+from benchmarks.images import make_images
+from benchmarks.pdf import answer_everything
+from transform.transformers.pdf_transformer import PDFTransformer
+from transform.transformers.rasterisers import PROFILES, RASTERISERS
+
+SURVEYS = ["134.0005", "144.0001"]
+
+
+def main():
+    for name in SURVEYS:
+        with open(f"./transform/surveys/{name}.json") as fh:
+            survey = json.load(fh)
+        pdf_transformer = PDFTransformer(survey, answer_everything(survey))
+
+        for backend, rasteriser_class in sorted(RASTERISERS.items()):
+            if not rasteriser_class.available():
+                report(f"{backend} profiles for {name}", [("all", "not installed")])
+                continue
+            rasteriser = rasteriser_class()
+            rows = []
+            for profile_name, profile in sorted(PROFILES.items()):
+                page_count, sizes = make_images(rasteriser, pdf_transformer, profile)
+                rows.append((f"{profile_name} (ms)", round(time_per_call(
+                    lambda: make_images(rasteriser, pdf_transformer, profile), number=1, repeat=3) / 1000, 1)))
+                rows.append((f"{profile_name} size (bytes)", sum(sizes)))
+            report(f"{backend} profiles for {name} ({page_count} pages)", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import glob
+import json
+
+from benchmarks import deep_size, report, time_per_call
+from transform.transformers.survey import Survey
+from transform.transformers.survey_registry import CompiledSurvey, DefinitionInterner
+
+
+def walk_dicts(definitions):
+    count = 0
+    for definition in definitions:
+        for question_group in definition['question_groups']:
+            if 'title' not in question_group:
+                continue
+            for question in question_group['questions']:
+                if 'text' in question and question['question_id'] and question.get('type'):
+                    count += 1
+    return count
+
+
+def walk_models(models):
+    count = 0
+    for model in models:
+        for question_group in model.question_groups:
+            if question_group.title is None:
+                continue
+            for question in question_group.questions:
+                if question.text is not None and question.question_id and question.type:
+                    count += 1
+    return count
+
+
+def main():
+    file_names = sorted(glob.glob(Survey.file_pattern.format(survey_id="*", inst_id="*")))
+    raw = []
+    for file_name in file_names:
+        with open(file_name) as fh:
+            raw.append(json.load(fh))
+
+    # Load the definitions as the registry does, which keeps the question groups only in the model
+    interner = DefinitionInterner()
+    interned = [interner.intern(definition) for definition in raw]
+    compiled = [CompiledSurvey(definition, interner) for definition in interned]
+    headers = [c.definition for c in compiled]
+    models = [c.model for c in compiled]
+    assert walk_dicts(interned) == walk_models(models)
+
+    interned_size = deep_size(*interned)
+    retained_size = deep_size(*headers, *models)
+    report(f"Survey definitions ({len(raw)} files)", [
+        ("parsed dicts (bytes)", deep_size(*raw)),
+        ("interned dicts (bytes)", interned_size),
+        ("interned dicts + model, as once retained (bytes)", deep_size(*interned, *models)),
+        ("headers + model, as retained (bytes)", retained_size),
+        ("saved against the interned dicts (bytes)", interned_size - retained_size),
+        ("walk dicts (us)", round(time_per_call(lambda: walk_dicts(interned), number=20), 1)),
+        ("walk models (us)", round(time_per_call(lambda: walk_models(models), number=20), 1)),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+from benchmarks import report, time_per_call
+from transform.utilities.dates import _parse_known_format, _parse_with_strptime, parse_timestamp
+
+VALUES = [
+    ("utc", "2017-01-11T17:18:53Z"),
+    ("offset", "2017-01-11T17:18:53.020222+00:00"),
+    ("naive", "2017-01-11T17:18:53"),
+    ("iso date", "2017-01-11"),
+    ("diary date", "11/07/2017"),
+    ("period", "201605"),
+]
+
+
+def main():
+    for name, value in VALUES:
+        assert _parse_known_format(value) == _parse_with_strptime(value)
+        report(f"{name}: {value}", [
+            ("strptime chain (us)", round(time_per_call(lambda: _parse_with_strptime(value)), 2)),
+            ("uncached (us)", round(time_per_call(lambda: parse_timestamp.__wrapped__(value)), 2)),
+            ("cached (us)", round(time_per_call(lambda: parse_timestamp(value)), 2)),
+        ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import json
+import os
+import time
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from benchmarks import report, time_per_call
+from benchmarks.pdf import answer_everything
+from transform.transformers.in_memory_zip import COMPRESSION, InMemoryZip, StreamingZip, compression_policy
+from transform.transformers.pdf_transformer import PDFTransformer
+from transform.transformers.rasterisers import PillowRasteriser
+
+ENTRY_COUNTS = [1, 10, 100]
+
+#: Small entries, where the cost of opening the zip shows, and roughly the size of a page image.
+ENTRY_SIZES = [1024, 60 * 1024]
+
+
+def reopening_zip(entries):
+    """Build the zip as InMemoryZip used to, opening it again for every entry."""
+    buffer = BytesIO()
+    for name, contents in entries:
+        zf = ZipFile(buffer, "a", ZIP_DEFLATED, False)
+        zf.writestr(name, contents)
+        zf.close()
+    return buffer
+
+
+def single_open_zip(entries, policy=None, executor=False):
+    in_memory_zip = InMemoryZip(policy, executor)
+    for name, contents, *kind in entries:
+        in_memory_zip.append(name, contents, *kind)
+    in_memory_zip.rewind()
+    return in_memory_zip.in_memory_zip
+
+
+def submission_entries(survey_id="134.0005"):
+    """Return the files of the zip for a submission answering every question of a survey."""
+    with open(f"./transform/surveys/{survey_id}.json") as fh:
+        survey = json.load(fh)
+    response = answer_everything(survey)
+    _, images = PillowRasteriser().images(PDFTransformer(survey, response))
+    entries = [("Images/S{0:09}.JPG".format(i), image, "image") for i, image in enumerate(images)]
+    entries.append(("Index/index.csv", "\n".join(name for name, *_ in entries), "index"))
+    entries.append(("QData/pck", "\n".join("{0:04} {1}".format(i, i * 7) for i in range(200)), "data"))
+    entries.append(("QJson/response.json", json.dumps(response), "json"))
+    return survey_id, entries
+
+
+def first_byte(survey_id, streaming):
+    """Return the milliseconds until the first byte of a submission's zip could be sent, and its peak memory."""
+    with open(f"./transform/surveys/{survey_id}.json") as fh:
+        survey = json.load(fh)
+    start = time.perf_counter()
+    _, images = PillowRasteriser().images(PDFTransformer(survey, answer_everything(survey)))
+    zip_file = StreamingZip() if streaming else InMemoryZip()
+    first = None
+    for i, image in enumerate(images):
+        zip_file.append("Images/S{0:09}.JPG".format(i), image, "image")
+        # A streamed zip sends each image once it is written
+        if streaming and zip_file.take() and first is None:
+            first = time.perf_counter()
+    if streaming:
+        zip_file.close()
+    else:
+        zip_file.rewind()
+        first = time.perf_counter()
+    return round((first - start) * 1000, 1), zip_file.stats()["zip_peak_memory_bytes"]
+
+
+def main():
+    for size in ENTRY_SIZES:
+        # Random bytes do not compress, like the JPEG pages which make up most of a zip
+        contents = os.urandom(size)
+        for count in ENTRY_COUNTS:
+            entries = [("EDC_QImages/Images/S{0:09}.JPG".format(i), contents) for i in range(count)]
+            assert ZipFile(reopening_zip(entries)).namelist() == ZipFile(single_open_zip(entries)).namelist()
+            number = max(1, 100 // count)
+            report(f"Zip of {count} entries of {size} bytes", [
+                ("reopening (ms)", round(time_per_call(lambda: reopening_zip(entries), number=number) / 1000, 2)),
+                ("single open (ms)", round(time_per_call(lambda: single_open_zip(entries), number=number) / 1000, 2)),
+            ])
+
+    survey_id, entries = submission_entries()
+    rows = []
+    policies = [
+        ("deflate everything", {}),
+        ("ZIP_COMPRESSION", COMPRESSION),
+        ("stored images", dict(COMPRESSION, **compression_policy({"image": "stored"}))),
+    ]
+    for name, policy in policies:
+        rows.append((f"{name} (ms)", round(time_per_call(lambda: single_open_zip(entries, policy), number=10) / 1000, 2)))
+        rows.append((f"{name} (bytes)", single_open_zip(entries, policy).seek(0, 2)))
+    report(f"Zip of a submission to {survey_id} ({len(entries)} files)", rows)
+
+    survey_id, entries = submission_entries("144.0001")
+    rows = []
+    for threads in (1, 2, 4):
+        executor = ThreadPoolExecutor(threads) if threads > 1 else False
+        rows.append((f"{threads} thread(s) (ms)", round(time_per_call(
+            lambda: single_open_zip(entries, executor=executor), number=5) / 1000, 2)))
+    report(f"Zip of a submission to {survey_id} ({len(entries)} files) on {os.cpu_count()} CPU(s)", rows)
+
+    for survey_id in ("134.0005", "144.0001"):
+        rows = []
+        for name, streaming in (("in memory", False), ("streaming", True)):
+            ttfb, peak = first_byte(survey_id, streaming)
+            rows.append((f"{name}, first byte (ms)", ttfb))
+            rows.append((f"{name}, peak zip memory (bytes)", peak))
+        report(f"Sending the zip of a submission to {survey_id}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import gc
+import os
+
+# Load the app, and with it every survey definition, once in the master process.
+# Forked workers then share those pages instead of each parsing its own copy.
+preload_app = os.getenv("PRELOAD_APP", "false").lower() == "true"
+
+
+def when_ready(server):
+    """Move everything loaded so far out of reach of the garbage collector.
+
+    A collection in a worker would otherwise write to the header of every shared
+    object and copy its page into that worker.
+    """
+    if preload_app and hasattr(gc, "freeze"):
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    """Start the rasteriser pool and survey watcher in each worker, as neither survives the fork,
+    and choose its image backend before it takes requests.
+
+    The pool is started first, so its processes are forked before the watcher's thread runs.
+    """
+    if preload_app:
+        from transform import choose_image_backend, start_rasteriser_pool, start_survey_watcher
+        start_rasteriser_pool()
+        choose_image_backend()
+        start_survey_watcher()
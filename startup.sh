@@ -9,5 +9,6 @@ if [ "$SDX_DEV_MODE" = true ]
 then
     python3 server.py
 else
-    gunicorn -b 0.0.0.0:$PORT server:app
+    export PRELOAD_APP=${PRELOAD_APP:-true}
+    gunicorn -c gunicorn.conf.py -b 0.0.0.0:$PORT server:app
 fi
\ No newline at end of file
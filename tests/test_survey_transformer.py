@@ -5,6 +5,7 @@ import io
 import json
 import os
 import unittest
+from unittest import mock
 import zipfile
 import dateutil
 
@@ -173,3 +174,42 @@ class TestSurveyTransformer(unittest.TestCase):
             modified_csv = list(csv.reader(io.StringIO(modified_content)))
 
             self.assertEqual(expected_csv, modified_csv)
+
+
+class TestStreamZip(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = get_file_as_dict("./tests/pck/common_software/023.0203.json")
+        self.made = []
+
+        def pages():
+            for i in range(3):
+                self.made.append(i)
+                yield "page {0}".format(i).encode()
+
+        self.rasteriser = mock.Mock()
+        self.rasteriser.name = "fake"
+        self.rasteriser.images.side_effect = lambda *args: (3, pages())
+
+    def transformer(self):
+        with mock.patch("transform.transformers.image_transformer.get_rasteriser", return_value=self.rasteriser):
+            return get_transformer(self.payload, 1000)
+
+    def test_streamed_zip_has_the_files_of_the_zip(self):
+        zip_file = zipfile.ZipFile(self.transformer().get_zip())
+        streamed = zipfile.ZipFile(io.BytesIO(b"".join(self.transformer().stream_zip())))
+
+        self.assertEqual(streamed.namelist(), zip_file.namelist())
+        for name in zip_file.namelist():
+            if not name.endswith(".csv"):
+                self.assertEqual(streamed.read(name), zip_file.read(name))
+
+    def test_pages_are_sent_as_they_are_made(self):
+        chunks = self.transformer().stream_zip()
+
+        first = next(chunks)
+
+        self.assertEqual(self.made, [0])
+        self.assertIn(b"_1.JPG", first)
+        self.assertIn(b"_2.JPG", next(chunks))
+        self.assertEqual(self.made, [0, 1])
@@ -1,8 +1,10 @@
 import json
 import os
 import unittest
+from unittest import mock
 
 from transform import app
+from transform.transformers.rasterisers.limits import RasteriserBusy
 
 
 def get_file_as_string(filename):
@@ -46,6 +48,60 @@ class TestTransformService(unittest.TestCase):
 
         self.assertEqual(r.status_code, 400)
 
+    def test_rasteriser_busy(self):
+        payload = get_file_as_string("./tests/pck/common_software/023.0203.json")
+
+        with mock.patch("transform.views.main.get_transformer", side_effect=RasteriserBusy("images:busy")):
+            r = self.app.post(self.transform_endpoint, data=payload)
+
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(json.loads(r.data.decode('UTF-8'))['message'], 'Service unavailable: images:busy')
+
+    def test_streaming(self):
+        payload = get_file_as_string("./tests/pck/common_software/023.0203.json")
+        transformer = mock.Mock()
+        transformer.stream_zip.return_value = iter([b"PK first", b"PK last"])
+
+        with mock.patch("transform.views.main.get_transformer", return_value=transformer):
+            with mock.patch("transform.settings.ZIP_STREAMING", True):
+                r = self.app.post(self.transform_endpoint, data=payload)
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, "application/zip")
+        self.assertEqual(r.data, b"PK firstPK last")
+        transformer.get_zip.assert_not_called()
+
+    def test_streaming_rasteriser_busy(self):
+        payload = get_file_as_string("./tests/pck/common_software/023.0203.json")
+        transformer = mock.Mock()
+
+        def stream_zip():
+            raise RasteriserBusy("images:busy")
+            yield
+
+        transformer.stream_zip.side_effect = stream_zip
+
+        with mock.patch("transform.views.main.get_transformer", return_value=transformer):
+            with mock.patch("transform.settings.ZIP_STREAMING", True):
+                r = self.app.post(self.transform_endpoint, data=payload)
+
+        self.assertEqual(r.status_code, 503)
+
+    def test_metrics(self):
+        r = self.app.get("/metrics")
+
+        self.assertEqual(r.status_code, 200)
+        self.assertIn("wait_mean_ms", json.loads(r.data.decode('UTF-8'))['rasteriser'])
+        self.assertNotIn("rasteriser_pool", json.loads(r.data.decode('UTF-8')))
+
+    def test_metrics_of_the_pool(self):
+        pool = mock.Mock()
+        pool.stats.return_value = {"jobs": 3}
+        with mock.patch("transform.views.main.get_pool", return_value=pool):
+            r = self.app.get("/metrics")
+
+        self.assertEqual(json.loads(r.data.decode('UTF-8'))['rasteriser_pool'], {"jobs": 3})
+
     def test_invalid_survey_id(self):
         # Create an invalid survey id payload
         payload_str = get_file_as_string("./tests/pck/common_software/023.0203.json")
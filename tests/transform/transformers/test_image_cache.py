@@ -0,0 +1,116 @@
+import copy
+import json
+import logging
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from structlog import wrap_logger
+
+from transform.transformers.image_cache import ImageCache, image_key, pack_images, unpack_images
+from transform.transformers.image_transformer import ImageTransformer
+from transform.transformers.rasterisers import PROFILES
+
+
+class ImageCacheTests(unittest.TestCase):
+
+    def test_miss_then_hit(self):
+        cache = ImageCache(100)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", [b"12345", b"678"])
+        self.assertEqual(cache.get("a"), [b"12345", b"678"])
+        self.assertEqual(cache.stats(), {
+            "hits": 1, "misses": 1, "hit_rate": 0.5, "bytes_saved": 8, "entries": 1, "bytes": 8,
+        })
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ImageCache(10)
+        cache.put("a", [b"1234"])
+        cache.put("b", [b"1234"])
+        cache.get("a")
+        cache.put("c", [b"1234"])
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), [b"1234"])
+        self.assertEqual(cache.stats()["bytes"], 8)
+
+    def test_images_larger_than_the_cache_are_not_kept(self):
+        cache = ImageCache(4)
+        cache.put("a", [b"12345"])
+        self.assertEqual(len(cache), 0)
+
+    def test_disk_tier(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ImageCache(0, directory, 100).put("a", [b"page"])
+            cache = ImageCache(100, directory, 100)
+            self.assertEqual(cache.get("a"), [b"page"])
+            # Now also held in memory
+            self.assertEqual(len(cache), 1)
+
+    def test_disk_tier_is_pruned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ImageCache(0, directory, 1)
+            cache.put("a", [b"page"])
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_disk_tier_is_only_scanned_when_it_may_be_full(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch("os.scandir", side_effect=os.scandir) as scandir:
+            cache = ImageCache(0, directory, 100)
+            for key in "abc":
+                cache.put(key, [b"page"])
+            self.assertEqual(scandir.call_count, 1)
+            cache.put("d", [bytes(50)])
+            self.assertEqual(scandir.call_count, 2)
+            self.assertEqual(sorted(os.listdir(directory)), ["c.images", "d.images"])
+
+    def test_files_are_not_unpickled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.images"), "wb") as fh:
+                pickle.dump([b"page"], fh)
+            self.assertIsNone(ImageCache(0, directory, 100).get("a"))
+
+    def test_packed_images(self):
+        images = [b"\xff\xd8page one", b"", b"page three"]
+        data = pack_images(images)
+        self.assertEqual(unpack_images(data), images)
+        for broken in (data[:-1], data + b"x", data[:10], b"not images"):
+            with self.assertRaises(ValueError):
+                unpack_images(broken)
+
+
+class ImageKeyTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./tests/data/eq-mwss.json") as fb:
+            self.response = json.load(fb)
+        with open("./tests/data/134.0005.json") as fb:
+            self.survey = json.load(fb)
+
+    def test_key(self):
+        key = image_key(self.survey, self.response, "pillow", PROFILES["default"])
+        reordered = dict(reversed(list(copy.deepcopy(self.response).items())))
+        self.assertEqual(image_key(self.survey, reordered, "pillow", PROFILES["default"]), key)
+
+        self.assertNotEqual(image_key(self.survey, self.response, "pdftoppm", PROFILES["default"]), key)
+        self.assertNotEqual(image_key(self.survey, self.response, "pillow", PROFILES["grey"]), key)
+        changed = copy.deepcopy(self.response)
+        changed["data"]["50"] = "changed"
+        self.assertNotEqual(image_key(self.survey, changed, "pillow", PROFILES["default"]), key)
+
+    def test_repeated_submission_is_not_rasterised_again(self):
+        log = wrap_logger(logging.getLogger(__name__))
+        rasteriser = mock.Mock()
+        rasteriser.name = "fake"
+        rasteriser.images.return_value = (2, iter([b"page 1", b"page 2"]))
+        cache = ImageCache(1000)
+
+        for _ in range(2):
+            transformer = ImageTransformer(log, self.survey, self.response, rasteriser=rasteriser, cache=cache)
+            transformer.get_zipped_images()
+
+        rasteriser.images.assert_called_once()
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["bytes_saved"], 12)
+        self.assertEqual(len(transformer.zip.get_filenames()), 3)
@@ -4,8 +4,10 @@ import json
 import logging
 import time
 import unittest
+from unittest import mock
 from structlog import wrap_logger
 from transform.transformers.image_transformer import ImageTransformer
+from transform.transformers.rasterisers import PROFILES
 
 
 class ImageTransformTests(unittest.TestCase):
@@ -42,3 +44,8 @@ class ImageTransformTests(unittest.TestCase):
         img_tfr2 = ImageTransformer(self.log, self.survey, self.reply)
 
         self.assertNotEqual(img_tfr1.current_time, img_tfr2.current_time)
+
+    @mock.patch("transform.settings.IMAGE_SURVEY_PROFILES", {"134": "compact"})
+    def test_profile_for_survey(self):
+        img_tfr = ImageTransformer(self.log, self.survey, self.reply)
+        self.assertEqual(img_tfr.profile, PROFILES["compact"])
@@ -1,7 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import os
+import threading
 import unittest
+from unittest import mock
 import zipfile
+import zlib
 
-from transform.transformers.in_memory_zip import InMemoryZip
+from gunicorn.util import has_fileno
+
+from transform.transformers.in_memory_zip import InMemoryZip, StreamingZip, ZipBuffer, compression_policy, memory_in_use
 
 
 class InMemoryZipTests(unittest.TestCase):
@@ -49,3 +57,182 @@ class InMemoryZipTests(unittest.TestCase):
         file_content = z.open(file_name).read().decode('utf-8')
 
         self.assertEqual(file_content, self.test_data)
+
+    def test_append_after_reading_adds_to_the_zip(self):
+        sut = InMemoryZip()
+        sut.append("first", self.test_data)
+        sut.rewind()
+        sut.append("second", "more")
+
+        z = zipfile.ZipFile(sut.in_memory_zip)
+
+        self.assertEqual(z.namelist(), ["first", "second"])
+        self.assertEqual(z.read("first").decode("utf-8"), self.test_data)
+        self.assertEqual(z.read("second"), b"more")
+
+    def test_zip_is_opened_once_for_all_appends(self):
+        sut = InMemoryZip()
+        with mock.patch("transform.transformers.in_memory_zip.ZipFile", wraps=zipfile.ZipFile) as zip_file:
+            for i in range(10):
+                sut.append("file_{0}".format(i), self.test_data)
+            sut.rewind()
+
+        self.assertEqual(zip_file.call_count, 1)
+        self.assertEqual(len(zipfile.ZipFile(sut.in_memory_zip).namelist()), 10)
+
+    def test_files_are_compressed_by_kind(self):
+        sut = InMemoryZip(compression_policy({"image": "stored", "json": "9"}))
+        sut.append("page.JPG", b"\xFF\xD8" + bytes(1000), kind="image")
+        sut.append("response.json", self.test_data, kind="json")
+        sut.append("other", self.test_data)
+
+        z = zipfile.ZipFile(sut.in_memory_zip)
+
+        self.assertEqual([info.compress_type for info in z.infolist()],
+                         [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_DEFLATED])
+        self.assertEqual(z.read("page.JPG"), b"\xFF\xD8" + bytes(1000))
+        self.assertEqual(z.read("response.json").decode("utf-8"), self.test_data)
+
+    def test_stats_count_the_bytes_saved(self):
+        sut = InMemoryZip(compression_policy({"image": "stored"}))
+        sut.append("page.JPG", bytes(1000), kind="image")
+        sut.append("response.json", self.test_data, kind="json")
+
+        stats = sut.stats()
+
+        compressed = sum(info.compress_size for info in zipfile.ZipFile(sut.in_memory_zip).infolist())
+        self.assertEqual(stats["zip_bytes"], compressed)
+        self.assertEqual(stats["zip_bytes_saved"], 1000 + len(self.test_data.encode("utf-8")) - compressed)
+        self.assertGreater(stats["zip_bytes_saved"], 0)
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            compression_policy({"image": "lzma"})
+        with self.assertRaises(ValueError):
+            compression_policy({"image": "10"})
+
+    def test_files_compressed_on_threads_are_written_as_zipfile_writes_them(self):
+        policy = compression_policy({"image": "stored", "data": "1", "json": "9"})
+        files = [("page.JPG", os.urandom(5000), "image"), ("pck", "0001 1\n" * 500, "data"),
+                 ("response.json", self.test_data, "json"), ("other", self.test_data * 3, None)]
+
+        expected = BytesIO()
+        with mock.patch("time.time", return_value=1500000000):
+            with zipfile.ZipFile(expected, "w", zipfile.ZIP_DEFLATED, False) as z:
+                for name, contents, kind in files:
+                    compress_type, compresslevel = policy.get(kind, (zipfile.ZIP_DEFLATED, None))
+                    z.writestr(name, contents, compress_type, compresslevel)
+
+            for executor in (False, ThreadPoolExecutor(2)):
+                with self.subTest(executor=executor):
+                    sut = InMemoryZip(policy, executor)
+                    for name, contents, kind in files:
+                        sut.append(name, contents, kind)
+                    sut.rewind()
+                    self.assertEqual(sut.in_memory_zip.read(), expected.getvalue())
+
+    def test_files_are_written_in_the_order_appended(self):
+        release = threading.Event()
+
+        def compress(data, compress_type, compresslevel):
+            # Hold back the first file until the last has been compressed
+            if data == b"first":
+                release.wait(5)
+            elif data == b"last":
+                release.set()
+            return zlib.crc32(data), data, 0.0
+
+        sut = InMemoryZip(compression_policy({"image": "stored"}), ThreadPoolExecutor(3))
+        with mock.patch("transform.transformers.in_memory_zip._compress", side_effect=compress):
+            for name in ("first", "second", "last"):
+                sut.append(name, name.encode(), kind="image")
+            self.assertEqual(sut.get_filenames(), ["first", "second", "last"])
+
+        z = zipfile.ZipFile(sut.in_memory_zip)
+        self.assertEqual(z.namelist(), ["first", "second", "last"])
+        self.assertEqual([z.read(name) for name in z.namelist()], [b"first", b"second", b"last"])
+
+
+class ZipBufferTests(unittest.TestCase):
+
+    def test_zip_moves_to_disk_past_the_spool_size(self):
+        with mock.patch("transform.settings.ZIP_SPOOL_BYTES", 50000):
+            sut = InMemoryZip(compression_policy({"image": "stored"}), executor=False)
+        pages = [os.urandom(20000) for _ in range(5)]
+        for i, page in enumerate(pages):
+            sut.append("page_{0}".format(i), page, kind="image")
+            self.assertEqual(sut.stats()["zip_on_disk"], i >= 2)
+
+        z = zipfile.ZipFile(sut.in_memory_zip)
+        self.assertEqual([z.read(name) for name in z.namelist()], pages)
+        self.assertGreater(sut.stats()["zip_peak_memory_bytes"], 50000)
+        self.assertLess(sut.stats()["zip_peak_memory_bytes"], 70000)
+
+    def test_buffers_move_to_disk_past_the_memory_budget(self):
+        in_use = memory_in_use()
+        first = ZipBuffer(budget=in_use + 30000)
+        second = ZipBuffer(budget=in_use + 30000)
+        first.write(bytes(20000))
+        self.assertEqual(memory_in_use(), in_use + 20000)
+
+        second.write(bytes(20000))
+
+        self.assertFalse(first.on_disk)
+        self.assertTrue(second.on_disk)
+        self.assertEqual(memory_in_use(), in_use + 20000)
+        self.assertEqual(second.peak_memory_bytes, 20000)
+        second.seek(0)
+        self.assertEqual(second.read(), bytes(20000))
+
+    def test_buffer_in_memory_stays_there_when_served(self):
+        buffer = ZipBuffer()
+        buffer.write(bytes(1000))
+
+        self.assertFalse(has_fileno(buffer))
+        self.assertFalse(buffer.on_disk)
+        buffer.rollover()
+        self.assertTrue(has_fileno(buffer))
+
+    def test_memory_is_released_with_the_buffer(self):
+        in_use = memory_in_use()
+        buffer = ZipBuffer()
+        buffer.write(bytes(1000))
+        self.assertEqual(memory_in_use(), in_use + 1000)
+
+        del buffer
+
+        self.assertEqual(memory_in_use(), in_use)
+
+
+class StreamingZipTests(unittest.TestCase):
+
+    def test_streamed_zip_is_the_zip_written_in_memory(self):
+        files = [("page.JPG", os.urandom(5000), "image"), ("response.json", "{}" * 1000, "json")]
+        with mock.patch("time.time", return_value=1500000000):
+            in_memory = InMemoryZip(executor=False)
+            streamed = StreamingZip(executor=False)
+            chunks = []
+            for name, contents, kind in files:
+                in_memory.append(name, contents, kind)
+                streamed.append(name, contents, kind)
+                chunks.append(streamed.take())
+            streamed.close()
+            chunks.append(streamed.take())
+
+        in_memory.rewind()
+        self.assertEqual(b"".join(chunks), in_memory.in_memory_zip.read())
+        self.assertTrue(all(chunks))
+
+    def test_empty_zip(self):
+        sut = StreamingZip()
+        sut.close()
+
+        self.assertEqual(zipfile.ZipFile(BytesIO(sut.take())).namelist(), [])
+
+    def test_no_files_after_the_zip_is_sent(self):
+        sut = StreamingZip()
+        sut.append("file", b"data")
+        sut.close()
+
+        with self.assertRaises(ValueError):
+            sut.append("another", b"data")
@@ -2,6 +2,8 @@ import json
 import unittest
 
 from transform.transformers import PDFTransformer
+from transform.transformers.pdf_transformer import PrebuiltParagraph, get_survey_flowables, style_n
+from transform.transformers.survey_registry import survey_registry
 
 
 class TestPDFTransformer(unittest.TestCase):
@@ -64,3 +66,36 @@ class TestPDFTransformer(unittest.TestCase):
             actual_date = pdf_transformer.get_localised_date(response['submitted_at'], timezone='Europe/Moscow')
 
             self.assertEqual(expected_date, actual_date)
+
+
+class SurveyFlowablesTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./tests/data/eq-mwss.json") as fb:
+            self.response = json.load(fb)
+        with open("./transform/surveys/134.0005.json") as fb:
+            self.survey = json.load(fb)
+
+    def test_question_paragraphs_are_reused(self):
+        first = PDFTransformer(self.survey, self.response).get_elements()
+        second = PDFTransformer(self.survey, self.response).get_elements()
+
+        self.assertEqual([getattr(e, "text", None) for e in first], [getattr(e, "text", None) for e in second])
+        question = first[3]
+        self.assertIsInstance(question, PrebuiltParagraph)
+        self.assertIsNot(question, second[3])
+        self.assertIs(question.frags, second[3].frags)
+
+    def test_paragraph_wrap_is_kept(self):
+        paragraph = PrebuiltParagraph("A question which is long enough to wrap onto more than one line " * 3, style_n)
+        width, height = paragraph.copy().wrap(200, 1000)
+        copy = paragraph.copy()
+        self.assertEqual(copy.wrap(200, 1000), (width, height))
+        self.assertIs(copy.blPara, paragraph._wrapped[200][2])
+        self.assertLess(copy.wrap(400, 1000)[1], height)
+
+    def test_flowables_follow_compiled_survey(self):
+        compiled = survey_registry.get(self.survey)
+        self.assertIs(get_survey_flowables(compiled), get_survey_flowables(compiled))
+        changed = json.loads(json.dumps(self.survey))
+        self.assertIsNot(get_survey_flowables(survey_registry.get(changed)), get_survey_flowables(compiled))
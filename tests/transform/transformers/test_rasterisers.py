@@ -0,0 +1,589 @@
+import json
+from io import BufferedReader, BytesIO
+import os
+import subprocess
+import threading
+import time
+import unittest
+from unittest import mock
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+
+from transform import choose_image_backend, start_rasteriser_pool
+from transform.transformers.pdf_transformer import PDFTransformer
+from transform.transformers.rasterisers import (
+    PROFILES, MutoolRasteriser, PdftocairoRasteriser, PdftoppmRasteriser, PillowRasteriser, get_profile, get_rasteriser
+)
+from transform.transformers.rasterisers.command import CommandRasteriser, in_ranges, memory_file, page_ranges
+from transform.transformers.rasterisers.jpeg import JpegSplitter, split_jpegs
+from transform.transformers.rasterisers.limits import Limiter, RasterisationTimeout, RasteriserBusy, Watchdog
+from transform.transformers.rasterisers.pillow import Page, RasterCanvas, _unescape, render_page
+from transform.transformers.rasterisers.pool import RasteriserPool
+from transform.transformers.rasterisers.probe import ProbeResult, check_images, fastest, probe
+from transform.transformers.rasterisers.profiles import configured_profiles
+
+
+def _jpeg(comment):
+    """A minimal JPEG stream holding a comment segment."""
+    return b"\xFF\xD8\xFF\xFE" + (len(comment) + 2).to_bytes(2, "big") + comment + b"\xFF\xD9"
+
+
+def _finished_process(errors=b""):
+    process = mock.Mock(returncode=0)
+    process.communicate.return_value = (None, errors)
+    return process
+
+
+def _page(left=200, dpi=150):
+    """A JPEG of an A4 page at `dpi` holding a black box `left` pixels from its edge."""
+    image = Image.new("L", tuple(round(side * dpi / 72) for side in A4), 255)
+    image.paste(0, (left, 200, left + 400, 400))
+    buffer = BytesIO()
+    image.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _pid_or_fail(value):
+    if value == "fail":
+        raise ValueError("asked to fail")
+    if value == "hang":
+        time.sleep(10)
+    return os.getpid()
+
+
+class PillowRasteriserTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./tests/data/eq-mwss.json") as fb:
+            self.response = json.load(fb)
+        with open("./transform/surveys/134.0005.json") as fb:
+            self.survey = json.load(fb)
+
+    def test_images(self):
+        pdf_transformer = PDFTransformer(self.survey, self.response)
+        page_count, images = PillowRasteriser().images(pdf_transformer)
+        images = list(images)
+
+        self.assertEqual(page_count, pdf_transformer.render_pages()[1])
+        self.assertEqual(len(images), page_count)
+        for image in images:
+            self.assertTrue(image.startswith(b"\xFF\xD8"))
+            self.assertTrue(image.endswith(b"\xFF\xD9"))
+            with Image.open(BytesIO(image)) as page:
+                self.assertEqual(page.format, "JPEG")
+                self.assertEqual(page.size, (1240, 1754))
+
+    def test_compact_profile(self):
+        page = PDFTransformer(self.survey, self.response).draw_pages(RasterCanvas)[0]
+        with Image.open(BytesIO(render_page(page, PROFILES["compact"]))) as image:
+            self.assertEqual((image.mode, image.size), ("L", (827, 1169)))
+            self.assertTrue(image.info.get("progressive"))
+
+    def test_mono_profile(self):
+        page = PDFTransformer(self.survey, self.response).draw_pages(RasterCanvas)[0]
+        default, mono = render_page(page), render_page(page, PROFILES["mono"])
+        with Image.open(BytesIO(mono)) as image:
+            self.assertEqual(image.mode, "L")
+        self.assertLess(len(mono), len(default))
+
+    def test_draw_pages(self):
+        pages = PDFTransformer(self.survey, self.response).draw_pages(RasterCanvas)
+        self.assertIn("(Monthly Wages and Salaries Survey) Tj", pages[0].code)
+        self.assertEqual(set(pages[0].fonts.values()), {"Helvetica", "Helvetica-Bold"})
+
+    def test_images_from_pool(self):
+        pdf_transformer = PDFTransformer(self.survey, self.response)
+        pool = RasteriserPool(2, render_page)
+        try:
+            page_count, images = PillowRasteriser(pool).images(pdf_transformer)
+            self.assertEqual(list(images), [render_page(page) for page in pdf_transformer.draw_pages(RasterCanvas)])
+        finally:
+            pool.close()
+        self.assertEqual(pool.stats()["jobs"], page_count)
+
+    def test_pooled_pages_take_a_slot(self):
+        pdf_transformer = PDFTransformer(self.survey, self.response)
+        pool = mock.Mock(size=2)
+        pool.run.side_effect = lambda page, profile: b"page"
+        limiter = Limiter(1, timeout=0.1)
+        with mock.patch("transform.transformers.rasterisers.pillow.limiter", limiter):
+            page_count, images = PillowRasteriser(pool).images(pdf_transformer)
+            images = list(images)
+            with limiter.slot():
+                with self.assertRaises(RasteriserBusy):
+                    list(PillowRasteriser(pool).images(pdf_transformer)[1])
+        self.assertEqual(limiter.stats()["acquired"], page_count + 1)
+
+    def test_unescape(self):
+        self.assertEqual(_unescape(r"(\(x\) \\ \243\351)"), "(x) \\ £é")
+
+
+class PdftoppmRasteriserTests(unittest.TestCase):
+
+    def test_page_ranges(self):
+        self.assertEqual(page_ranges(3, 4, 4), [(1, 3)])
+        self.assertEqual(page_ranges(8, 4, 4), [(1, 4), (5, 8)])
+        self.assertEqual(page_ranges(22, 4, 4), [(1, 6), (7, 12), (13, 17), (18, 22)])
+        self.assertEqual(page_ranges(22, 1, 4), [(1, 22)])
+
+    @staticmethod
+    def _image(number):
+        return _jpeg("image of page {0}".format(number).encode())
+
+    @staticmethod
+    def _fake_pdftoppm(args, **kwargs):
+        first, last = (int(args[3]), int(args[5])) if "-f" in args else (1, 2)
+        images = b"".join(PdftoppmRasteriserTests._image(n) for n in range(first, last + 1))
+        process = mock.Mock(stdin=BytesIO(), stdout=BufferedReader(BytesIO(images)), stderr=BytesIO(), returncode=0)
+        process.poll.return_value = 0
+        return process
+
+    def test_failed_exit_status(self):
+        def fail(args, **kwargs):
+            process = self._fake_pdftoppm(args)
+            process.returncode = 1
+            return process
+
+        with mock.patch("subprocess.Popen", side_effect=fail):
+            with self.assertRaises(IOError):
+                list(PdftoppmRasteriser.rasterise(b"%PDF", 2))
+
+    def test_missing_pages(self):
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm):
+            with self.assertRaisesRegex(IOError, "2 of 3 pages"):
+                list(PdftoppmRasteriser.rasterise(b"%PDF", 3))
+
+    def test_ranges_are_rendered_separately_and_kept_in_order(self):
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm) as popen, \
+                mock.patch("transform.settings.IMAGE_PARALLELISM", 3):
+            images = list(PdftoppmRasteriser.rasterise(b"%PDF", 12))
+
+        self.assertEqual(images, [self._image(n) for n in range(1, 13)])
+        self.assertEqual(sorted(call[0][0][3:] for call in popen.call_args_list),
+                         [["1", "-l", "4"], ["5", "-l", "8"], ["9", "-l", "12"]])
+
+    def test_slow_reader_does_not_hold_a_slot(self):
+        limiter = Limiter(1, timeout=0.1)
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm), \
+                mock.patch("transform.transformers.rasterisers.pdftoppm.limiter", limiter), \
+                mock.patch("transform.settings.IMAGE_TIMEOUT", 0.2):
+            images = PdftoppmRasteriser.rasterise(b"%PDF", 2)
+            first = next(images)
+            # The range finishes while the first page is still being sent
+            time.sleep(0.3)
+            with limiter.slot():
+                pass
+            rest = list(images)
+
+        self.assertEqual([first] + rest, [self._image(1), self._image(2)])
+        self.assertEqual(limiter.stats()["busy"], 0)
+
+    def test_abandoned_range_gives_back_its_slot(self):
+        limiter = Limiter(1, timeout=1)
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm), \
+                mock.patch("transform.transformers.rasterisers.pdftoppm.limiter", limiter):
+            images = PdftoppmRasteriser.rasterise(b"%PDF", 2)
+            next(images)
+            images.close()
+            with limiter.slot():
+                pass
+
+    def test_profile_arguments(self):
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm) as popen, \
+                mock.patch("transform.transformers.rasterisers.pdftoppm.reencode") as reencode:
+            list(PdftoppmRasteriser.rasterise(b"%PDF", 2, PROFILES["compact"]))
+            self.assertEqual(reencode.call_count, 2)
+            list(PdftoppmRasteriser.rasterise(b"%PDF", 2, PROFILES["grey"]))
+
+        self.assertEqual(popen.call_args_list[0][0][0],
+                         ["pdftoppm", "-jpeg", "-r", "100", "-gray"])
+        self.assertEqual(popen.call_args_list[1][0][0], ["pdftoppm", "-jpeg", "-gray"])
+
+    def test_jpeg_options_are_applied_by_reencoding(self):
+        buffer = BytesIO()
+        Image.new("L", (40, 40), 200).save(buffer, "JPEG")
+        page = buffer.getvalue()
+
+        self.assertIs(PdftoppmRasteriser.encode(page, PROFILES["grey"]), page)
+        with Image.open(BytesIO(PdftoppmRasteriser.encode(page, PROFILES["compact"]))) as image:
+            self.assertTrue(image.info.get("progressive"))
+            self.assertEqual(image.info["dpi"], (100, 100))
+
+    def test_short_document_is_not_split(self):
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm) as popen:
+            images = list(PdftoppmRasteriser.rasterise(b"%PDF", 2))
+
+        self.assertEqual(len(images), 2)
+        popen.assert_called_once()
+        self.assertEqual(popen.call_args[0][0], ["pdftoppm", "-jpeg"])
+
+
+class FileHandoffTests(unittest.TestCase):
+
+    def setUp(self):
+        self.inputs = []
+
+    def _fake_pdftoppm(self, args, pass_fds=(), **kwargs):
+        with open(args[-2], "rb") as fh:
+            self.inputs.append(fh.read())
+        first, last = (int(args[3]), int(args[5])) if "-f" in args else (1, 2)
+        for n in range(first, last + 1):
+            with open("{0}-{1:02d}.jpg".format(args[-1], n), "wb") as fh:
+                fh.write(PdftoppmRasteriserTests._image(n))
+        return _finished_process()
+
+    def test_rasterise_file(self):
+        pdf_file = memory_file()
+        pdf_file.write(b"%PDF-1.4 shared")
+        pdf_file.flush()
+        with mock.patch("subprocess.Popen", side_effect=self._fake_pdftoppm), \
+                mock.patch("transform.settings.IMAGE_PARALLELISM", 2):
+            images = list(PdftoppmRasteriser.rasterise_file(pdf_file, 10))
+
+        self.assertEqual(images, [PdftoppmRasteriserTests._image(n) for n in range(1, 11)])
+        self.assertEqual(self.inputs, [b"%PDF-1.4 shared"] * 2)
+        self.assertTrue(pdf_file.closed)
+
+    def test_write_pages(self):
+        with open("./tests/data/eq-mwss.json") as fb:
+            response = json.load(fb)
+        with open("./transform/surveys/134.0005.json") as fb:
+            survey = json.load(fb)
+        pdf_transformer = PDFTransformer(survey, response)
+
+        with memory_file() as pdf_file:
+            page_count = pdf_transformer.write_pages(pdf_file)
+            pdf_file.seek(0)
+            self.assertEqual((pdf_file.read()[:5], page_count), (b"%PDF-", pdf_transformer.render_pages()[1]))
+
+
+class JpegSplitterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.images = []
+        for colour in ("red", "green", "blue"):
+            buffer = BytesIO()
+            Image.new("RGB", (64, 48), colour).save(buffer, "JPEG", quality=90)
+            self.images.append(buffer.getvalue())
+        # An end of image marker inside a segment must not end the image
+        self.images.append(_jpeg(b"thumbnail \xFF\xD9 inside"))
+
+    def test_whole_stream(self):
+        self.assertEqual(list(split_jpegs([b"".join(self.images)])), self.images)
+
+    def test_one_byte_at_a_time(self):
+        stream = b"".join(self.images)
+        self.assertEqual(list(split_jpegs(stream[i:i + 1] for i in range(len(stream)))), self.images)
+
+    def test_images_are_returned_when_complete(self):
+        splitter = JpegSplitter()
+        self.assertEqual(splitter.feed(self.images[0][:-1]), [])
+        self.assertEqual(splitter.feed(self.images[0][-1:] + self.images[1][:10]), [self.images[0]])
+
+    def test_truncated(self):
+        with self.assertRaises(IOError):
+            list(split_jpegs([self.images[0][:-2]]))
+
+    def test_padding_between_images(self):
+        self.assertEqual(list(split_jpegs([b"\0" + self.images[0] + b"\0\0" + self.images[1]])), self.images[:2])
+
+
+class GetProfileTests(unittest.TestCase):
+
+    def test_default(self):
+        self.assertEqual(get_profile("134"), PROFILES["default"])
+
+    @mock.patch("transform.settings.IMAGE_SURVEY_PROFILES", {"144": "compact"})
+    @mock.patch("transform.settings.IMAGE_PROFILE", "grey")
+    def test_per_survey(self):
+        self.assertEqual(get_profile("144"), PROFILES["compact"])
+        self.assertEqual(get_profile("134"), PROFILES["grey"])
+
+    @mock.patch("transform.settings.IMAGE_PROFILE", "sepia")
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_profile("134")
+
+
+class LimitsTests(unittest.TestCase):
+
+    def test_busy(self):
+        limiter = Limiter(1, timeout=0.01)
+        with limiter.slot():
+            with self.assertRaises(RasteriserBusy):
+                with limiter.slot():
+                    pass
+        with limiter.slot():
+            pass
+        stats = limiter.stats()
+        self.assertEqual((stats["acquired"], stats["busy"]), (2, 1))
+
+    @staticmethod
+    def _sleep():
+        # The shell starts sleep as a child, which must be killed along with it
+        return subprocess.Popen(["sh", "-c", "sleep 10; echo done"], start_new_session=True, stdout=subprocess.PIPE)
+
+    def test_timeout_kills_the_process_group(self):
+        process = self._sleep()
+        start = time.monotonic()
+        with self.assertRaises(RasterisationTimeout):
+            with Watchdog(process, timeout=0.1):
+                output, _ = process.communicate()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(output, b"")
+
+    def test_cancel(self):
+        process = self._sleep()
+        cancelled = threading.Event()
+        threading.Timer(0.1, cancelled.set).start()
+        with Watchdog(process, timeout=30, cancelled=cancelled):
+            process.communicate()
+        self.assertLess(process.returncode, 0)
+
+    def test_failed_range_cancels_the_others(self):
+        cancelled = []
+
+        def rasterise_range(first=None, last=None, **kwargs):
+            if first == 1:
+                raise IOError("broken")
+            cancelled.append(kwargs["cancelled"].wait(5))
+            yield b""
+
+        with mock.patch("transform.settings.IMAGE_PARALLELISM", 3):
+            with self.assertRaises(IOError):
+                list(in_ranges(rasterise_range, 12))
+        self.assertEqual(cancelled, [True, True])
+
+    def test_later_failure_stops_a_slow_first_range(self):
+        stopped = []
+
+        def rasterise_range(first=None, last=None, cancelled=None):
+            if first == 9:
+                raise IOError("broken")
+            stopped.append(cancelled.wait(5))
+            yield b""
+
+        start = time.monotonic()
+        with mock.patch("transform.settings.IMAGE_PARALLELISM", 3):
+            with self.assertRaisesRegex(IOError, "broken"):
+                list(in_ranges(rasterise_range, 12))
+        self.assertEqual(stopped, [True, True])
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_cancelled_range_starts_no_process(self):
+        cancelled = threading.Event()
+        cancelled.set()
+        with mock.patch("subprocess.Popen") as popen:
+            self.assertEqual(list(PdftoppmRasteriser._rasterise_range(b"%PDF", PROFILES["default"], 1, 4,
+                                                                      cancelled=cancelled)), [])
+            with memory_file() as pdf_file:
+                self.assertEqual(list(MutoolRasteriser._rasterise_file_range(pdf_file.fileno(), PROFILES["default"],
+                                                                             1, 4, cancelled=cancelled)), [])
+        popen.assert_not_called()
+
+    def test_pool_timeout(self):
+        pool = RasteriserPool(1, _pid_or_fail, timeout=0.2)
+        try:
+            with self.assertRaises(RasterisationTimeout):
+                pool.run("hang")
+            self.assertIsInstance(pool.run("ok"), int)
+        finally:
+            pool.close()
+
+
+class CommandRasteriserTests(unittest.TestCase):
+
+    def test_pdftocairo_arguments(self):
+        self.assertEqual(PdftocairoRasteriser.arguments("in.pdf", "out/page", PROFILES["mono"], 1, 4),
+                         ["pdftocairo", "-jpeg", "-gray", "-f", "1", "-l", "4", "in.pdf", "out/page"])
+
+    def test_mutool_arguments(self):
+        self.assertEqual(MutoolRasteriser.arguments("in.pdf", "out/page", PROFILES["compact"], 5, 8),
+                         ["mutool", "draw", "-q", "-r", "100", "-c", "gray", "-o", "out/page-%d.png", "in.pdf", "5-8"])
+
+    def test_mutool_pages_are_encoded_as_jpeg(self):
+        buffer = BytesIO()
+        Image.new("RGB", (40, 30), "white").save(buffer, "PNG")
+        with Image.open(BytesIO(MutoolRasteriser.encode(buffer.getvalue(), PROFILES["grey"]))) as image:
+            self.assertEqual((image.format, image.mode), ("JPEG", "L"))
+
+    def test_unpadded_page_numbers_are_read_in_order(self):
+        def fake_mutool(args, **kwargs):
+            for n in range(1, 12):
+                with open(args[args.index("-o") + 1] % n, "wb") as fh:
+                    fh.write(str(n).encode())
+            return _finished_process(b"warning: something odd")
+
+        with memory_file() as pdf_file, mock.patch("subprocess.Popen", side_effect=fake_mutool), \
+                mock.patch.object(MutoolRasteriser, "encode", side_effect=lambda data, profile: data):
+            images = list(MutoolRasteriser.rasterise_file(pdf_file))
+        self.assertEqual(images, [str(n).encode() for n in range(1, 12)])
+
+    def test_arguments_are_required(self):
+        with self.assertRaises(TypeError):
+            type("Crayons", (CommandRasteriser,), {"name": "crayons", "command": "crayons"})()
+
+    def test_available(self):
+        with mock.patch("shutil.which", return_value=None):
+            self.assertFalse(PdftocairoRasteriser.available())
+            self.assertTrue(PillowRasteriser.available())
+        with mock.patch("shutil.which", return_value="/usr/bin/mutool"):
+            self.assertTrue(MutoolRasteriser.available())
+
+
+class ProbeTests(unittest.TestCase):
+
+    def test_probe(self):
+        with mock.patch("shutil.which", return_value=None):
+            results = {result.name: result for result in probe(repeat=1)}
+
+        self.assertTrue(results["pillow"].compatible)
+        self.assertGreater(results["pillow"].duration_ms, 0)
+        self.assertEqual(results["pdftoppm"], ProbeResult("pdftoppm", False, None, "not installed"))
+
+    def test_every_profile_is_checked(self):
+        def images(pdf_transformer, profile):
+            return 1, [_page()]
+
+        with mock.patch("shutil.which", return_value=None), \
+                mock.patch.object(PillowRasteriser, "images", side_effect=images):
+            default, = probe(["pillow"], repeat=1)
+            both, = probe(["pillow"], [PROFILES["default"], PROFILES["compact"]], repeat=1)
+
+        self.assertTrue(default.compatible)
+        self.assertEqual(both.error, "made pages of 1240x1754, not 827x1169")
+
+    def test_configured_profiles(self):
+        with mock.patch("transform.settings.IMAGE_PROFILE", "grey"), \
+                mock.patch("transform.settings.IMAGE_SURVEY_PROFILES", {"144": "compact", "187": "grey"}):
+            self.assertEqual(configured_profiles(), [PROFILES["grey"], PROFILES["compact"]])
+        with mock.patch("transform.settings.IMAGE_SURVEY_PROFILES", {"144": "crayons"}):
+            with self.assertRaises(ValueError):
+                configured_profiles()
+
+    def test_backend_is_chosen_at_startup(self):
+        with mock.patch("transform.transformers.rasterisers.probe.best_rasteriser") as best_rasteriser:
+            with mock.patch("transform.settings.IMAGE_BACKEND", "pdftoppm"):
+                choose_image_backend()
+            best_rasteriser.assert_not_called()
+            with mock.patch("transform.settings.IMAGE_BACKEND", "auto"):
+                choose_image_backend()
+            best_rasteriser.assert_called_once_with()
+
+    def test_incompatible(self):
+        page = _page()
+        self.assertIsNone(check_images(1, [page]))
+        self.assertIsNone(check_images(1, [page], reference=[_page(205)]))
+        self.assertEqual(check_images(1, [render_page(Page(*A4, code="", fonts={}))]), "made a blank page 1")
+        self.assertEqual(check_images(1, [page], reference=[_page(700)]),
+                         "made page 1 unlike the reference, differing by 1.00")
+        self.assertEqual(check_images(2, [page]), "made 1 images of 2 pages")
+        self.assertEqual(check_images(1, [page], PROFILES["compact"]), "made pages of 1240x1754, not 827x1169")
+        self.assertIn("unreadable", check_images(1, [b"not an image"]))
+
+    def test_fastest(self):
+        results = [ProbeResult("a", True, 20.0, None), ProbeResult("b", True, 10.0, None),
+                   ProbeResult("c", False, None, "not installed")]
+        self.assertEqual(fastest(results), "b")
+        with self.assertRaises(ValueError):
+            fastest(results[2:])
+
+
+class GetRasteriserTests(unittest.TestCase):
+
+    def test_by_name(self):
+        self.assertIsInstance(get_rasteriser("pillow"), PillowRasteriser)
+
+    def test_auto(self):
+        with mock.patch("transform.transformers.rasterisers.probe.best_rasteriser", return_value="mutool"):
+            self.assertIsInstance(get_rasteriser("auto"), MutoolRasteriser)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_rasteriser("crayons")
+
+
+class RasteriserPoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = RasteriserPool(1, _pid_or_fail, max_jobs=3)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def _kill_idle_worker(self):
+        worker = self.pool._idle.queue[-1]
+        worker.process.kill()
+        worker.process.join()
+
+    def test_workers_are_reused_and_recycled(self):
+        pids = [self.pool.run("ok") for _ in range(4)]
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual(len(set(pids[:3])), 1)
+        self.assertNotEqual(pids[3], pids[0])
+        self.assertEqual(self.pool.stats()["recycled"], 1)
+
+    def test_failed_job(self):
+        with self.assertRaises(IOError):
+            self.pool.run("fail")
+        # The worker survives a job which raises
+        self.assertIsInstance(self.pool.run("ok"), int)
+        self.assertEqual(self.pool.stats()["replaced"], 0)
+
+    def test_dead_worker_is_replaced(self):
+        pid = self.pool.run("ok")
+        self._kill_idle_worker()
+        self.assertNotEqual(self.pool.run("ok"), pid)
+        self.assertEqual(self.pool.stats()["replaced"], 1)
+
+    def test_replacements_are_counted_from_every_thread(self):
+        self.pool = RasteriserPool(2, _pid_or_fail, max_jobs=1)
+        threads = [threading.Thread(target=self.pool.run, args=("ok",)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.pool.stats()["recycled"], 8)
+        self.assertEqual(self.pool.stats()["replaced"], 0)
+
+    def test_started_before_use(self):
+        with mock.patch("transform.settings.IMAGE_WORKERS", 1), \
+                mock.patch("transform.transformers.rasterisers.pool._pools", {}) as pools:
+            start_rasteriser_pool()
+            pool = pools[render_page]
+            try:
+                self.assertEqual(len(pool._idle.queue), 1)
+                self.assertEqual(pool._pid, os.getpid())
+            finally:
+                pool.close()
+
+    def test_waiting_for_a_worker_times_out(self):
+        self.pool = RasteriserPool(1, _pid_or_fail, queue_timeout=0.1)
+        self.pool.start()
+        worker = self.pool._acquire()
+        try:
+            with self.assertRaises(RasteriserBusy):
+                self.pool.run("ok")
+        finally:
+            self.pool._release(worker)
+        self.assertEqual(self.pool.stats()["busy"], 1)
+        self.assertIsInstance(self.pool.run("ok"), int)
+
+    def test_worker_is_kept_whatever_the_error(self):
+        self.pool.queue_timeout = 1
+        with self.assertRaises(Exception):
+            self.pool.run(lambda: "can't be pickled")
+        with mock.patch.object(self.pool._idle.queue[-1], "call", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.pool.run("ok")
+
+        self.assertEqual(len(self.pool._idle.queue), 1)
+        self.assertIsInstance(self.pool.run("ok"), int)
+
+    def test_check(self):
+        pid = self.pool.run("ok")
+        self.assertEqual(self.pool.check(), 0)
+        self._kill_idle_worker()
+        self.assertEqual(self.pool.check(), 1)
+        self.assertNotEqual(self.pool.run("ok"), pid)
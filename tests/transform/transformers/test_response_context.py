@@ -0,0 +1,42 @@
+import json
+import unittest
+from unittest import mock
+
+from transform.transformers.response_context import ResponseContext
+
+
+class ResponseContextTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./tests/data/eq-mwss.json") as fb:
+            self.response = json.load(fb)
+        self.context = ResponseContext(self.response)
+
+    def test_values(self):
+        self.assertEqual(self.context.submission_date, "20170301")
+        self.assertEqual(self.context.localised_submitted_at, "01 March 2017 14:25:46")
+        self.assertEqual(self.context.pck_submission_date, "01/03/17")
+        self.assertEqual(self.context.period, "201605")
+        self.assertEqual(self.context.statistical_unit_id, "12346789012")
+        self.assertEqual(self.context.ids.ru_ref, "12346789012")
+        self.assertEqual(self.context.ids.ru_check, "A")
+
+    def test_names(self):
+        self.assertEqual(self.context.index_name, "EDC_134_20170301_40e659ec013f4993.csv")
+        self.assertEqual(self.context.idbr_name, "REC0103_40e659ec013f4993.DAT")
+        self.assertEqual(self.context.image_names(2), ["S40e659ec013f4993_1.JPG", "S40e659ec013f4993_2.JPG"])
+
+    def test_values_are_derived_once(self):
+        with mock.patch("transform.transformers.response_context.parse_datetime",
+                        return_value=self.context.submitted_at) as parse:
+            context = ResponseContext(self.response)
+            context.submission_date
+            context.localised_submitted_at
+            context.pck_submission_date
+            context.idbr_name
+            context.index_name
+        parse.assert_called_once_with(self.response['submitted_at'])
+
+    def test_uses_given_ids(self):
+        ids = object()
+        self.assertIs(ResponseContext(self.response, ids).ids, ids)
@@ -1,9 +1,12 @@
 import datetime
+import os
+import shutil
+import tempfile
 import unittest
 
 import pytest
 
-from transform.transformers.survey import Survey, MissingSurveyException
+from transform.transformers.survey import Survey, SurveyCache, MissingSurveyException, survey_cache
 
 
 class SurveyTests(unittest.TestCase):
@@ -66,3 +69,67 @@ class SurveyTests(unittest.TestCase):
         })
         with pytest.raises(MissingSurveyException):
             Survey.load_survey(ids, "./tests/data/{survey_id}.{inst_id}.json")
+
+
+class SurveyCacheTests(unittest.TestCase):
+
+    ids = Survey.identifiers({
+        "survey_id": "134",
+        "tx_id": "27923934-62de-475c-bc01-433c09fd38b8",
+        "collection": {
+            "instrument_id": "0005",
+            "period": "201704"
+        },
+        "metadata": {
+            "user_id": "123456789",
+            "ru_ref": "12345678901A"
+        }
+    })
+
+    def setUp(self):
+        survey_cache.clear()
+
+    def tearDown(self):
+        survey_cache.clear()
+
+    def test_repeat_load_is_cached(self):
+        first = Survey.load_survey(self.ids, "./tests/data/{survey_id}.{inst_id}.json")
+        second = Survey.load_survey(self.ids, "./tests/data/{survey_id}.{inst_id}.json")
+        self.assertIs(first, second)
+
+    def test_pattern_is_part_of_key(self):
+        test_data = Survey.load_survey(self.ids, "./tests/data/{survey_id}.{inst_id}.json")
+        surveys = Survey.load_survey(self.ids, "./transform/surveys/{survey_id}.{inst_id}.json")
+        self.assertIsNot(test_data, surveys)
+        self.assertEqual(len(survey_cache), 2)
+
+    def test_changed_file_is_reloaded(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        file_name = os.path.join(tmp_dir, "134.0005.json")
+        shutil.copy("./tests/data/134.0005.json", file_name)
+        pattern = os.path.join(tmp_dir, "{survey_id}.{inst_id}.json")
+
+        first = Survey.load_survey(self.ids, pattern)
+        stat = os.stat(file_name)
+        os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        second = Survey.load_survey(self.ids, pattern)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(first, second)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = SurveyCache(2)
+        cache.put("a", 1, {"a": 1})
+        cache.put("b", 1, {"b": 1})
+        cache.get("a", 1)
+        cache.put("c", 1, {"c": 1})
+
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual(cache.get("a", 1), {"a": 1})
+        self.assertEqual(cache.get("c", 1), {"c": 1})
+
+    def test_stale_entry_is_a_miss(self):
+        cache = SurveyCache(2)
+        cache.put("a", 1, {"a": 1})
+        self.assertIsNone(cache.get("a", 2))
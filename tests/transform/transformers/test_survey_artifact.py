@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from transform.transformers import survey_artifact
+from transform.transformers.survey import Survey, survey_cache
+from transform.transformers.survey_registry import SurveyRegistry
+
+
+class SurveyArtifactTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        shutil.copy("./tests/data/134.0005.json", self.tmp_dir)
+        self.pattern = os.path.join(self.tmp_dir, "{survey_id}.{inst_id}.json")
+        self.path = os.path.join(self.tmp_dir, "surveys.pickle")
+        survey_cache.clear()
+        self.addCleanup(survey_cache.clear)
+
+    def test_build_and_load(self):
+        self.assertEqual(survey_artifact.build(self.path, self.pattern), 1)
+        surveys = survey_artifact.load(self.path, self.pattern)
+        file_name = self.pattern.format(survey_id="134", inst_id="0005")
+        self.assertEqual(list(surveys), [file_name])
+        self.assertEqual(surveys[file_name].definition["survey_id"], "134")
+
+    def test_changed_source_is_not_loaded(self):
+        survey_artifact.build(self.path, self.pattern)
+        with open(self.pattern.format(survey_id="134", inst_id="0005"), "a") as fh:
+            fh.write("\n")
+        self.assertEqual(survey_artifact.load(self.path, self.pattern), {})
+
+    def test_unchanged_sources_are_not_read(self):
+        survey_artifact.build(self.path, self.pattern)
+        with mock.patch("transform.transformers.survey_artifact._checksum") as checksum:
+            self.assertEqual(len(survey_artifact.load(self.path, self.pattern)), 1)
+        checksum.assert_not_called()
+
+    def test_touched_source_with_the_same_content_is_loaded(self):
+        survey_artifact.build(self.path, self.pattern)
+        file_name = self.pattern.format(survey_id="134", inst_id="0005")
+        stat = os.stat(file_name)
+        os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(list(survey_artifact.load(self.path, self.pattern)), [file_name])
+
+    def test_missing_or_corrupt_artifact_is_ignored(self):
+        self.assertEqual(survey_artifact.load(self.path, self.pattern), {})
+        with open(self.path, "wb") as fh:
+            fh.write(b"not pickle data")
+        self.assertEqual(survey_artifact.load(self.path, self.pattern), {})
+
+    def test_registry_serves_precompiled_definitions(self):
+        survey_artifact.build(self.path, self.pattern)
+        precompiled = survey_artifact.load(self.path, self.pattern)
+        compiled = next(iter(precompiled.values()))
+        registry = SurveyRegistry()
+        registry.load_all(self.pattern, precompiled)
+
+        ids = Survey.Identifiers(*[None] * len(Survey.Identifiers._fields))._replace(survey_id="134", inst_id="0005")
+        survey = Survey.load_survey(ids, self.pattern)
+        self.assertIs(survey, compiled.definition)
+        self.assertIs(registry.get(survey), compiled)
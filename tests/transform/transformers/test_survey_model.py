@@ -0,0 +1,34 @@
+import json
+import unittest
+
+from transform.transformers.survey_model import Question, SurveyDefinition
+
+
+class SurveyModelTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./transform/surveys/023.0203.json") as fp:
+            self.definition = json.load(fp)
+        self.model = SurveyDefinition.from_dict(self.definition)
+
+    def test_matches_definition(self):
+        self.assertEqual(self.model.survey_id, self.definition['survey_id'])
+        self.assertEqual(self.model.form_type, self.definition['form_type'])
+        self.assertEqual(len(self.model.question_groups), len(self.definition['question_groups']))
+        for group, group_dict in zip(self.model.question_groups, self.definition['question_groups']):
+            self.assertEqual(group.title, group_dict.get('title'))
+            self.assertEqual([q.question_id for q in group.questions],
+                             [q['question_id'] for q in group_dict['questions']])
+
+    def test_is_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.model.title = "Changed"
+        with self.assertRaises(AttributeError):
+            self.model.extra = 1
+
+    def test_display_text(self):
+        self.assertEqual(Question.from_dict({"question_id": "1", "number": "1.1", "text": "Name"}).display_text,
+                         "1.1 Name")
+        self.assertEqual(Question.from_dict({"question_id": "1", "number": "1.1", "text": "2 Name"}).display_text,
+                         "2 Name")
+        self.assertIsNone(Question.from_dict({"question_id": "1"}).display_text)
@@ -0,0 +1,253 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from transform.transformers.survey import Survey, survey_cache
+from transform.transformers.survey_registry import CompiledSurvey, DefinitionInterner, SurveyRegistry, SurveyWatcher
+
+
+class CompiledSurveyTests(unittest.TestCase):
+
+    def setUp(self):
+        with open("./transform/surveys/023.0203.json") as fp:
+            self.definition = json.load(fp)
+        self.compiled = CompiledSurvey(self.definition)
+
+    def test_form_questions_exclude_comments(self):
+        self.assertIn(20, self.compiled.form_questions)
+        self.assertNotIn(147, self.compiled.form_questions)
+
+    def test_index_only_holds_titled_groups_and_text_questions(self):
+        for positions in self.compiled.question_index.values():
+            for group, position in positions:
+                question_group = self.compiled.model.question_groups[group]
+                self.assertIsNotNone(question_group.title)
+                self.assertIsNotNone(question_group.questions[position].text)
+
+    def test_answered_positions_follow_survey_order(self):
+        positions = self.compiled.answered_positions({"20": "1", "11": "01/04/2016", "unknown": "x"})
+        self.assertEqual(positions, sorted(positions))
+        groups = self.compiled.model.question_groups
+        answered = [groups[g].questions[p].question_id for g, p in positions]
+        self.assertEqual(answered, ["11", "20"])
+
+    def test_non_numeric_question_ids_are_not_form_questions(self):
+        with open("./transform/surveys/134.0005.json") as fp:
+            compiled = CompiledSurvey(json.load(fp))
+        question_ids = [q.question_id for g in compiled.model.question_groups for q in g.questions]
+
+        self.assertIn("133w", question_ids)
+        self.assertIn("40", question_ids)
+        self.assertEqual(compiled.form_questions, {int(q) for q in question_ids if q.isdigit()})
+        self.assertTrue(compiled.question_index)
+
+
+class DefinitionInternerTests(unittest.TestCase):
+
+    def test_near_identical_instruments_share_structure(self):
+        interner = DefinitionInterner()
+        with open("./transform/surveys/007.0009.json") as fp:
+            raw = json.load(fp)
+        first = interner.intern(raw)
+        with open("./transform/surveys/007.0010.json") as fp:
+            second = interner.intern(json.load(fp))
+
+        self.assertEqual(first, raw)
+        self.assertIs(first['question_groups'][0], second['question_groups'][0])
+        self.assertIs(first['title'], second['title'])
+        self.assertGreater(interner.report()['bytes_saved'], 0)
+
+    def test_models_share_questions(self):
+        interner = DefinitionInterner()
+        raw, compiled = [], []
+        for name in ("007.0009", "007.0010"):
+            with open("./transform/surveys/{0}.json".format(name)) as fp:
+                raw.append(json.load(fp))
+            compiled.append(CompiledSurvey(interner.intern(raw[-1]), interner))
+
+        first, second = (c.model.question_groups[0] for c in compiled)
+        self.assertIs(first, second)
+        self.assertIs(type(first.questions[0]), type(CompiledSurvey(raw[0]).model.question_groups[0].questions[0]))
+        self.assertEqual(compiled[0].model, CompiledSurvey(raw[0]).model)
+
+    def test_question_groups_are_only_held_by_the_model(self):
+        with open("./transform/surveys/023.0203.json") as fp:
+            raw = json.load(fp)
+        compiled = CompiledSurvey(raw)
+
+        self.assertNotIn("question_groups", compiled.definition)
+        self.assertEqual(compiled.definition, {k: v for k, v in raw.items() if k != "question_groups"})
+        self.assertIs(compiled.definition.compiled, compiled)
+        self.assertIs(SurveyRegistry().get(compiled.definition), compiled)
+
+    def test_differences_are_kept(self):
+        interner = DefinitionInterner()
+        first = interner.intern({"a": [1, "x"], "b": {"c": True}})
+        second = interner.intern({"a": [1, "y"], "b": {"c": 1}})
+
+        self.assertEqual(second, {"a": [1, "y"], "b": {"c": 1}})
+        self.assertIsNot(first["a"], second["a"])
+        self.assertIs(type(second["b"]["c"]), int)
+
+    def test_seeding_shares_the_definitions_in_use(self):
+        with open("./transform/surveys/007.0009.json") as fp:
+            live = DefinitionInterner().intern(json.load(fp))
+        interner = DefinitionInterner()
+        interner.seed(live)
+        self.assertEqual(interner.report()["interned"], 0)
+
+        with open("./transform/surveys/007.0010.json") as fp:
+            new = interner.intern(json.load(fp))
+
+        self.assertIs(new['question_groups'][0], live['question_groups'][0])
+        self.assertIs(interner.intern(live), live)
+
+    def test_report_counts_the_pool(self):
+        interner = DefinitionInterner()
+        interner.intern({"a": [1, "x"]})
+        self.assertGreater(interner.report()["pool_bytes"], 0)
+
+    def test_order_is_preserved(self):
+        interner = DefinitionInterner()
+        interner.intern({"a": 1, "b": 2})
+        self.assertEqual(list(interner.intern({"b": 2, "a": 1})), ["b", "a"])
+
+
+class SurveyRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        survey_cache.clear()
+        self.addCleanup(survey_cache.clear)
+
+    def test_get_reuses_compiled_survey_for_same_definition(self):
+        registry = SurveyRegistry()
+        with open("./transform/surveys/023.0203.json") as fp:
+            definition = json.load(fp)
+        copy = dict(definition)
+        self.assertIs(registry.get(definition), registry.get(definition))
+        self.assertIsNot(registry.get(definition), registry.get(copy))
+        self.assertIs(registry.get(copy), registry.get(copy))
+        self.assertEqual(len(registry), 2)
+
+    def test_definitions_with_the_same_ids_are_kept_apart(self):
+        # 017.0052 declares the form type of 017.0051
+        registry = SurveyRegistry()
+        registry.load_all("./transform/surveys/{survey_id}.{inst_id}.json")
+        first = Survey.load_survey(SurveyRegistry._ids("017.0051.json"))
+        second = Survey.load_survey(SurveyRegistry._ids("017.0052.json"))
+        self.assertEqual((first["survey_id"], first["form_type"]), (second["survey_id"], second["form_type"]))
+
+        compiled = registry.get(first), registry.get(second)
+        for _ in range(10):
+            self.assertIs(registry.get(first), compiled[0])
+            self.assertIs(registry.get(second), compiled[1])
+
+    def test_others_are_bounded(self):
+        registry = SurveyRegistry(max_others=2)
+        definitions = [{"survey_id": "1", "form_type": "1", "question_groups": []} for _ in range(3)]
+        compiled = [registry.get(definition) for definition in definitions]
+
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get(definitions[2]), compiled[2])
+        self.assertIsNot(registry.get(definitions[0]), compiled[0])
+
+    def test_load_all(self):
+        registry = SurveyRegistry()
+        count = registry.load_all("./tests/data/{survey_id}.{inst_id}.json")
+        self.assertEqual(count, 1)
+        self.assertEqual(len(survey_cache), 1)
+
+
+class SurveyReloadTests(unittest.TestCase):
+
+    def setUp(self):
+        survey_cache.clear()
+        self.addCleanup(survey_cache.clear)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.pattern = os.path.join(self.tmp_dir, "{survey_id}.{inst_id}.json")
+        self.file_name = self.pattern.format(survey_id="134", inst_id="0005")
+        shutil.copy("./tests/data/134.0005.json", self.file_name)
+        self.ids = SurveyRegistry._ids(self.file_name)
+        self.registry = SurveyRegistry()
+        self.registry.load_all(self.pattern)
+
+    def _touch(self, file_name):
+        stat = os.stat(file_name)
+        os.utime(file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def test_nothing_changed(self):
+        with mock.patch("transform.transformers.survey_registry.DefinitionInterner") as interner:
+            report = self.registry.reload(self.pattern)
+        self.assertEqual((report.added, report.changed, report.removed, report.failed), ([], [], [], []))
+        # A poll which finds nothing to do does not rebuild the interner
+        interner.assert_not_called()
+
+    def test_added_and_changed_definitions_are_swapped_in(self):
+        before = Survey.load_survey(self.ids, self.pattern)
+        added = self.pattern.format(survey_id="134", inst_id="0006")
+        shutil.copy(self.file_name, added)
+        with open(self.file_name, "w") as fh:
+            json.dump(dict(Survey.read_survey(added), title="Changed"), fh)
+        self._touch(self.file_name)
+
+        report = self.registry.reload(self.pattern)
+
+        self.assertEqual(report.added, [added])
+        self.assertEqual(report.changed, [self.file_name])
+        self.assertEqual(len(survey_cache), 2)
+        after = Survey.load_survey(self.ids, self.pattern)
+        self.assertEqual(before['title'], "Monthly Wages and Salaries Survey")
+        self.assertEqual(after['title'], "Changed")
+        self.assertIs(self.registry.get(after).model.question_groups, self.registry.get(before).model.question_groups)
+        self.assertIs(self.registry.get(after).definition, after)
+        # A request still holding the replaced definition keeps its compiled form
+        self.assertIs(self.registry.get(before), self.registry.get(before))
+        self.assertIs(self.registry.get(before).definition, before)
+        self.assertEqual(len(self.registry), 2)
+
+    def test_removed_definition_is_dropped(self):
+        os.remove(self.file_name)
+        report = self.registry.reload(self.pattern)
+        self.assertEqual(report.removed, [self.file_name])
+        self.assertEqual(len(survey_cache), 0)
+
+    def test_invalid_definition_is_retried(self):
+        with open(self.file_name, "w") as fh:
+            fh.write("{")
+        self._touch(self.file_name)
+
+        report = self.registry.reload(self.pattern)
+
+        self.assertEqual(report.failed, [self.file_name])
+        self.assertEqual(report.changed, [])
+        self.assertIs(survey_cache.get((self.ids.survey_id, self.ids.inst_id, self.pattern),
+                                       os.stat(self.file_name).st_mtime_ns), None)
+        self.assertEqual(self.registry.reload(self.pattern).failed, [self.file_name])
+
+    def test_invalid_definition_does_not_stop_the_load(self):
+        broken = self.pattern.format(survey_id="134", inst_id="0004")
+        with open(broken, "w") as fh:
+            fh.write('{"title": "half cop')
+        added = self.pattern.format(survey_id="134", inst_id="0006")
+        shutil.copy(self.file_name, added)
+        registry = SurveyRegistry()
+
+        self.assertEqual(registry.load_all(self.pattern), 2)
+        self.assertEqual(len(survey_cache), 2)
+
+        with open(broken, "w") as fh:
+            fh.write(open(self.file_name).read())
+        self.assertEqual(registry.reload(self.pattern).added, [broken])
+
+    def test_watcher_reloads_when_triggered(self):
+        watcher = SurveyWatcher(self.registry, pattern=self.pattern)
+        reloaded = []
+        self.registry.reload = lambda pattern: reloaded.append(pattern)
+        watcher.start()
+        watcher.trigger()
+        watcher.join(0.5)
+        self.assertEqual(reloaded, [self.pattern])
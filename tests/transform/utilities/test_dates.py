@@ -0,0 +1,116 @@
+import datetime
+import unittest
+from unittest import mock
+
+from transform.utilities.dates import (
+    LOCALISED_FORMAT, LONG_FORMAT, SHORT_FORMAT, _parse_by_shape, _parse_iso_format, _parse_with_strptime,
+    format_datetime, get_timezone, parse_datetime, parse_timestamp
+)
+
+
+class ParseTimestampTests(unittest.TestCase):
+
+    values = [
+        "2017-01-11T17:18:53Z",
+        "2017-01-11T17:18:53.020222+00:00",
+        "2017-01-11T17:18:53.020222+0000",
+        "2017-01-11T17:18:53.02+05:30",
+        "2017-01-11T17:18:53.020222-01:00",
+        "2017-01-11T17:18:53",
+        "2017-01-11T17:18:53.020222",
+        "2017-1-11T17:18:53",
+        "2017-01-11",
+        "2017-1-1",
+        "11/07/2017",
+        "1/7/2017",
+        "201605",
+        "201613",
+        "2017-02-30",
+        "not a date",
+    ]
+
+    def test_matches_strptime(self):
+        for value in self.values:
+            with self.subTest(value=value):
+                rv = parse_timestamp(value)
+                self.assertEqual(rv, _parse_with_strptime(value))
+                self.assertIs(type(rv), type(_parse_with_strptime(value)))
+                if isinstance(rv, datetime.datetime):
+                    self.assertEqual(rv.tzinfo, _parse_with_strptime(value).tzinfo)
+
+    def test_parsers_match_strptime(self):
+        for parse in (_parse_iso_format, _parse_by_shape):
+            for value in self.values + ["2017-01-11 17:18:53", "2017-01-11T171853+01", "2017-W01-1", "20170111"]:
+                with self.subTest(parse=parse.__name__, value=value):
+                    try:
+                        rv = parse(value)
+                    except ValueError:
+                        rv = None
+                    if rv is not None:
+                        self.assertEqual(rv, _parse_with_strptime(value))
+                        self.assertIs(type(rv), type(_parse_with_strptime(value)))
+
+    @mock.patch("transform.utilities.dates._parse_with_strptime", side_effect=AssertionError("used strptime"))
+    def test_common_shapes_are_parsed_without_strptime(self, strptime):
+        parse_timestamp.cache_clear()
+        self.addCleanup(parse_timestamp.cache_clear)
+        utc = datetime.timezone.utc
+        self.assertEqual(parse_timestamp("2017-01-11T17:18:53.020222+00:00"),
+                         datetime.datetime(2017, 1, 11, 17, 18, 53, 20222, tzinfo=utc))
+        self.assertEqual(parse_timestamp("2017-01-11T17:18:53.020-01:30").utcoffset(),
+                         -datetime.timedelta(hours=1, minutes=30))
+        self.assertEqual(parse_timestamp("2017-01-11T17:18:53.020222"), datetime.datetime(2017, 1, 11, 17, 18, 53))
+        self.assertEqual(parse_timestamp("2017-01-11T17:18:53Z"), datetime.datetime(2017, 1, 11, 17, 18, 53, tzinfo=utc))
+        self.assertEqual(parse_timestamp("2017-01-11"), datetime.date(2017, 1, 11))
+
+    def test_offset(self):
+        rv = parse_timestamp("2017-01-11T17:18:53.020222-01:30")
+        self.assertEqual(rv.utcoffset(), -datetime.timedelta(hours=1, minutes=30))
+        self.assertEqual(rv.microsecond, 20222)
+
+    def test_empty(self):
+        self.assertIsNone(parse_timestamp(""))
+        self.assertIsNone(parse_timestamp(None))
+
+    def test_bad_utc_value(self):
+        with self.assertRaises(ValueError):
+            parse_timestamp("2017-01-11Z")
+
+    def test_memoised(self):
+        parse_timestamp.cache_clear()
+        first = parse_timestamp("2017-01-11T17:18:53Z")
+        self.assertIs(parse_timestamp("2017-01-11T17:18:53Z"), first)
+        self.assertEqual(parse_timestamp.cache_info().hits, 1)
+
+
+class FormatDatetimeTests(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(format_datetime("2016-03-12T10:39:40.123Z"), "12/03/2016 10:39:40")
+        self.assertEqual(format_datetime("2016-03-12T10:39:40.123Z", SHORT_FORMAT), "20160312")
+        self.assertEqual(format_datetime("2016-03-12T10:39:40.123Z", LOCALISED_FORMAT), "12 March 2016 10:39:40")
+
+    def test_converts_to_timezone(self):
+        self.assertEqual(format_datetime("2017-07-01T23:30:00Z", LONG_FORMAT), "02/07/2017 00:30:00")
+        self.assertEqual(format_datetime("2017-07-01T23:30:00+01:00", LONG_FORMAT, "US/Pacific"), "01/07/2017 15:30:00")
+
+    def test_naive_values_are_utc(self):
+        self.assertEqual(format_datetime(datetime.datetime(2017, 7, 1, 23, 30)), "02/07/2017 00:30:00")
+        self.assertEqual(format_datetime("2017-07-01T23:30:00"), "02/07/2017 00:30:00")
+        self.assertEqual(format_datetime(datetime.date(2017, 7, 1)), "01/07/2017 01:00:00")
+
+    def test_unknown_timezone(self):
+        with self.assertRaises(ValueError):
+            get_timezone("Nowhere/Special")
+
+
+class ParseDatetimeTests(unittest.TestCase):
+
+    def test_offsets(self):
+        self.assertEqual(parse_datetime("2016-03-12T10:39:40Z").utcoffset(), datetime.timedelta(0))
+        self.assertEqual(parse_datetime("2016-03-12T10:39:40.5-0130").utcoffset(),
+                         -datetime.timedelta(hours=1, minutes=30))
+        self.assertIsNone(parse_datetime("2016-03-12T10:39:40").tzinfo)
+
+    def test_other_formats(self):
+        self.assertEqual(parse_datetime("12 March 2016 10:39"), datetime.datetime(2016, 3, 12, 10, 39))
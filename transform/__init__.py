@@ -18,6 +18,45 @@ logger_initial_config(service_name='sdx-transform-cs',
 
 logging.info("Starting server: version='{}'".format(__version__))
 
+from .transformers import survey_artifact  # noqa
+from .transformers.survey_registry import SurveyWatcher, survey_registry  # noqa
+survey_registry.load_all(precompiled=survey_artifact.load(settings.SURVEY_ARTIFACT))
+
+
+def start_survey_watcher():
+    """Start reloading survey definitions in this process, if configured."""
+    if settings.SURVEY_RELOAD_INTERVAL or settings.SURVEY_RELOAD_ON_SIGHUP:
+        survey_watcher = SurveyWatcher(survey_registry, settings.SURVEY_RELOAD_INTERVAL)
+        if settings.SURVEY_RELOAD_ON_SIGHUP:
+            survey_watcher.install_signal_handler()
+        survey_watcher.start()
+
+
+def start_rasteriser_pool():
+    """Start the processes which paint pages in this process, if configured.
+
+    They are forked, so this is called before the process starts any threads.
+    """
+    from .transformers.rasterisers.pillow import render_page
+    from .transformers.rasterisers.pool import get_pool
+    pool = get_pool(render_page)
+    if pool is not None:
+        pool.start()
+
+
+def choose_image_backend():
+    """Probe the image backends in this process if `IMAGE_BACKEND` is `auto`, before it serves requests."""
+    if settings.IMAGE_BACKEND == "auto":
+        from .transformers.rasterisers.probe import best_rasteriser
+        best_rasteriser()
+
+
+# A preloaded app is imported by the gunicorn master; each worker starts its own pool and watcher
+if not settings.PRELOAD_APP:
+    start_rasteriser_pool()
+    choose_image_backend()
+    start_survey_watcher()
+
 # Configure the number of retries attempted before failing call
 session = requests.Session()
 
@@ -23,3 +23,65 @@ SDX_FTP_IMAGE_PATH = _get_value("SDX_FTP_IMAGES_PATH", "EDC_QImages")
 SDX_FTP_DATA_PATH = "EDC_QData"
 SDX_FTP_RECEIPT_PATH = "EDC_QReceipts"
 SDX_RESPONSE_JSON_PATH = "EDC_QJson"
+
+# Set by startup.sh when gunicorn loads the app before forking its workers
+PRELOAD_APP = os.getenv("PRELOAD_APP", "false").lower() == "true"
+
+# Number of parsed survey definitions each worker keeps in memory
+SURVEY_CACHE_SIZE = int(os.getenv("SURVEY_CACHE_SIZE", 128))
+
+# Precompiled survey definitions built by `make build`, read at worker start
+SURVEY_ARTIFACT = os.getenv("SURVEY_ARTIFACT", "./transform/surveys.pickle")
+
+# Seconds between checks for changed survey definitions; 0 turns polling off
+SURVEY_RELOAD_INTERVAL = float(os.getenv("SURVEY_RELOAD_INTERVAL", 0))
+# Reload survey definitions when a worker receives SIGHUP
+SURVEY_RELOAD_ON_SIGHUP = os.getenv("SURVEY_RELOAD_ON_SIGHUP", "false").lower() == "true"
+
+# How page images are made: "pdftoppm" or "pdftocairo" convert a PDF with poppler, "mutool" with MuPDF,
+# "pillow" draws the pages in process, and "auto" picks the fastest of these installed
+IMAGE_BACKEND = os.getenv("IMAGE_BACKEND", "pdftoppm")
+# The image profile used for every survey not listed in IMAGE_SURVEY_PROFILES
+IMAGE_PROFILE = os.getenv("IMAGE_PROFILE", "default")
+# Image profiles for particular surveys, as comma separated survey_id=profile pairs, e.g. "144=compact,187=grey"
+IMAGE_SURVEY_PROFILES = dict(
+    item.strip().split("=", 1) for item in os.getenv("IMAGE_SURVEY_PROFILES", "").split(",") if item.strip()
+)
+# Bytes of page images each worker keeps to serve repeated submissions; 0 keeps none in memory
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", 0))
+# A local directory which also keeps page images, shared by the workers on a host; unset keeps none on disk
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "")
+# Bytes of page images kept in IMAGE_CACHE_DIR
+IMAGE_CACHE_DISK_BYTES = int(os.getenv("IMAGE_CACHE_DISK_BYTES", 1024 ** 3))
+# How a PDF reaches pdftoppm: "pipe" streams it through stdin and stdout, "file" shares one in-memory file
+IMAGE_HANDOFF = os.getenv("IMAGE_HANDOFF", "pipe")
+# Processes rendering the pages of one submission at the same time
+IMAGE_PARALLELISM = int(os.getenv("IMAGE_PARALLELISM", os.cpu_count() or 1))
+# Submissions are only split into page ranges of at least this many pages
+IMAGE_MIN_PAGES_PER_RANGE = int(os.getenv("IMAGE_MIN_PAGES_PER_RANGE", 4))
+# Rasterisations each worker runs at once; more wait for a free slot
+IMAGE_MAX_CONCURRENT = int(os.getenv("IMAGE_MAX_CONCURRENT", os.cpu_count() or 1))
+# Seconds a rasterisation waits for a free slot before the request fails; 0 waits for ever
+IMAGE_QUEUE_TIMEOUT = float(os.getenv("IMAGE_QUEUE_TIMEOUT", 30))
+# Seconds a rasteriser may run before it is killed; 0 never kills it
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", 60))
+# Processes per gunicorn worker which paint pillow pages; 0 paints them in the request's own process
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 0))
+# Jobs a rasteriser process runs before it is replaced; 0 keeps it for the life of the worker
+IMAGE_WORKER_MAX_JOBS = int(os.getenv("IMAGE_WORKER_MAX_JOBS", 1000))
+# How each kind of file in the zip is compressed, as comma separated kind=compression pairs where the
+# compression is "stored" or a deflate level from 0 to 9; kinds not listed are deflated at the default level
+ZIP_COMPRESSION = dict(
+    item.strip().split("=", 1)
+    for item in os.getenv("ZIP_COMPRESSION", "image=1,index=1,data=1,receipt=1,json=9").split(",") if item.strip()
+)
+# Threads each worker compresses the files of a zip on; 0 or 1 compresses them one at a time on the request
+ZIP_THREADS = int(os.getenv("ZIP_THREADS", min(4, os.cpu_count() or 1)))
+# Bytes a zip grows to in memory before it moves to a temporary file; 0 keeps it in memory
+ZIP_SPOOL_BYTES = int(os.getenv("ZIP_SPOOL_BYTES", 16 * 1024 ** 2))
+# Bytes the zips of a worker together hold in memory before the one growing moves to a temporary file; 0 has no limit
+ZIP_MEMORY_BUDGET = int(os.getenv("ZIP_MEMORY_BUDGET", 64 * 1024 ** 2))
+# The directory of those temporary files; unset uses the system's
+ZIP_SPOOL_DIR = os.getenv("ZIP_SPOOL_DIR", "")
+# Whether the zip is sent while it is made, in chunks, rather than once it is finished
+ZIP_STREAMING = os.getenv("ZIP_STREAMING", "false").lower() == "true"
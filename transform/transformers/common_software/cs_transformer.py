@@ -2,7 +2,6 @@ import json
 import logging
 from io import StringIO
 
-import dateutil.parser
 from jinja2 import Environment, PackageLoader
 from structlog import wrap_logger
 
@@ -38,7 +37,7 @@ class CSTransformer(SurveyTransformer):
 
     def _create_pck(self):
         template = env.get_template('pck.tmpl')
-        pck_transformer = PCKTransformer(self.survey, self.response)
+        pck_transformer = PCKTransformer(self.survey, self.response, self.context)
         answers = pck_transformer.derive_answers()
         cs_form_id = pck_transformer.get_cs_form_id()
         sub_date_str = pck_transformer.get_subdate_str()
@@ -65,11 +64,10 @@ class CSTransformer(SurveyTransformer):
     def _create_idbr(self):
         template = env.get_template('idbr.tmpl')
         template_output = template.render(response=self.response)
-        submission_date = dateutil.parser.parse(self.response['submitted_at'])
 
         # Format is RECddMM_batchId.DAT
         # e.g. REC1001_30000.DAT for 10th January, batch 30000
-        idbr_name = Formatter.idbr_name(submission_date, self.response['tx_id'])
+        idbr_name = self.context.idbr_name
         self._idbr.write(template_output)
         self._idbr.seek(0)
         return idbr_name
@@ -8,6 +8,7 @@ from structlog import wrap_logger
 from transform.transformers.common_software.cs_formatter import CSFormatter
 from transform.transformers.survey import Survey
 from transform.transformers.survey_transformer import SurveyTransformer
+from transform.utilities.dates import parse_timestamp
 
 logger = wrap_logger(logging.getLogger(__name__))
 
@@ -36,58 +37,7 @@ class MBSTransformer(SurveyTransformer):
             logger.info("Tried to transform None to int. Returning None.")
             return None
 
-    @staticmethod
-    def parse_timestamp(text):
-        """Parse a text field for a date or timestamp.
-
-        Date and time formats vary across surveys.
-        This method reads those formats.
-
-        :param str text: The date or timestamp value.
-        :rtype: Python date or datetime.
-
-        """
-
-        cls = datetime.datetime
-
-        if text:
-            if text.endswith("Z"):
-                return cls.strptime(text, "%Y-%m-%dT%H:%M:%SZ").replace(
-                    tzinfo=datetime.timezone.utc
-                )
-
-            try:
-                return cls.strptime(text, "%Y-%m-%dT%H:%M:%S.%f%z")
-
-            except ValueError:
-                pass
-
-            try:
-                return cls.strptime(text.partition(".")[0], "%Y-%m-%dT%H:%M:%S")
-
-            except ValueError:
-                pass
-
-            try:
-                return cls.strptime(text, "%Y-%m-%d").date()
-
-            except ValueError:
-                pass
-
-            try:
-                return cls.strptime(text, "%d/%m/%Y").date()
-
-            except ValueError:
-                pass
-
-            if len(text) != 6:
-                return None
-
-            try:
-                return cls.strptime(text + "01", "%Y%m%d").date()
-
-            except ValueError:
-                return None
+    parse_timestamp = staticmethod(parse_timestamp)
 
     def __init__(self, response, seq_nr=0):
 
@@ -4,14 +4,16 @@ import decimal
 from decimal import Decimal, ROUND_HALF_UP
 import logging
 
-import dateutil.parser
 from structlog import wrap_logger
 
+from transform.transformers.response_context import ResponseContext
+from transform.transformers.survey_registry import COMMENTS_QUESTIONS, survey_registry
+
 logger = wrap_logger(logging.getLogger(__name__))
 
 
 class PCKTransformer:
-    comments_questions = ['147', '146a', '146b', '146c', '146d', '146e', '146f', '146g', '146h', '146i', '146j', '146k']
+    comments_questions = COMMENTS_QUESTIONS
     rsi_turnover_questions = ["20", "21", "22", "23", "24", "25", "26"]
     rsi_currency_questions = rsi_turnover_questions + ["27"]
     employee_questions = ["50", "51", "52", "53", "54"]  # Used by qbs and rsi surveys
@@ -211,35 +213,21 @@ class PCKTransformer:
     qpses_survey_ids = ["160", "165", "169"]
     construction_survey_id = "228"
 
-    def __init__(self, survey, response_data):
+    def __init__(self, survey, response_data, context=None):
         self.survey = survey
         self.response = response_data
+        self.context = context or ResponseContext(response_data)
 
         self.data = copy.deepcopy(response_data['data']) if 'data' in response_data else {}
         self.form_questions = None
         self.form_question_types = None
 
     def get_form_questions(self):
-        """Return the questions (list) and question types (dict
-        lookup to question type)
+        """Return the questions (set of int ids) and question types (dict
+        lookup to question type), as precomputed by the survey registry
         """
-        questions = []
-        question_types = {}
-
-        answers = [
-            answer for question_group in self.survey['question_groups']
-            for answer in question_group['questions']
-            if answer['question_id'] not in self.comments_questions
-        ]
-
-        for answer in answers:
-            questions.append(int(answer['question_id']))
-            try:
-                question_types[answer['question_id']] = answer['type']
-            except KeyError:
-                logger.debug("No type in answer.")
-
-        return questions, question_types
+        compiled = survey_registry.get(self.survey)
+        return compiled.form_questions, compiled.form_question_types
 
     def get_cs_form_id(self):
         """
@@ -268,9 +256,7 @@ class PCKTransformer:
         Gets the submission date from the 'submitted_at' field in the response and returns it formatted
         :returns: Date formatted in the 'dd/mm/yy' format.
         """
-        submission_date = dateutil.parser.parse(self.response['submitted_at'])
-
-        return submission_date.strftime("%d/%m/%y")
+        return self.context.pck_submission_date
 
     def get_derived_value(self, question_id, value=None):
         """Returns a derived value to be used in pck response based on the
@@ -525,7 +511,7 @@ class PCKTransformer:
 
         self.form_questions, self.form_question_types = self.get_form_questions()
 
-        required_answers = [k for k, v in self.form_question_types.items() if v == 'contains']
+        required_answers = survey_registry.get(self.survey).contains_questions
         required = self.get_required_answers(required_answers)
 
         answers.update(required)
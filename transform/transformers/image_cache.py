@@ -0,0 +1,258 @@
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import weakref
+
+from structlog import wrap_logger
+
+from transform import settings
+from transform.transformers.survey_registry import survey_registry
+
+__doc__ = """
+A cache of the page images made for a submission.
+
+Retries and replays send byte identical submissions. The images are keyed by a
+hash of the survey definition, the canonical JSON of the response, the backend and
+the image profile, so a repeat is served without laying out or rasterising the
+pages again.
+
+Entries are kept in memory up to `IMAGE_CACHE_BYTES`, and if `IMAGE_CACHE_DIR` is
+set, also on local disk up to `IMAGE_CACHE_DISK_BYTES`, where every worker on the
+host can read them. Each file holds the raw JPEGs behind a header of their lengths,
+so reading one never runs code from the directory.
+"""
+
+logger = wrap_logger(logging.getLogger(__name__))
+
+_definition_digests = weakref.WeakKeyDictionary()
+
+#: The start of a file of cached images, followed by the number of images and the length of each.
+MAGIC = b"SDXIMG1\n"
+
+_count = struct.Struct(">I")
+
+#: Writes to the disk tier between scans of the directory, which other workers write to as well.
+PRUNE_EVERY = 100
+
+
+def pack_images(images):
+    """Return the JPEG `images` as the content of a cache file."""
+    header = [MAGIC, _count.pack(len(images))] + [_count.pack(len(image)) for image in images]
+    return b"".join(header + images)
+
+
+def unpack_images(data):
+    """Return the images in the content of a cache file.
+
+    :raises ValueError: If `data` is not a whole cache file.
+
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("Not a file of cached images")
+    offset = len(MAGIC)
+    try:
+        count, = _count.unpack_from(data, offset)
+        lengths = struct.unpack_from(">{0}I".format(count), data, offset + _count.size)
+    except struct.error:
+        raise ValueError("The header of the cached images is cut short")
+    offset += _count.size * (count + 1)
+    if offset + sum(lengths) != len(data):
+        raise ValueError("The cached images are not the length their header gives")
+    images = []
+    for length in lengths:
+        images.append(data[offset:offset + length])
+        offset += length
+    return images
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _definition_digest(survey):
+    """Hash a survey definition once for as long as its compiled form is in use."""
+    compiled = survey_registry.get(survey)
+    try:
+        return _definition_digests[compiled]
+    except KeyError:
+        # The question groups are only held by the model, which encodes as nested lists
+        content = _canonical([compiled.definition, compiled.model])
+        digest = _definition_digests[compiled] = hashlib.sha256(content).hexdigest()
+        return digest
+
+
+def image_key(survey, response, backend, profile):
+    """Return the cache key of the images of `response` made by `backend` to `profile`."""
+    digest = hashlib.sha256(_definition_digest(survey).encode("ascii"))
+    digest.update(repr((backend, tuple(profile))).encode("utf-8"))
+    digest.update(_canonical(response))
+    return digest.hexdigest()
+
+
+class ImageCache:
+    """A bounded least recently used cache of page images, with an optional disk tier.
+
+    :param int max_bytes: The total size of the images held in memory; 0 holds none.
+    :param str directory: Where to keep images on disk, if anywhere.
+    :param int max_disk_bytes: The total size of the files kept in `directory`.
+
+    """
+
+    def __init__(self, max_bytes, directory=None, max_disk_bytes=0):
+        self.max_bytes = max_bytes
+        self.directory = directory or None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.max_bytes or self.directory)
+
+    def get(self, key):
+        """Return the images stored under `key`, or None."""
+        with self._lock:
+            images = self._entries.get(key)
+            if images is not None:
+                self._entries.move_to_end(key)
+
+        if images is None and self.directory:
+            images = self._read(key)
+            if images is not None:
+                self._remember(key, images)
+
+        with self._lock:
+            if images is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_saved += sum(map(len, images))
+        return images
+
+    def put(self, key, images):
+        """Store the list of JPEG `images` under `key`."""
+        images = list(images)
+        self._remember(key, images)
+        if self.directory:
+            self._write(key, images)
+
+    def stats(self):
+        """Return the hit rate and how many bytes of images were served from the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": len(self._entries),
+            "bytes": self._size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key, images):
+        size = sum(map(len, images))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= sum(map(len, previous))
+            self._entries[key] = images
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= sum(map(len, evicted))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".images")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "rb") as fh:
+                images = unpack_images(fh.read())
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError):
+            logger.warning("Could not read cached images", key=key)
+            return None
+        # Mark the file as recently used, so it is pruned last
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return images
+
+    def _write(self, key, images):
+        data = pack_images(images)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logger.exception("Could not cache images on disk", key=key)
+            return
+
+        # Scan the directory once the files written here may fill it, and now and then for those of other workers
+        with self._lock:
+            self._writes += 1
+            if self._disk_bytes is not None and self._writes % PRUNE_EVERY and \
+                    self._disk_bytes + len(data) <= self.max_disk_bytes:
+                self._disk_bytes += len(data)
+                return
+        try:
+            total = self._prune()
+        except OSError:
+            logger.exception("Could not prune the cached images on disk")
+            return
+        with self._lock:
+            self._disk_bytes = total
+
+    def _prune(self):
+        """Remove the least recently used files until the directory fits in `max_disk_bytes`.
+
+        :returns: The bytes of the files left.
+
+        """
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".images"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+image_cache = ImageCache(settings.IMAGE_CACHE_BYTES, settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_DISK_BYTES)
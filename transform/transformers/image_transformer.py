@@ -1,18 +1,18 @@
 import datetime
 import os.path
 import requests
-import subprocess
 
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
+from transform.transformers.image_cache import image_cache, image_key
 from transform.transformers.in_memory_zip import InMemoryZip
 from transform.transformers.index_file import IndexFile
+from transform.transformers.rasterisers import get_profile, get_rasteriser
+from transform.transformers.response_context import ResponseContext
 from .pdf_transformer import PDFTransformer
 
 # Configure the number of retries attempted before failing call
-from ..utilities.formatter import Formatter
-
 session = requests.Session()
 
 retries = Retry(total=5, backoff_factor=0.1)
@@ -26,7 +26,7 @@ class ImageTransformer:
     """
 
     def __init__(self, logger, survey, response, current_time=None, sequence_no=1000,
-                 base_image_path=""):
+                 base_image_path="", context=None, rasteriser=None, profile=None, cache=None):
 
         if current_time is None:
             current_time = datetime.datetime.utcnow()
@@ -34,12 +34,16 @@ class ImageTransformer:
         self._page_count = -1
         self.current_time = current_time
         self.index_file = None
-        self._pdf = None
+        self._images = None
         self._image_names = []
         self.zip = InMemoryZip()
         self.logger = logger
         self.survey = survey
         self.response = response
+        self.context = context or ResponseContext(response)
+        self.rasteriser = rasteriser or get_rasteriser()
+        self.profile = profile or get_profile(survey.get('survey_id'))
+        self.cache = cache if cache is not None else image_cache
         self.sequence_no = sequence_no
         self.image_path = "" if base_image_path == "" else os.path.join(base_image_path, "Images")
         self.index_path = "" if base_image_path == "" else os.path.join(base_image_path, "Index")
@@ -49,64 +53,70 @@ class ImageTransformer:
         It appends data to the zip , so any data in the zip
         prior to this executing is not deleted.
         """
-        self._create_pdf(self.survey, self.response)
-        self._build_image_names(num_sequence, self._page_count)
-        self._create_index()
-        self._build_zip()
+        for _ in self.append_images(num_sequence):
+            pass
+        self.zip.rewind()
         return self.zip
 
+    def append_images(self, num_sequence=None):
+        """Builds the images and the index_file file into the zip file,
+        yielding after each file is appended so a streaming zip can send it.
+        """
+        try:
+            self._create_images(self.survey, self.response)
+            self._build_image_names(num_sequence, self._page_count)
+            self._create_index()
+            yield from self._build_zip()
+        except BaseException:
+            # Don't leave the zip open for the garbage collector to finish
+            self.zip.close()
+            raise
+
     def get_zip(self):
         """Get access to the in memory zip """
         self.zip.rewind()
         return self.zip.in_memory_zip
 
-    def _get_image_name(self, i: int):
-        tx_id = self.response["tx_id"]
-        return Formatter.get_image_name(tx_id, i)
-
-    def _create_pdf(self, survey, response):
-        """Create a pdf which will be used as the basis for images """
-        pdf_transformer = PDFTransformer(survey, response)
-        self._pdf, self._page_count = pdf_transformer.render_pages()
-        return self._pdf
+    def _create_images(self, survey, response):
+        """Lay out the pages and hand them to the rasteriser to make the images,
+        unless the images of an identical submission are cached"""
+        key = None
+        if self.cache.enabled:
+            key = image_key(survey, response, self.rasteriser.name, self.profile)
+            images = self.cache.get(key)
+            if images is not None:
+                self.logger.info("Using cached images", **self.cache.stats())
+                self._page_count, self._images = len(images), images
+                return self._images
+
+        pdf_transformer = PDFTransformer(survey, response, self.context)
+        self._page_count, self._images = self.rasteriser.images(pdf_transformer, self.profile)
+        if key is not None:
+            self._images = self._caching(key, self._images)
+        return self._images
+
+    def _caching(self, key, images):
+        """Pass the images on as they are made and cache them once all are made"""
+        made = []
+        for image in images:
+            made.append(image)
+            yield image
+        self.cache.put(key, made)
 
     def _build_image_names(self, num_sequence, image_count):
         """Build a collection of image names to use later"""
-        for i in self._get_image_sequence_list(image_count):
-            self._image_names.append(self._get_image_name(i))
+        self._image_names.extend(self.context.image_names(image_count))
 
     def _create_index(self):
         self.index_file = IndexFile(self.logger, self.response, self._page_count, self._image_names,
-                                    self.current_time, self.sequence_no)
+                                    self.current_time, self.sequence_no, self.context)
 
     def _build_zip(self):
         i = 0
-        for image in self._extract_pdf_images(self._pdf):
-            self.zip.append(os.path.join(self.image_path, self._image_names[i]), image)
+        for image in self._images:
+            self.zip.append(os.path.join(self.image_path, self._image_names[i]), image, kind="image")
             i += 1
-        self.zip.append(os.path.join(self.index_path, self.index_file.index_name), self.index_file.in_memory_index.getvalue())
-        self.zip.rewind()
-
-    @staticmethod
-    def _extract_pdf_images(pdf_stream):
-        """
-        Extract pdf pages as jpegs
-        """
-
-        process = subprocess.Popen(["pdftoppm", "-jpeg"],
-                                   stdin=subprocess.PIPE,
-                                   stdout=subprocess.PIPE,
-                                   stderr=subprocess.PIPE)
-        result, errors = process.communicate(pdf_stream)
-
-        if errors:
-            raise IOError("images:Could not extract Images from pdf: {0}".format(repr(errors)))
-
-        # FFD9 is an end of image marker in jpeg images
-        for image in result.split(b'\xFF\xD9'):
-            if len(image) > 11:  # we can get an end of file marker after the image and a jpeg header is 11 bytes long
-                yield image
-
-    @staticmethod
-    def _get_image_sequence_list(n):
-        return [i for i in range(1, n + 1)]
+            yield
+        self.zip.append(os.path.join(self.index_path, self.index_file.index_name), self.index_file.in_memory_index.getvalue(),
+                        kind="index")
+        yield
@@ -1,30 +1,319 @@
-from io import BytesIO
-from zipfile import ZIP_DEFLATED, ZipFile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import tempfile
+import threading
+import time
+import weakref
+from zipfile import ZIP64_LIMIT, ZIP_DEFLATED, ZIP_STORED, LargeZipFile, ZipFile, ZipInfo
+import zlib
+
+from transform import settings
+
+
+def compression_policy(spec):
+    """Turn the `kind=compression` pairs of `ZIP_COMPRESSION` into the arguments for each kind of file.
+
+    A compression is `stored`, or a deflate level from 0 to 9.
+
+    :returns: A dict of `(compress_type, compresslevel)` by kind of file.
+    :raises ValueError: If a compression is not recognised.
+
+    """
+    policy = {}
+    for kind, compression in spec.items():
+        if compression == "stored":
+            policy[kind] = (ZIP_STORED, None)
+        elif compression.isdigit() and 0 <= int(compression) <= 9:
+            policy[kind] = (ZIP_DEFLATED, int(compression))
+        else:
+            raise ValueError("Unknown zip compression for {0}: {1}".format(kind, compression))
+    return policy
+
+
+#: How each kind of file is compressed; any other kind is deflated at zlib's default level.
+COMPRESSION = compression_policy(settings.ZIP_COMPRESSION)
+
+#: The threads which compress files for every zip of the worker, if there is more than one.
+_executor = ThreadPoolExecutor(settings.ZIP_THREADS, thread_name_prefix="zip") if settings.ZIP_THREADS > 1 else None
+
+
+def _compress(data, compress_type, compresslevel):
+    """Return the CRC and compressed form of `data` as ZipFile would write them, and the seconds it took.
+
+    zlib releases the GIL, so several files can be compressed at once on different threads.
+
+    """
+    start = time.perf_counter()
+    crc = zlib.crc32(data)
+    if compress_type == ZIP_DEFLATED:
+        compressor = zlib.compressobj(-1 if compresslevel is None else compresslevel, zlib.DEFLATED, -15)
+        data = compressor.compress(data) + compressor.flush()
+    return crc, data, time.perf_counter() - start
+
+
+def _write_compressed(zip_file, zinfo, crc, compressed):
+    """Write a file which is already compressed to `zip_file`, as ZipFile.writestr would have written it."""
+    if zinfo.file_size * 1.05 > ZIP64_LIMIT:
+        raise LargeZipFile("Filesize would require ZIP64 extensions")
+    zinfo.CRC = crc
+    zinfo.compress_size = len(compressed)
+    with zip_file._lock:
+        if zip_file._seekable:
+            zip_file.fp.seek(zip_file.start_dir)
+        zinfo.header_offset = zip_file.fp.tell()
+        zip_file._writecheck(zinfo)
+        zip_file._didModify = True
+        zip_file.fp.write(zinfo.FileHeader(False))
+        zip_file.fp.write(compressed)
+        zip_file.start_dir = zip_file.fp.tell()
+        zip_file.filelist.append(zinfo)
+        zip_file.NameToInfo[zinfo.filename] = zinfo
+
+
+#: The buffers of the zips of this worker which are still in use.
+_buffers = weakref.WeakSet()
+_buffers_lock = threading.Lock()
+
+
+def memory_in_use():
+    """Return the bytes held in memory by the zip buffers of this worker."""
+    with _buffers_lock:
+        buffers = list(_buffers)
+    return sum(buffer.memory_bytes for buffer in buffers)
+
+
+class ZipBuffer(tempfile.SpooledTemporaryFile):
+    """A file which is held in memory until it grows past `max_size` bytes, or until
+    the zips of the worker hold more than `budget` bytes, and then moves to a temporary file.
+
+    :param int max_size: The size of one buffer which moves it to disk; 0 never moves it.
+    :param int budget: The size of all buffers of the worker which moves this one to disk; 0 has no limit.
+    :param str dir: The directory of the temporary file.
+
+    """
+
+    def __init__(self, max_size=0, budget=0, dir=None):
+        super().__init__(max_size=max_size, dir=dir or None)
+        self.budget = budget
+        self.memory_bytes = 0
+        self.peak_memory_bytes = 0
+        with _buffers_lock:
+            _buffers.add(self)
+
+    @property
+    def on_disk(self):
+        return self._rolled
+
+    # ZipFile needs these, which SpooledTemporaryFile only has from Python 3.11
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def fileno(self):
+        # SpooledTemporaryFile moves to disk when asked for a descriptor, which gunicorn
+        # does to every response body it might sendfile, so only a buffer on disk has one
+        if not self._rolled:
+            raise io.UnsupportedOperation("A zip buffer in memory has no file descriptor")
+        return super().fileno()
+
+    def rollover(self):
+        super().rollover()
+        self.memory_bytes = 0
+
+    def _check(self, file):
+        """Called after each write, while the buffer is in memory."""
+        if self._rolled:
+            return
+        # A BytesIO never shrinks, so its furthest extent is the memory it holds
+        self.memory_bytes = max(self.memory_bytes, file.tell())
+        self.peak_memory_bytes = max(self.peak_memory_bytes, self.memory_bytes)
+        if self._max_size and self.memory_bytes > self._max_size:
+            self.rollover()
+        elif self.budget and memory_in_use() > self.budget:
+            self.rollover()
 
 
 class InMemoryZip:
-    """Class for creating in memory Zip objects using BytesIO."""
-    def __init__(self):
-        self.in_memory_zip = BytesIO()
+    """Class for creating in memory Zip objects using BytesIO.
 
-    def append(self, filename_in_zip, file_contents):
+    One ZipFile stays open while files are appended, and the central directory is
+    written once, when the zip is read through :py:attr:`in_memory_zip`, :py:meth:`rewind`
+    or :py:meth:`close`. Appending after that reopens the zip and adds to it.
+
+    Each file is compressed according to its kind. With `ZIP_THREADS` set, files
+    are compressed on a pool of threads while the next ones are made, and written
+    in the order they were appended, byte for byte as they would be one at a time.
+
+    :param dict policy: How each kind of file is compressed, by default `ZIP_COMPRESSION`.
+    :param executor: The threads which compress the files, or False to compress them on the caller's.
+
+    The zip is written to a :py:class:`ZipBuffer`, which moves to a file in `ZIP_SPOOL_DIR`
+    once it is larger than `ZIP_SPOOL_BYTES`, or the zips of the worker together hold
+    more than `ZIP_MEMORY_BUDGET` in memory.
+    """
+    def __init__(self, policy=None, executor=None):
+        self._buffer = self._new_buffer()
+        self._zip_file = None
+        self._pending = deque()
+        self.policy = COMPRESSION if policy is None else policy
+        self.executor = _executor if executor is None else executor
+        self.file_bytes = 0
+        self.compressed_bytes = 0
+        self.compress_time = 0.0
+
+    @property
+    def in_memory_zip(self):
+        """The buffer holding the zip, finished so it can be read"""
+        self.close()
+        return self._buffer
+
+    def append(self, filename_in_zip, file_contents, kind=None):
         """Appends a file with name filename_in_zip and contents of
-        file_contents to the in-memory zip."""
-        # Get a handle to the in-memory zip in append mode
-        zf = ZipFile(self.in_memory_zip, "a", ZIP_DEFLATED, False)
+        file_contents to the in-memory zip.
 
-        # Write the file to the in-memory zip
-        zf.writestr(filename_in_zip, file_contents)
-        zf.close()
+        :param str kind: What the file is, one of the kinds in the compression policy:
+            `image`, `index`, `data`, `receipt` or `json`.
+        """
+        if self._zip_file is None:
+            self._zip_file = self._open()
+
+        compress_type, compresslevel = self.policy.get(kind, (ZIP_DEFLATED, None))
+        if isinstance(file_contents, str):
+            file_contents = file_contents.encode("utf-8")
+        zinfo = ZipInfo(filename_in_zip, date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = compress_type
+        zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = len(file_contents)
+
+        if self.executor:
+            self._pending.append((zinfo, self.executor.submit(_compress, file_contents, compress_type, compresslevel)))
+            # Write out whatever has been compressed, without waiting for the rest
+            while self._pending and self._pending[0][1].done():
+                self._write_pending()
+        else:
+            self._write(zinfo, *_compress(file_contents, compress_type, compresslevel))
         return self
 
+    def _new_buffer(self):
+        return ZipBuffer(settings.ZIP_SPOOL_BYTES, settings.ZIP_MEMORY_BUDGET, settings.ZIP_SPOOL_DIR)
+
+    def _open(self):
+        # Append mode picks up any files written before the zip was last finished
+        return ZipFile(self._buffer, "a", ZIP_DEFLATED, False)
+
+    def _write_pending(self):
+        zinfo, future = self._pending.popleft()
+        self._write(zinfo, *future.result())
+
+    def _write(self, zinfo, crc, data, duration):
+        _write_compressed(self._zip_file, zinfo, crc, data)
+        self.compress_time += duration
+        self.file_bytes += zinfo.file_size
+        self.compressed_bytes += zinfo.compress_size
+
+    def close(self):
+        """Write the central directory of the files appended so far"""
+        if self._zip_file is not None:
+            try:
+                while self._pending:
+                    self._write_pending()
+            finally:
+                self._pending.clear()
+                self._zip_file.close()
+                self._zip_file = None
+
     def rewind(self):
         """Rewind current file position to the start of in memory file"""
         self.in_memory_zip.seek(0)
 
     def get_filenames(self):
         """Returns a list of filenames currently in the zipfile"""
-        zf = ZipFile(self.in_memory_zip, "r", ZIP_DEFLATED, False)
+        if self._zip_file is not None:
+            return self._zip_file.namelist() + [zinfo.filename for zinfo, _ in self._pending]
+        zf = ZipFile(self._buffer, "r", ZIP_DEFLATED, False)
         file_names = zf.namelist()
         zf.close()
         return file_names
+
+    def stats(self):
+        """Return the bytes compression saved in the files appended, and the time it took"""
+        return {
+            "zip_bytes": self.compressed_bytes,
+            "zip_bytes_saved": self.file_bytes - self.compressed_bytes,
+            "zip_compress_ms": round(self.compress_time * 1000, 1),
+            "zip_peak_memory_bytes": self._buffer.peak_memory_bytes,
+            "zip_on_disk": self._buffer.on_disk,
+        }
+
+
+class _Chunks:
+    """A file which can only be written, and keeps what was written until it is taken."""
+
+    on_disk = False
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._position = 0
+        self.peak_memory_bytes = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._position += len(data)
+        self.peak_memory_bytes = max(self.peak_memory_bytes, self._size)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+class StreamingZip(InMemoryZip):
+    """A zip which is sent while it is made, rather than read once it is finished.
+
+    Each file is written with its size and CRC in its local header, as the files of
+    an :py:class:`InMemoryZip` are, and :py:meth:`take` returns the bytes written
+    since it was last called. The central directory is written by :py:meth:`close`,
+    after which no more files can be appended.
+    """
+    def __init__(self, policy=None, executor=None):
+        super().__init__(policy, executor)
+        self._closed = False
+
+    def _new_buffer(self):
+        return _Chunks()
+
+    def _open(self):
+        if self._closed:
+            raise ValueError("Can't append to a zip which has been sent")
+        return ZipFile(self._buffer, "w", ZIP_DEFLATED, False)
+
+    def close(self):
+        """Write the central directory, ending the zip"""
+        if not self._closed and self._zip_file is None:
+            # An empty zip is still a zip
+            self._zip_file = self._open()
+        super().close()
+        self._closed = True
+
+    def take(self):
+        """Return the bytes of the zip written since the last call"""
+        return self._buffer.take()
+
+    def rewind(self):
+        raise ValueError("A streaming zip can't be rewound")
@@ -1,9 +1,8 @@
 import datetime
-import dateutil.parser
 
 from io import BytesIO
 from transform import settings
-from transform.utilities.formatter import Formatter
+from transform.transformers.response_context import ResponseContext
 from transform.views.image_filters import get_env, format_date
 
 
@@ -11,7 +10,7 @@ class IndexFile:
     """Class for creating in memory index_file file using BytesIO."""
 
     def __init__(self, logger, response_data, image_count, image_names,
-                 current_time=None, sequence_no=1000):
+                 current_time=None, sequence_no=1000, context=None):
 
         if current_time is None:
             current_time = datetime.datetime.utcnow()
@@ -19,12 +18,13 @@ class IndexFile:
         self.in_memory_index = BytesIO()
         self.logger = logger
         self._response = response_data
+        self._context = context or ResponseContext(response_data)
         self._image_count = image_count
         self._creation_time = {
             'short': format_date(current_time, 'short'),
             'long': format_date(current_time)
         }
-        self.index_name = self._get_index_name(self._response)
+        self.index_name = self._context.index_name
         self._current_time = current_time  # used to test if current_time gets set to a default value in init definition
         self._build_index(image_names)
 
@@ -42,6 +42,7 @@ class IndexFile:
             SDX_FTP_IMAGES_PATH=image_path,
             images=image_names,
             response=self._response,
+            context=self._context,
             creation_time=self._creation_time
         )
 
@@ -51,11 +52,3 @@ class IndexFile:
 
         self.in_memory_index.write(template_output.encode())
         self.rewind()
-
-    @staticmethod
-    def _get_index_name(response):
-        survey_id = response['survey_id']
-        submission_date = dateutil.parser.parse(response['submitted_at'])
-        submission_date_str = format_date(submission_date, 'short')
-        tx_id = response["tx_id"]
-        return Formatter.get_index_name(survey_id, submission_date_str, tx_id)
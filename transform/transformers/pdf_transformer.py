@@ -1,6 +1,7 @@
-import arrow
-
+import copy
 from io import BytesIO
+import weakref
+
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -8,6 +9,10 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 from reportlab.platypus.flowables import HRFlowable
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 
+from transform.transformers.response_context import ResponseContext
+from transform.transformers.survey_registry import survey_registry
+from transform.utilities.dates import LOCALISED_FORMAT, format_datetime
+
 __doc__ = """
 SDX PDF Transformer.
 """
@@ -42,15 +47,100 @@ style_answer.spaceAfter = 20
 
 MAX_ANSWER_CHARACTERS_PER_LINE = 35
 
+table_style_data = [('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                    ('LINEBELOW', (0, 0), (-1, -1), 1, colors.black),
+                    ('BOX', (0, 0), (-1, -1), 1, colors.black),
+                    ('BOX', (0, 0), (0, -1), 1, colors.black),
+                    ('BACKGROUND', (0, 0), (1, 0), colors.lightblue)]
+
+heading_style = TableStyle(table_style_data)
+heading_style.spaceAfter = 25
+heading_style.add('SPAN', (0, 0), (1, 0))
+heading_style.add('ALIGN', (0, 0), (1, 0), 'CENTER')
+
+
+class PrebuiltParagraph(Paragraph):
+    """A Paragraph whose markup is parsed once and whose line breaks are kept for each width.
+
+    Each request draws a shallow copy from :py:meth:`copy`, so the position and size
+    reportlab records while laying out a page are never shared between documents.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wrapped = {}
+
+    def wrap(self, availWidth, availHeight):
+        try:
+            self.width, self.height, self.blPara, self._wrapWidths = self._wrapped[availWidth]
+        except KeyError:
+            super().wrap(availWidth, availHeight)
+            self._wrapped[availWidth] = (self.width, self.height, self.blPara, self._wrapWidths)
+        return self.width, self.height
+
+    def copy(self):
+        return copy.copy(self)
+
+
+class SurveyFlowables:
+    """The parts of the PDF of a survey which are the same for every response.
+
+    Paragraphs for the title, section headers and question texts are built the first
+    time they are needed and reused for later responses to the same survey.
+
+    """
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self._title = None
+        self._section_headers = {}
+        self._questions = {}
+
+    def title(self):
+        if self._title is None:
+            self._title = PrebuiltParagraph(self.compiled.definition['title'], style_h)
+        return self._title.copy()
+
+    def section_header(self, section):
+        try:
+            paragraph = self._section_headers[section]
+        except KeyError:
+            title = self.compiled.model.question_groups[section].title
+            paragraph = self._section_headers[section] = PrebuiltParagraph(title, style_sh)
+        return paragraph.copy()
+
+    def question(self, section, position):
+        try:
+            paragraph = self._questions[section, position]
+        except KeyError:
+            question = self.compiled.model.question_groups[section].questions[position]
+            paragraph = self._questions[section, position] = PrebuiltParagraph(question.display_text, style_n)
+        return paragraph.copy()
+
+
+#: Prebuilt flowables by compiled survey. Entries go when a reload replaces the survey.
+survey_flowables = weakref.WeakKeyDictionary()
+
+
+def get_survey_flowables(compiled):
+    """Return the :py:class:`SurveyFlowables` of a compiled survey."""
+    try:
+        return survey_flowables[compiled]
+    except KeyError:
+        return survey_flowables.setdefault(compiled, SurveyFlowables(compiled))
+
 
 class PDFTransformer:
 
-    def __init__(self, survey, response_data):
+    def __init__(self, survey, response_data, context=None):
         '''
         Sets up variables needed to write out a pdf
         '''
         self.survey = survey
         self.response = response_data
+        self.context = context or ResponseContext(response_data)
 
     def render(self):
         """Get the pdf data in memory"""
@@ -59,36 +149,40 @@ class PDFTransformer:
     def render_pages(self):
         """Return both the in memory pdf data and a count of the pages"""
         buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        doc.build(self.get_elements())
+        page_count = self.write_pages(buffer)
 
         pdf = buffer.getvalue()
 
         buffer.close()
 
-        return pdf, doc.page
+        return pdf, page_count
 
-    def get_elements(self):
+    def write_pages(self, fileobj):
+        """Write the pdf to an open binary file and return the count of pages"""
+        doc = SimpleDocTemplate(fileobj, pagesize=A4)
+        doc.build(self.get_elements())
+        fileobj.flush()
+        return doc.page
 
-        elements = []
-        table_style_data = [('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                            ('LINEBELOW', (0, 0), (-1, -1), 1, colors.black),
-                            ('BOX', (0, 0), (-1, -1), 1, colors.black),
-                            ('BOX', (0, 0), (0, -1), 1, colors.black),
-                            ('BACKGROUND', (0, 0), (1, 0), colors.lightblue)]
+    def draw_pages(self, canvasmaker):
+        """Lay out the pages on a canvas made by `canvasmaker` without writing a PDF.
+
+        :returns: The `pages` collected by the canvas.
+
+        """
+        doc = SimpleDocTemplate(BytesIO(), pagesize=A4)
+        doc.build(self.get_elements(), canvasmaker=canvasmaker)
+        return doc.canv.pages
 
-        table_style = TableStyle(table_style_data)
-        table_style.spaceAfter = 25
+    def get_elements(self):
 
-        heading_style = TableStyle(table_style_data)
-        heading_style.spaceAfter = 25
-        heading_style.add('SPAN', (0, 0), (1, 0))
-        heading_style.add('ALIGN', (0, 0), (1, 0), 'CENTER')
+        elements = []
+        compiled = survey_registry.get(self.survey)
+        flowables = get_survey_flowables(compiled)
 
-        localised_date_str = PDFTransformer.get_localised_date(self.response['submitted_at'])
+        localised_date_str = self.context.localised_submitted_at
 
-        heading_data = [[Paragraph(self.survey['title'], style_h)]]
+        heading_data = [[flowables.title()]]
         heading_data.append(['Form Type', self.response['collection']['instrument_id']])
         heading_data.append(['Respondent', self.response['metadata']['ru_ref']])
         heading_data.append(['Submitted At', localised_date_str])
@@ -97,34 +191,25 @@ class PDFTransformer:
 
         elements.append(heading)
 
-        for question_group in filter(lambda x: 'title' in x, self.survey['question_groups']):
-
-            section_heading = True
-
-            for question in filter(lambda x: 'text' in x, question_group['questions']):
-                if question['question_id'] in self.response['data']:
-                    try:
-                        answer = str(self.response['data'][question['question_id']])
-                    except KeyError:
-                        answer = ''
+        # Walk only the answered questions, in survey order. Whole sections
+        # are suppressed if they have no answers.
+        data = self.response['data']
+        current_section = None
 
-                    # Output the section header if we haven't already
-                    # Checking here so that whole sections are suppressed
-                    # if they have no answers.
-                    if section_heading:
-                        elements.append(HRFlowable(width="100%"))
-                        elements.append(Paragraph(question_group['title'], style_sh))
-                        section_heading = False
+        question_groups = compiled.model.question_groups
+        for section, position in compiled.answered_positions(data):
+            # Output the section header if we haven't already
+            if section != current_section:
+                elements.append(HRFlowable(width="100%"))
+                elements.append(flowables.section_header(section))
+                current_section = section
 
-                    # Question not output if answer is empty
-                    text = question.get("text")
-                    if not text[0].isdigit():
-                        text = " ".join((question.get("number", ""), text))
-                    elements.append(Paragraph(text, style_n))
-                    elements.append(Paragraph(answer, style_answer))
+            question = question_groups[section].questions[position]
+            elements.append(flowables.question(section, position))
+            elements.append(Paragraph(str(data[question.question_id]), style_answer))
 
         return elements
 
     @staticmethod
     def get_localised_date(date_to_transform, timezone='Europe/London'):
-        return arrow.get(date_to_transform).to(timezone).format("DD MMMM YYYY HH:mm:ss")
+        return format_datetime(date_to_transform, LOCALISED_FORMAT, timezone)
@@ -0,0 +1,44 @@
+from transform import settings
+from transform.transformers.rasterisers.mutool import MutoolRasteriser
+from transform.transformers.rasterisers.pdftocairo import PdftocairoRasteriser
+from transform.transformers.rasterisers.pdftoppm import PdftoppmRasteriser
+from transform.transformers.rasterisers.pillow import PillowRasteriser
+from transform.transformers.rasterisers.profiles import ImageProfile, PROFILES, get_profile
+
+__doc__ = """
+Backends which turn the pages of a submission into JPEG images.
+
+Each backend has an `images` method which takes a
+:py:class:`transform.transformers.pdf_transformer.PDFTransformer` and an
+:py:class:`ImageProfile`, and returns the page count and an iterable of JPEG images,
+one per page, and an `available` class method which says whether it can run here.
+The backend is chosen with the `IMAGE_BACKEND` setting, and `auto` picks the fastest
+one installed, as found by :py:mod:`transform.transformers.rasterisers.probe`.
+"""
+
+RASTERISERS = {
+    MutoolRasteriser.name: MutoolRasteriser,
+    PdftocairoRasteriser.name: PdftocairoRasteriser,
+    PdftoppmRasteriser.name: PdftoppmRasteriser,
+    PillowRasteriser.name: PillowRasteriser,
+}
+
+
+def get_rasteriser(name=None):
+    """Return an instance of the rasteriser called `name`, or of the configured one.
+
+    :raises ValueError: If there is no rasteriser called `name`.
+
+    """
+    name = name or settings.IMAGE_BACKEND
+    if name == "auto":
+        from transform.transformers.rasterisers.probe import best_rasteriser
+        name = best_rasteriser()
+    try:
+        return RASTERISERS[name]()
+    except KeyError:
+        raise ValueError("Unknown image backend: {0}".format(name))
+
+
+__all__ = ['ImageProfile', 'MutoolRasteriser', 'PdftocairoRasteriser', 'PdftoppmRasteriser', 'PillowRasteriser',
+           'PROFILES', 'RASTERISERS', 'get_profile', 'get_rasteriser']
@@ -0,0 +1,171 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from transform import settings
+from transform.transformers.rasterisers.limits import Watchdog, limiter
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE
+
+__doc__ = """
+Helpers for the backends which run an external tool on the PDF of a submission.
+
+Most tools render one page after another, so a long document is split into page
+ranges which are rendered by separate processes at the same time. The PDF is written
+once to an anonymous file in memory which every process opens, and the pages are
+read back from files in a tmpfs directory.
+
+Each process takes a slot of the :py:data:`limits.limiter` and is killed if it runs
+past `IMAGE_TIMEOUT`. If one range fails, the processes of the others are killed too.
+"""
+
+#: A memory backed directory for the files passed to and from the tools, if there is one.
+TMPFS = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def memory_file(name="pdf"):
+    """Open an anonymous read and write file held in memory.
+
+    A memfd is used where the platform has one, otherwise an unlinked file in :py:data:`TMPFS`.
+
+    """
+    if hasattr(os, "memfd_create"):
+        return os.fdopen(os.memfd_create(name), "w+b")
+    return tempfile.TemporaryFile(dir=TMPFS)
+
+
+def page_ranges(page_count, parallelism=None, min_pages=None):
+    """Split `page_count` pages into at most `parallelism` ranges of at least `min_pages` pages.
+
+    :returns: A list of `(first, last)` page numbers, counting from 1 and inclusive.
+
+    """
+    parallelism = parallelism or settings.IMAGE_PARALLELISM
+    min_pages = min_pages or settings.IMAGE_MIN_PAGES_PER_RANGE
+    count = max(1, min(parallelism, page_count // min_pages))
+    size, extra = divmod(page_count, count)
+    ranges = []
+    first = 1
+    for i in range(count):
+        last = first + size - 1 + (1 if i < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges
+
+
+def in_ranges(rasterise_range, page_count):
+    """Call `rasterise_range(first, last, cancelled=event)` for each page range and yield the images in order.
+
+    A document too short to split is rendered with `rasterise_range()`. If the images
+    are abandoned or a range fails, the event is set so the other ranges stop.
+
+    """
+    ranges = page_ranges(page_count) if page_count else []
+    if len(ranges) < 2:
+        yield from rasterise_range()
+        return
+
+    cancelled = threading.Event()
+
+    def cancel_on_failure(future):
+        # Stop the other ranges as soon as one fails, not once its images are reached
+        if not future.cancelled() and future.exception() is not None:
+            cancelled.set()
+
+    with ThreadPoolExecutor(len(ranges) - 1) as executor:
+        # The first range streams from this thread while the rest are read on others
+        later = [executor.submit(lambda r: list(rasterise_range(*r, cancelled=cancelled)), r) for r in ranges[1:]]
+        for future in later:
+            future.add_done_callback(cancel_on_failure)
+        try:
+            yield from rasterise_range(*ranges[0], cancelled=cancelled)
+            for future in later:
+                yield from future.result()
+        except BaseException:
+            # Stop the other ranges before the executor waits for them
+            cancelled.set()
+            for future in later:
+                future.cancel()
+            raise
+
+
+def _page_number(file_name):
+    # Tools number pages with or without padding; either way a longer name is a later page
+    return len(file_name), file_name
+
+
+class CommandRasteriser(ABC):
+    """A backend which runs `command` on the PDF of a submission.
+
+    Subclasses set :py:attr:`name` and :py:attr:`command`, and implement :py:meth:`arguments`.
+
+    """
+
+    name = None
+    command = None
+
+    #: Whether any output on stderr is an error, rather than only a failed exit status.
+    strict = True
+
+    @classmethod
+    def available(cls):
+        """Whether the tool is installed."""
+        return shutil.which(cls.command) is not None
+
+    def images(self, pdf_transformer, profile=DEFAULT_PROFILE):
+        """Return the page count and the JPEG images of the pages drawn by `pdf_transformer`.
+
+        :param profile: The :py:class:`ImageProfile` of the images.
+
+        """
+        pdf_file = memory_file()
+        page_count = pdf_transformer.write_pages(pdf_file)
+        return page_count, self.rasterise_file(pdf_file, page_count, profile)
+
+    @classmethod
+    def rasterise_file(cls, pdf_file, page_count=None, profile=DEFAULT_PROFILE):
+        """Extract the pages of the pdf in an open file as jpegs, closing the file once done"""
+        try:
+            yield from in_ranges(
+                functools.partial(cls._rasterise_file_range, pdf_file.fileno(), profile), page_count)
+        finally:
+            pdf_file.close()
+
+    @classmethod
+    @abstractmethod
+    def arguments(cls, pdf_path, output, profile, first=None, last=None):
+        """Return the command line which renders pages `first` to `last`, or all of them.
+
+        :param str pdf_path: The path of the PDF.
+        :param str output: The path of the output files without a page number or extension.
+
+        """
+
+    @classmethod
+    def encode(cls, data, profile):
+        """Return the JPEG for a page from the content of a file written by the tool."""
+        return data
+
+    @classmethod
+    def _rasterise_file_range(cls, fd, profile, first=None, last=None, cancelled=None):
+        with tempfile.TemporaryDirectory(prefix=cls.name + "-", dir=TMPFS) as output:
+            # Opening /dev/fd/N gives each process its own offset into the shared file
+            args = cls.arguments("/dev/fd/{0}".format(fd), os.path.join(output, "page"), profile, first, last)
+            with limiter.slot():
+                if cancelled is not None and cancelled.is_set():
+                    return
+                process = subprocess.Popen(args, pass_fds=(fd,), start_new_session=True,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                with Watchdog(process, settings.IMAGE_TIMEOUT, cancelled):
+                    _, errors = process.communicate()
+
+            if process.returncode or (cls.strict and errors):
+                raise IOError("images:Could not extract Images from pdf: {0}".format(repr(errors)))
+
+            for name in sorted(os.listdir(output), key=_page_number):
+                with open(os.path.join(output, name), "rb") as fh:
+                    yield cls.encode(fh.read(), profile)
@@ -0,0 +1,114 @@
+import re
+
+__doc__ = """
+Split a stream of concatenated JPEG images, such as the output of `pdftoppm -jpeg`.
+
+The images are found by walking their markers rather than by searching for the
+end of image bytes, which can also occur inside a segment such as an embedded
+thumbnail. Each image is returned as soon as its last byte has been read.
+"""
+
+_SOI = b"\xFF\xD8"
+_EOI = 0xD9
+_SOS = 0xDA
+
+# Markers with no length field after them
+_STANDALONE = frozenset([0x01] + list(range(0xD0, 0xD8)))
+
+# In entropy coded data FF is followed by a stuffed 00, a restart marker or fill bytes;
+# anything else ends the scan
+_END_OF_SCAN = re.compile(b"\xFF[^\x00\xD0-\xD7\xFF]")
+
+
+class JpegSplitter:
+    """Splits the bytes fed to it into whole JPEG images.
+
+    Data is kept in one buffer and each image is copied out of it once, through a
+    memoryview, when it is complete.
+
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._start = None
+        self._pos = 0
+        self._in_scan = False
+
+    def feed(self, data):
+        """Add `data` and return a list of the images it completed.
+
+        :raises IOError: If the data is not a sequence of JPEG images.
+
+        """
+        self._buffer += data
+        images = []
+        while True:
+            image = self._next_image()
+            if image is None:
+                return images
+            images.append(image)
+
+    def close(self):
+        """Check that no image was left incomplete.
+
+        :raises IOError: If the data ended part way through an image.
+
+        """
+        if self._start is not None:
+            raise IOError("images:Image data ended part way through a page")
+
+    def _next_image(self):
+        buffer = self._buffer
+        if self._start is None:
+            start = buffer.find(_SOI, self._pos)
+            if start < 0:
+                # Anything between images is padding; keep a byte in case it starts a marker
+                del buffer[:max(0, len(buffer) - 1)]
+                self._pos = 0
+                return None
+            self._start = start
+            self._pos = start + 2
+
+        while True:
+            if self._in_scan:
+                match = _END_OF_SCAN.search(buffer, self._pos)
+                if match is None:
+                    self._pos = max(self._pos, len(buffer) - 1)
+                    return None
+                self._pos = match.start()
+                self._in_scan = False
+
+            pos = self._pos
+            if pos + 2 > len(buffer):
+                return None
+            if buffer[pos] != 0xFF:
+                raise IOError("images:Invalid image data at byte {0}".format(pos))
+
+            marker = buffer[pos + 1]
+            if marker == 0xFF:
+                self._pos = pos + 1
+            elif marker == _EOI:
+                return self._take(pos + 2)
+            elif marker in _STANDALONE:
+                self._pos = pos + 2
+            else:
+                if pos + 4 > len(buffer):
+                    return None
+                self._pos = pos + 2 + (buffer[pos + 2] << 8 | buffer[pos + 3])
+                self._in_scan = marker == _SOS
+
+    def _take(self, end):
+        with memoryview(self._buffer) as view:
+            image = bytes(view[self._start:end])
+        del self._buffer[:end]
+        self._start = None
+        self._pos = 0
+        return image
+
+
+def split_jpegs(chunks):
+    """Yield each image in an iterable of byte strings as soon as it is complete."""
+    splitter = JpegSplitter()
+    for chunk in chunks:
+        yield from splitter.feed(chunk)
+    splitter.close()
@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+import os
+import signal
+import threading
+import time
+
+from transform import settings
+
+__doc__ = """
+Limits on the rasterisers of a worker.
+
+A :py:class:`Limiter` caps how many rasterisations run at once, so a burst of
+requests queues instead of oversubscribing the CPU. A :py:class:`Watchdog` kills a
+rasteriser process, and anything it started, once it runs past `IMAGE_TIMEOUT` or its
+job is cancelled.
+"""
+
+
+class RasterisationError(IOError):
+    """The images of a submission could not be made in time."""
+
+
+class RasteriserBusy(RasterisationError):
+    """No rasteriser became free within `IMAGE_QUEUE_TIMEOUT`."""
+
+
+class RasterisationTimeout(RasterisationError):
+    """A rasteriser ran for longer than `IMAGE_TIMEOUT`."""
+
+
+class Limiter:
+    """A semaphore for rasterisations which records how long each one waited for it.
+
+    :param int size: How many rasterisations may run at once.
+    :param float timeout: Seconds to wait before giving up with :py:class:`RasteriserBusy`.
+
+    """
+
+    def __init__(self, size, timeout=None):
+        self.size = size
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.busy = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the :py:attr:`size` slots for the duration of the block.
+
+        :raises RasteriserBusy: If no slot is free within :py:attr:`timeout` seconds.
+
+        """
+        start = time.monotonic()
+        acquired = self._semaphore.acquire(timeout=self.timeout)
+        wait = time.monotonic() - start
+        with self._lock:
+            if acquired:
+                self.acquired += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            else:
+                self.busy += 1
+        if not acquired:
+            raise RasteriserBusy("images:No rasteriser was free after {0:.1f}s".format(wait))
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    def stats(self):
+        """Return how many rasterisations ran or were turned away, and how long they waited."""
+        return {
+            "size": self.size,
+            "acquired": self.acquired,
+            "busy": self.busy,
+            "wait_mean_ms": round(1000 * self.wait_total / self.acquired, 3) if self.acquired else 0.0,
+            "wait_max_ms": round(1000 * self.wait_max, 3),
+        }
+
+
+def kill_group(process):
+    """Kill `process` and every process in its group."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class Watchdog:
+    """Kills the process group of `process` after `timeout` seconds, or as soon as `cancelled` is set.
+
+    The process must have been started in a session of its own. Leaving the block
+    raises :py:class:`RasterisationTimeout` if the watchdog fired, in place of whatever
+    error the killed process caused.
+
+    """
+
+    def __init__(self, process, timeout=None, cancelled=None):
+        self.process = process
+        self.timeout = timeout or None
+        self.cancelled = cancelled or threading.Event()
+        self.expired = False
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="rasteriser-watchdog", daemon=True)
+
+    def _watch(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        # Check for the end of the job, a cancellation or the deadline a few times a second
+        while not self._done.wait(0.05):
+            timed_out = deadline is not None and time.monotonic() >= deadline
+            if timed_out or self.cancelled.is_set():
+                if self.process.poll() is None:
+                    self.expired = timed_out
+                    kill_group(self.process)
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._done.set()
+        self._thread.join()
+        if self.expired:
+            raise RasterisationTimeout("images:Rasteriser ran for more than {0}s".format(self.timeout))
+        return False
+
+
+limiter = Limiter(settings.IMAGE_MAX_CONCURRENT, settings.IMAGE_QUEUE_TIMEOUT or None)
@@ -0,0 +1,33 @@
+from io import BytesIO
+
+from PIL import Image
+
+from transform.transformers.rasterisers.command import CommandRasteriser
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE, encode
+
+__doc__ = """
+Rasterise a PDF with `mutool draw` from MuPDF.
+"""
+
+
+class MutoolRasteriser(CommandRasteriser):
+    """Renders the PDF of a submission to PNG pages with `mutool draw` and encodes them as JPEG."""
+
+    name = "mutool"
+    command = "mutool"
+
+    # mutool reports problems it has worked around on stderr
+    strict = False
+
+    @classmethod
+    def arguments(cls, pdf_path, output, profile, first=None, last=None):
+        args = [cls.command, "draw", "-q", "-r", str(profile.dpi), "-c", "rgb" if profile.colour == "rgb" else "gray",
+                "-o", output + "-%d.png", pdf_path]
+        if first is not None:
+            args.append("{0}-{1}".format(first, last))
+        return args
+
+    @classmethod
+    def encode(cls, data, profile=DEFAULT_PROFILE):
+        with Image.open(BytesIO(data)) as image:
+            return encode(image, profile)
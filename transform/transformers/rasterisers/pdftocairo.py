@@ -0,0 +1,27 @@
+from transform.transformers.rasterisers.command import CommandRasteriser
+from transform.transformers.rasterisers.pdftoppm import poppler_options, reencode, writes_jpeg_of
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE
+
+__doc__ = """
+Rasterise a PDF with the `pdftocairo` tool from poppler-utils.
+"""
+
+
+class PdftocairoRasteriser(CommandRasteriser):
+    """Converts the PDF of a submission to JPEG pages with `pdftocairo`, which renders with cairo."""
+
+    name = "pdftocairo"
+    command = "pdftocairo"
+
+    @classmethod
+    def arguments(cls, pdf_path, output, profile, first=None, last=None):
+        # pdftocairo only writes black and white to PNG, so mono pages are rendered grey and thresholded
+        options = poppler_options(profile._replace(colour="grey") if profile.colour == "mono" else profile,
+                                  first, last)
+        return [cls.command] + options + [pdf_path, output]
+
+    @classmethod
+    def encode(cls, data, profile=DEFAULT_PROFILE):
+        if profile.colour != "mono" and writes_jpeg_of(profile):
+            return data
+        return reencode(data, profile)
@@ -0,0 +1,184 @@
+import functools
+from io import BytesIO
+import queue
+import subprocess
+import threading
+
+from PIL import Image
+
+from transform import settings
+from transform.transformers.rasterisers.command import CommandRasteriser, in_ranges
+from transform.transformers.rasterisers.jpeg import split_jpegs
+from transform.transformers.rasterisers.limits import Watchdog, kill_group, limiter
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE, encode
+
+__doc__ = """
+Rasterise a PDF with the `pdftoppm` tool from poppler-utils.
+
+`pdftoppm` renders one page after another, so a long document is split into page
+ranges which are rendered by separate processes at the same time. Each page is
+returned as soon as `pdftoppm` has written it. The pages are read on a thread of their
+own until the range is done, however slowly they are taken, so the slot of the range
+and its timeout end with `pdftoppm` rather than with the caller.
+
+With `IMAGE_HANDOFF=file` the PDF is instead handed over the way the other tools
+get it, through an anonymous file in memory, as described in
+:py:mod:`transform.transformers.rasterisers.command`.
+"""
+
+#: Bytes read from `pdftoppm` at a time.
+CHUNK_SIZE = 64 * 1024
+
+#: Put on the queue of pages once a range has been read.
+_END = object()
+
+
+def poppler_options(profile, first=None, last=None):
+    """Return the options of the poppler tools for `profile` and a page range.
+
+    The JPEG quality and progression are left to :py:func:`reencode`, as the poppler of
+    our image is older than the `-jpegopt` option.
+
+    """
+    args = ["-jpeg"]
+    # Options matching the defaults of the tools are left out
+    if profile.dpi != DEFAULT_PROFILE.dpi:
+        args += ["-r", str(profile.dpi)]
+    if profile.colour == "grey":
+        args.append("-gray")
+    elif profile.colour == "mono":
+        args.append("-mono")
+    if first is not None:
+        args += ["-f", str(first), "-l", str(last)]
+    return args
+
+
+def writes_jpeg_of(profile):
+    """Whether the JPEGs written by the poppler tools have the quality and progression of `profile`."""
+    return profile.quality == DEFAULT_PROFILE.quality and profile.progressive == DEFAULT_PROFILE.progressive
+
+
+def reencode(data, profile):
+    """Return a page written by a poppler tool as a JPEG of `profile`."""
+    with Image.open(BytesIO(data)) as image:
+        return encode(image, profile)
+
+
+class PdftoppmRasteriser(CommandRasteriser):
+    """Renders the PDF of a submission and converts it to JPEG pages with `pdftoppm`."""
+
+    name = "pdftoppm"
+    command = "pdftoppm"
+
+    def images(self, pdf_transformer, profile=DEFAULT_PROFILE):
+        """Return the page count and the JPEG images of the pages drawn by `pdf_transformer`.
+
+        :param profile: The :py:class:`ImageProfile` of the images.
+
+        """
+        if settings.IMAGE_HANDOFF == "file":
+            return super().images(pdf_transformer, profile)
+
+        pdf, page_count = pdf_transformer.render_pages()
+        return page_count, self.rasterise(pdf, page_count, profile)
+
+    @classmethod
+    def rasterise(cls, pdf, page_count=None, profile=DEFAULT_PROFILE):
+        """Extract pdf pages as jpegs, rendering ranges of a long document in parallel"""
+        return in_ranges(functools.partial(cls._rasterise_range, pdf, profile, page_count=page_count), page_count)
+
+    @classmethod
+    def arguments(cls, pdf_path, output, profile, first=None, last=None):
+        return [cls.command] + poppler_options(profile, first, last) + [pdf_path, output]
+
+    @classmethod
+    def encode(cls, data, profile=DEFAULT_PROFILE):
+        return data if writes_jpeg_of(profile) else reencode(data, profile)
+
+    @classmethod
+    def _rasterise_range(cls, pdf, profile, first=None, last=None, cancelled=None, page_count=None):
+        # The pages are read on another thread, which goes on reading while the caller is
+        # busy with those before, so a slow reader never holds a slot or runs down the watchdog
+        if first is not None:
+            page_count = last - first + 1
+        pages = queue.Queue()
+        abandoned = threading.Event()
+        reader = threading.Thread(target=cls._read_range,
+                                  args=(pdf, profile, first, last, cancelled, page_count, pages, abandoned),
+                                  name="pdftoppm", daemon=True)
+        reader.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is _END:
+                    break
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+        finally:
+            abandoned.set()
+
+    @classmethod
+    def _read_range(cls, pdf, profile, first, last, cancelled, page_count, pages, abandoned):
+        """Put each page of the range on `pages` as `pdftoppm` writes it, then :py:data:`_END` or the error.
+
+        :param int page_count: The number of pages the range should have, if it is known.
+
+        """
+        try:
+            cls._run(pdf, profile, first, last, cancelled, page_count, pages, abandoned)
+        except Exception as e:
+            pages.put(e)
+        else:
+            pages.put(_END)
+
+    @classmethod
+    def _run(cls, pdf, profile, first, last, cancelled, page_count, pages, abandoned):
+        with limiter.slot():
+            # Another range failed while this one waited for its slot
+            if cancelled is not None and cancelled.is_set():
+                return
+            process = subprocess.Popen([cls.command] + poppler_options(profile, first, last),
+                                       stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE,
+                                       start_new_session=True)
+
+            # Feed the PDF and collect errors on other threads while the pages are read as they arrive
+            errors = []
+            threads = [
+                threading.Thread(target=_write_and_close, args=(process.stdin, pdf), daemon=True),
+                threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True),
+            ]
+            for thread in threads:
+                thread.start()
+            read = 0
+            try:
+                with Watchdog(process, settings.IMAGE_TIMEOUT, cancelled):
+                    for image in split_jpegs(iter(functools.partial(process.stdout.read1, CHUNK_SIZE), b"")):
+                        if abandoned.is_set():
+                            return
+                        pages.put(cls.encode(image, profile))
+                        read += 1
+                    for thread in threads:
+                        thread.join()
+                    process.wait()
+            finally:
+                if process.poll() is None:
+                    kill_group(process)
+                    process.wait()
+                process.stdout.close()
+
+        if process.returncode or (errors and errors[0]):
+            raise IOError("images:Could not extract Images from pdf: {0}".format(repr(errors[0] if errors else b"")))
+        if page_count is not None and read != page_count:
+            raise IOError("images:pdftoppm returned {0} of {1} pages".format(read, page_count))
+
+
+def _write_and_close(pipe, data):
+    try:
+        pipe.write(data)
+        pipe.close()
+    except BrokenPipeError:
+        # pdftoppm stopped early; its errors say why
+        pass
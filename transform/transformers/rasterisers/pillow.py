@@ -0,0 +1,312 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import re
+
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfgen.canvas import Canvas
+
+from transform import settings
+from transform.transformers.rasterisers.limits import limiter
+from transform.transformers.rasterisers.pool import get_pool
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE, encode
+
+__doc__ = """
+Rasterise the pages of a submission in process with Pillow.
+
+Instead of writing a PDF and converting it with an external tool, the layout is
+drawn on a :py:class:`RasterCanvas`. It keeps the drawing operations of each page,
+which :py:func:`render_page` paints straight onto an image. Only the operations
+reportlab emits for the flowables used in :py:mod:`transform.transformers.pdf_transformer`
+are understood: paths, rectangles, colours and text in the standard fonts.
+"""
+
+#: The drawing operations of one page, as reportlab would write them to a PDF.
+Page = namedtuple("Page", ["width", "height", "code", "fonts"])
+
+_identity = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+_tokens = re.compile(r"\((?:\\.|[^\\)])*\)|/[^\s/\[\]()<>]+|\[|\]|[^\s\[\]()/]+", re.DOTALL)
+_escapes = re.compile(r"\\([0-7]{1,3}|.)", re.DOTALL)
+_escaped = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "\n": ""}
+
+
+class RasterCanvas(Canvas):
+    """A reportlab canvas which keeps the drawing operations of each page instead of writing a PDF."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = []
+
+    def showPage(self):
+        code = " ".join([self._preamble] + self._code)
+        fonts = {name.lstrip("/"): font_name for font_name, name in self._doc.fontMapping.items()}
+        self.pages.append(Page(self._pagesize[0], self._pagesize[1], code, fonts))
+        if self._onPage:
+            self._onPage(self._pageNumber)
+        self._startPage()
+
+    def save(self):
+        if len(self._code):
+            self.showPage()
+
+
+def _multiply(m, n):
+    return (
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    )
+
+
+def _unescape(literal):
+    def replace(match):
+        value = match.group(1)
+        if value[0].isdigit():
+            return chr(int(value, 8) & 0xFF)
+        return _escaped.get(value, value)
+    # Text in the standard fonts is written in WinAnsiEncoding
+    return _escapes.sub(replace, literal[1:-1]).encode("latin-1", "replace").decode("cp1252", "replace")
+
+
+@functools.lru_cache(maxsize=64)
+def _font(font_name, size):
+    try:
+        return ImageFont.truetype(pdfmetrics.getFont(font_name).face.findT1File(), size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=8192)
+def _glyph(font_name, size, char):
+    """Return the mask of `char` and its offset from the pen position on the baseline.
+
+    Drawing a page one cached glyph at a time is much faster than asking FreeType to
+    render each string, as a page repeats a few dozen characters in two or three sizes.
+
+    """
+    font = _font(font_name, size)
+    ascent, descent = font.getmetrics()
+    mask = Image.new("L", (2 * size + 2, ascent + descent + 2))
+    ImageDraw.Draw(mask).text((1, 1), char, fill=255, font=font)
+    box = mask.getbbox()
+    if box is None:
+        return None
+    return mask.crop(box), box[0] - 1, box[1] - 1 - ascent
+
+
+class _Painter:
+    """Paints the operations of a :py:class:`Page` onto an image."""
+
+    def __init__(self, page, image, scale):
+        self.page = page
+        self.image = image
+        self.draw = ImageDraw.Draw(image)
+        self.scale = scale
+        self.ctm = (scale, 0.0, 0.0, -scale, 0.0, page.height * scale)
+        self.stack = []
+        self.fill = self.stroke = (0, 0, 0)
+        self.line_width = 1.0
+        self.path = []
+        self.font_name, self.font_size, self.leading = "Helvetica", 12.0, 0.0
+        self.tm = self.tlm = _identity
+
+    def point(self, x, y, m=None):
+        a, b, c, d, e, f = m or self.ctm
+        return a * x + c * y + e, b * x + d * y + f
+
+    def paint(self):
+        operands = []
+        arrays = []
+        for token in _tokens.findall(self.page.code):
+            first = token[0]
+            if first == "(":
+                operands.append(_unescape(token))
+            elif first == "/":
+                operands.append(token[1:])
+            elif first == "[":
+                arrays.append(operands)
+                operands = []
+            elif first == "]":
+                if arrays:
+                    array, operands = operands, arrays.pop()
+                    operands.append(array)
+            else:
+                try:
+                    operands.append(float(token))
+                except ValueError:
+                    self.operator(token, operands)
+                    operands = []
+
+    def operator(self, op, args):
+        if op == "q":
+            self.stack.append((self.ctm, self.fill, self.stroke, self.line_width,
+                               self.font_name, self.font_size, self.leading))
+        elif op == "Q":
+            if self.stack:
+                (self.ctm, self.fill, self.stroke, self.line_width,
+                 self.font_name, self.font_size, self.leading) = self.stack.pop()
+        elif op == "cm":
+            self.ctm = _multiply(tuple(args), self.ctm)
+        elif op in ("rg", "g", "k"):
+            self.fill = _colour(args)
+        elif op in ("RG", "G", "K"):
+            self.stroke = _colour(args)
+        elif op == "w":
+            self.line_width = args[0]
+        elif op == "m":
+            self.path.append([self.point(*args)])
+        elif op == "l":
+            if self.path:
+                self.path[-1].append(self.point(*args))
+        elif op == "c":
+            if self.path:
+                self.path[-1].append(self.point(*args[4:6]))
+        elif op in ("v", "y"):
+            if self.path:
+                self.path[-1].append(self.point(*args[2:4]))
+        elif op == "re":
+            x, y, w, h = args
+            self.path.append([self.point(x, y), self.point(x + w, y), self.point(x + w, y + h), self.point(x, y + h),
+                              self.point(x, y)])
+        elif op == "h":
+            if self.path and self.path[-1]:
+                self.path[-1].append(self.path[-1][0])
+        elif op in ("S", "s", "f", "F", "f*", "B", "B*", "b", "b*", "n"):
+            self.paint_path(op)
+        elif op == "BT":
+            self.tm = self.tlm = _identity
+        elif op == "Tf":
+            self.font_name, self.font_size = self.page.fonts.get(args[0], "Helvetica"), args[1]
+        elif op == "TL":
+            self.leading = args[0]
+        elif op == "Tm":
+            self.tm = self.tlm = tuple(args)
+        elif op in ("Td", "TD"):
+            if op == "TD":
+                self.leading = -args[1]
+            self.tm = self.tlm = _multiply((1.0, 0.0, 0.0, 1.0, args[0], args[1]), self.tlm)
+        elif op == "T*":
+            self.next_line()
+        elif op == "Tj":
+            self.show(args[-1])
+        elif op in ("'", '"'):
+            self.next_line()
+            self.show(args[-1])
+        elif op == "TJ":
+            for item in args[-1] if args else ():
+                if isinstance(item, str):
+                    self.show(item)
+                else:
+                    self.advance(-item / 1000 * self.font_size)
+
+    def paint_path(self, op):
+        paths, self.path = self.path, []
+        if op == "n":
+            return
+        if op in ("f", "F", "f*", "B", "B*", "b", "b*"):
+            for points in paths:
+                if len(points) > 2:
+                    self.draw.polygon(points, fill=self.fill)
+        if op in ("S", "s", "B", "B*", "b", "b*"):
+            scale = abs(self.ctm[0] * self.ctm[3] - self.ctm[1] * self.ctm[2]) ** 0.5
+            width = max(1, int(round(self.line_width * scale)))
+            for points in paths:
+                if op in ("s", "b", "b*") and points:
+                    points = points + [points[0]]
+                if len(points) > 1:
+                    self.draw.line(points, fill=self.stroke, width=width)
+
+    def next_line(self):
+        self.tm = self.tlm = _multiply((1.0, 0.0, 0.0, 1.0, 0.0, -self.leading), self.tlm)
+
+    def advance(self, width):
+        self.tm = _multiply((1.0, 0.0, 0.0, 1.0, width, 0.0), self.tm)
+
+    def show(self, text):
+        if not isinstance(text, str):
+            return
+        m = _multiply(self.tm, self.ctm)
+        size = int(round(self.font_size * abs(m[0] * m[3] - m[1] * m[2]) ** 0.5))
+        x, y = self.point(0, 0, m)
+        for char in text:
+            width = pdfmetrics.stringWidth(char, self.font_name, self.font_size)
+            glyph = _glyph(self.font_name, size, char) if size >= 1 else None
+            if glyph is not None:
+                mask, dx, dy = glyph
+                self.image.paste(self.fill, (int(round(x)) + dx, int(round(y)) + dy), mask)
+            x += m[0] * width
+            y += m[1] * width
+        self.advance(pdfmetrics.stringWidth(text, self.font_name, self.font_size))
+
+
+def _colour(args):
+    if len(args) == 1:
+        args = args * 3
+    elif len(args) == 4:
+        c, m, y, k = args
+        args = ((1 - c) * (1 - k), (1 - m) * (1 - k), (1 - y) * (1 - k))
+    return tuple(int(round(v * 255)) for v in args[:3])
+
+
+def render_page(page, profile=DEFAULT_PROFILE):
+    """Paint a :py:class:`Page` and return it as a JPEG made to an :py:class:`ImageProfile`."""
+    dpi = profile.dpi
+    scale = dpi / 72
+    image = Image.new("RGB", (int(round(page.width * scale)), int(round(page.height * scale))), "white")
+    _Painter(page, image, scale).paint()
+    return encode(image, profile)
+
+
+class PillowRasteriser:
+    """Draws the pages of a submission straight to JPEG images, without writing a PDF."""
+
+    name = "pillow"
+
+    @classmethod
+    def available(cls):
+        """Always true, as Pillow is a dependency of this service."""
+        return True
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool(render_page)
+
+    def images(self, pdf_transformer, profile=DEFAULT_PROFILE):
+        """Return the page count and the JPEG images of the pages drawn by `pdf_transformer`.
+
+        :param profile: The :py:class:`ImageProfile` of the images.
+
+        The pages are painted by the rasteriser pool if `IMAGE_WORKERS` is set, up to
+        `IMAGE_PARALLELISM` of them at the same time.
+
+        """
+        pages = pdf_transformer.draw_pages(RasterCanvas)
+        if self.pool is None:
+            return len(pages), self._render(pages, profile)
+        return len(pages), self._render_in_pool(pages, profile)
+
+    @staticmethod
+    def _render(pages, profile):
+        for page in pages:
+            with limiter.slot():
+                image = render_page(page, profile)
+            yield image
+
+    def _render_in_pool(self, pages, profile):
+        render = functools.partial(self._render_in_worker, profile=profile)
+        parallelism = min(len(pages), self.pool.size, settings.IMAGE_PARALLELISM)
+        if parallelism < 2:
+            yield from map(render, pages)
+            return
+
+        with ThreadPoolExecutor(parallelism) as executor:
+            yield from executor.map(render, pages)
+
+    def _render_in_worker(self, page, profile):
+        # Pooled pages count against the same limit as every other rasterisation
+        with limiter.slot():
+            return self.pool.run(page, profile=profile)
@@ -0,0 +1,283 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from structlog import wrap_logger
+
+from transform import settings
+from transform.transformers.rasterisers.limits import RasterisationTimeout, RasteriserBusy
+
+__doc__ = """
+A pool of long-lived processes which rasterise pages.
+
+Each worker is started once and then serves jobs sent over a pipe, so a request
+pays for pickling a page rather than for starting a process. Workers are checked
+before use, replaced if they have died or stop answering, and recycled after a set
+number of jobs so any memory they accumulate is given back.
+
+Workers are forked, so the pool is started by :py:func:`transform.start_rasteriser_pool`
+as each gunicorn worker starts and before it runs any threads of its own. A worker
+forked from a preloaded master gets a pool of its own; a pool which was not started
+then starts on first use. Replacements are forked while requests are served, so a
+lock held by another thread at that moment, such as one of a logging handler, stays
+held in the child. The child only runs `target`, which takes no such locks itself.
+"""
+
+logger = wrap_logger(logging.getLogger(__name__))
+
+_PING = "ping"
+
+
+def _serve(conn, target):
+    """Run jobs from `conn` through `target` until the pipe is closed."""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        if message == _PING:
+            conn.send(_PING)
+            continue
+        args, kwargs = message
+        try:
+            result = (True, target(*args, **kwargs))
+        except Exception as e:
+            result = (False, repr(e))
+        conn.send(result)
+    conn.close()
+
+
+class _Worker:
+    """A worker process and the pipe used to talk to it."""
+
+    def __init__(self, context, target):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, target), name="rasteriser", daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+        self.last_used = time.monotonic()
+
+    def call(self, args, kwargs, timeout=None):
+        """Send a job and return whether it succeeded and its result or error.
+
+        :raises RasterisationTimeout: If there is no answer within `timeout` seconds.
+
+        """
+        self.conn.send((args, kwargs))
+        if not self.conn.poll(timeout):
+            raise RasterisationTimeout("images:Rasteriser worker ran for more than {0}s".format(timeout))
+        rv = self.conn.recv()
+        self.jobs += 1
+        self.last_used = time.monotonic()
+        return rv
+
+    def ping(self, timeout):
+        try:
+            self.conn.send(_PING)
+            return self.conn.poll(timeout) and self.conn.recv() == _PING
+        except (EOFError, OSError):
+            return False
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class RasteriserPool:
+    """A fixed number of worker processes which each call `target` for one job at a time.
+
+    :py:meth:`run` may be called from several threads, each of which waits for a worker.
+
+    :param int size: The number of worker processes.
+    :param target: A module level function run by the workers.
+    :param int max_jobs: Replace a worker after it has run this many jobs; 0 never does.
+    :param float check_after: Ping a worker before use if it has been idle this many seconds.
+    :param float ping_timeout: Seconds to wait for a worker to answer a ping.
+    :param float timeout: Kill a worker which runs a job for longer than this many seconds.
+    :param float queue_timeout: Seconds to wait for a free worker before giving up with
+        :py:class:`RasteriserBusy`; None waits forever.
+    :param int log_every: Log :py:meth:`stats` after this many jobs; 0 never does.
+
+    """
+
+    def __init__(self, size, target, max_jobs=0, check_after=30.0, ping_timeout=1.0, timeout=None,
+                 queue_timeout=None, log_every=1000):
+        if size < 1:
+            raise ValueError("A rasteriser pool needs at least one worker")
+        self.size = size
+        self.target = target
+        self.max_jobs = max_jobs
+        self.check_after = check_after
+        self.ping_timeout = ping_timeout
+        self.timeout = timeout or None
+        self.queue_timeout = queue_timeout or None
+        self.log_every = log_every
+        self._context = multiprocessing.get_context("fork")
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self.jobs = 0
+        self.recycled = 0
+        self.replaced = 0
+        self.busy = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def start(self):
+        """Start the workers, unless this process already has them."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Workers inherited from another process belong to it, so start afresh
+            self._idle = queue.LifoQueue()
+            for _ in range(self.size):
+                self._idle.put(_Worker(self._context, self.target))
+            self._pid = os.getpid()
+        logger.info("Started rasteriser pool", size=self.size, max_jobs=self.max_jobs)
+
+    def run(self, *args, **kwargs):
+        """Run one job on the next free worker and return its result.
+
+        :raises IOError: If the job fails or the worker dies while running it.
+        :raises RasteriserBusy: If no worker is free within :py:attr:`queue_timeout`.
+        :raises RasterisationTimeout: If the job runs for longer than :py:attr:`timeout`.
+
+        """
+        self.start()
+        worker = self._acquire()
+        try:
+            ok, result = worker.call(args, kwargs, self.timeout)
+        except RasterisationTimeout:
+            worker.process.kill()
+            self._replace(worker)
+            raise
+        except (EOFError, OSError) as e:
+            self._replace(worker)
+            raise IOError("images:Rasteriser worker stopped: {0}".format(repr(e)))
+        except BaseException:
+            # Whatever went wrong, perhaps part way through a job, the pool keeps its size
+            self._replace(worker)
+            raise
+        self._release(worker)
+
+        if self.log_every and self.jobs % self.log_every == 0:
+            logger.info("Rasteriser pool stats", **self.stats())
+        if not ok:
+            raise IOError("images:Could not rasterise page: {0}".format(result))
+        return result
+
+    def _acquire(self):
+        start = time.monotonic()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            with self._stats_lock:
+                self.busy += 1
+            raise RasteriserBusy("images:No rasteriser worker was free after {0:.1f}s".format(
+                time.monotonic() - start))
+        wait = time.monotonic() - start
+        with self._stats_lock:
+            self.jobs += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        if not worker.process.is_alive() or (
+                time.monotonic() - worker.last_used > self.check_after and not worker.ping(self.ping_timeout)):
+            logger.warning("Replacing unhealthy rasteriser worker", pid=worker.process.pid)
+            worker.stop()
+            worker = _Worker(self._context, self.target)
+            with self._stats_lock:
+                self.replaced += 1
+        return worker
+
+    def _release(self, worker):
+        if self.max_jobs and worker.jobs >= self.max_jobs:
+            self._replace(worker, recycled=True)
+        else:
+            self._idle.put(worker)
+
+    def _replace(self, worker, recycled=False):
+        worker.stop()
+        self._idle.put(_Worker(self._context, self.target))
+        with self._stats_lock:
+            if recycled:
+                self.recycled += 1
+            else:
+                self.replaced += 1
+
+    def check(self):
+        """Ping every idle worker and replace any which do not answer.
+
+        :returns: The number of workers replaced.
+
+        """
+        self.start()
+        workers = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        replaced = 0
+        for worker in workers:
+            if worker.process.is_alive() and worker.ping(self.ping_timeout):
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+                replaced += 1
+        return replaced
+
+    def stats(self):
+        """Return counts of the jobs run or turned away, and how long they waited for a worker."""
+        with self._stats_lock:
+            return {
+                "size": self.size,
+                "jobs": self.jobs,
+                "recycled": self.recycled,
+                "replaced": self.replaced,
+                "busy": self.busy,
+                "wait_mean_ms": round(1000 * self.wait_total / self.jobs, 3) if self.jobs else 0.0,
+                "wait_max_ms": round(1000 * self.wait_max, 3),
+            }
+
+    def close(self):
+        """Stop the workers which are idle."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            while True:
+                try:
+                    self._idle.get_nowait().stop()
+                except queue.Empty:
+                    break
+            self._pid = None
+
+
+_pools = {}
+
+
+def get_pool(target):
+    """Return the shared pool running `target`, or None if `IMAGE_WORKERS` is 0."""
+    if not settings.IMAGE_WORKERS:
+        return None
+    try:
+        return _pools[target]
+    except KeyError:
+        pool = _pools[target] = RasteriserPool(settings.IMAGE_WORKERS, target, settings.IMAGE_WORKER_MAX_JOBS,
+                                               timeout=settings.IMAGE_TIMEOUT,
+                                               queue_timeout=settings.IMAGE_QUEUE_TIMEOUT)
+        return pool
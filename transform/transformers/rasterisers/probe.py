@@ -0,0 +1,173 @@
+from collections import namedtuple
+import functools
+from io import BytesIO
+import json
+import logging
+import time
+
+from PIL import Image, ImageChops, ImageOps, ImageStat
+from reportlab.lib.pagesizes import A4
+from structlog import wrap_logger
+
+from transform.transformers.pdf_transformer import PDFTransformer
+from transform.transformers.rasterisers import RASTERISERS
+from transform.transformers.rasterisers.profiles import DEFAULT_PROFILE, configured_profiles
+
+__doc__ = """
+Find the fastest image backend installed on this machine.
+
+Each available backend makes the images of a sample submission from the tests in
+every configured profile. A backend is compatible if it returns one JPEG per page at
+the size expected for each profile, and each page looks like the one the `pillow`
+backend paints. The fastest compatible backend is used when `IMAGE_BACKEND` is
+`auto`, chosen as each worker starts.
+
+Compare the backends from the command line with::
+
+    python -m transform.transformers.rasterisers.probe
+
+"""
+
+logger = wrap_logger(logging.getLogger(__name__))
+
+SAMPLE_SURVEY = "./tests/data/134.0005.json"
+SAMPLE_RESPONSE = "./tests/data/eq-mwss.json"
+
+#: The outcome of probing one backend. `error` says why it is unavailable or incompatible.
+ProbeResult = namedtuple("ProbeResult", ["name", "compatible", "duration_ms", "error"])
+
+#: The width pages are shrunk to before they are compared, which hides how each tool draws a glyph.
+COMPARE_WIDTH = 128
+
+#: The largest difference from the reference page of a compatible page, as a fraction of the ink on both.
+#: The pillow pages of one profile differ from those of another by up to 0.15, a page moved by 2mm
+#: differs by 0.6, and a blank page by 1.
+MAX_DIFFERENCE = 0.45
+
+
+def sample_transformer(survey=SAMPLE_SURVEY, response=SAMPLE_RESPONSE):
+    with open(survey) as fh:
+        survey = json.load(fh)
+    with open(response) as fh:
+        response = json.load(fh)
+    return PDFTransformer(survey, response)
+
+
+def difference(page, reference):
+    """Return how much two page images differ, from 0 for the same ink to 1 for none in common.
+
+    Both are shrunk to the same small greyscale image, and the difference of each pixel
+    is summed and divided by the ink of both pages.
+
+    """
+    size = (COMPARE_WIDTH, round(COMPARE_WIDTH * reference.height / reference.width))
+    page, reference = (image.convert("L").resize(size, Image.BOX) for image in (page, reference))
+    ink = sum(ImageStat.Stat(ImageOps.invert(image)).sum[0] for image in (page, reference))
+    if not ink:
+        return 0.0
+    return ImageStat.Stat(ImageChops.difference(page, reference)).sum[0] / ink
+
+
+def check_images(page_count, images, profile=DEFAULT_PROFILE, reference=None):
+    """Return why `images` are not the pages expected for `profile`, or None if they are.
+
+    :param reference: The JPEG images of the same pages from a trusted backend, to
+        compare the content of each page with.
+
+    """
+    if len(images) != page_count:
+        return "made {0} images of {1} pages".format(len(images), page_count)
+    expected = [round(side * profile.dpi / 72) for side in A4]
+    for number, image in enumerate(images):
+        try:
+            with Image.open(BytesIO(image)) as page:
+                if page.format != "JPEG":
+                    return "made {0} images".format(page.format)
+                if any(abs(a - b) > 2 for a, b in zip(page.size, expected)):
+                    return "made pages of {0[0]}x{0[1]}, not {1[0]}x{1[1]}".format(page.size, expected)
+                darkest, lightest = page.convert("L").getextrema()
+                if lightest - darkest < 32:
+                    return "made a blank page {0}".format(number + 1)
+                if reference is not None:
+                    with Image.open(BytesIO(reference[number])) as expected_page:
+                        score = difference(page, expected_page)
+                    if score > MAX_DIFFERENCE:
+                        return "made page {0} unlike the reference, differing by {1:.2f}".format(number + 1, score)
+        except OSError as e:
+            return "made an unreadable image: {0}".format(e)
+    return None
+
+
+def probe(names=None, profiles=(DEFAULT_PROFILE,), repeat=3, pdf_transformer=None):
+    """Time each backend on the sample submission.
+
+    :param names: The backends to try, by default all of them.
+    :param profiles: The :py:class:`ImageProfile` of each set of images a backend must make.
+    :returns: A :py:class:`ProbeResult` per backend, timed on all of `profiles`.
+
+    """
+    pdf_transformer = pdf_transformer or sample_transformer()
+    # The pages painted by pillow, which is always installed, are what the others are compared with
+    references = {}
+    results = []
+    for name in names or sorted(RASTERISERS):
+        rasteriser_class = RASTERISERS[name]
+        if not rasteriser_class.available():
+            results.append(ProbeResult(name, False, None, "not installed"))
+            continue
+
+        rasteriser = rasteriser_class()
+        total = 0.0
+        error = None
+        for profile in profiles:
+            if profile not in references:
+                references[profile] = list(RASTERISERS["pillow"]().images(pdf_transformer, profile)[1])
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                try:
+                    page_count, images = rasteriser.images(pdf_transformer, profile)
+                    images = list(images)
+                except Exception as e:
+                    error = "failed: {0!r}".format(e)
+                    break
+                duration = (time.perf_counter() - start) * 1000
+                best = duration if best is None else min(best, duration)
+                error = check_images(page_count, images, profile, references[profile])
+                if error:
+                    break
+            if error:
+                break
+            total += best
+
+        results.append(ProbeResult(name, error is None, None if error else round(total, 1), error))
+    return results
+
+
+def fastest(results):
+    """Return the name of the fastest compatible backend in `results`.
+
+    :raises ValueError: If no backend is compatible.
+
+    """
+    compatible = [result for result in results if result.compatible]
+    if not compatible:
+        raise ValueError("No compatible image backend is installed")
+    return min(compatible, key=lambda result: result.duration_ms).name
+
+
+@functools.lru_cache(maxsize=None)
+def best_rasteriser():
+    """Probe the backends once per process in the configured profiles and return the name of the fastest."""
+    results = probe(profiles=configured_profiles())
+    name = fastest(results)
+    logger.info("Chose image backend", backend=name,
+                **{result.name: result.duration_ms if result.compatible else result.error for result in results})
+    return name
+
+
+if __name__ == "__main__":
+    results = probe(profiles=configured_profiles())
+    for result in results:
+        print("{0:<12} {1}".format(result.name, "{0} ms".format(result.duration_ms) if result.compatible else result.error))
+    print("fastest: {0}".format(fastest(results)))
@@ -0,0 +1,72 @@
+from collections import namedtuple
+from io import BytesIO
+
+from transform import settings
+
+__doc__ = """
+Named settings for the page images.
+
+Our pages are black text with a light blue header cell, so most surveys read just
+as well at a lower resolution or in greyscale, in much smaller files. A profile is
+chosen for each survey with the `IMAGE_SURVEY_PROFILES` setting, and every other
+survey uses `IMAGE_PROFILE`.
+"""
+
+#: How the pages of a survey are rasterised.
+#:
+#: :ivar int dpi: The resolution of the images.
+#: :ivar str colour: `rgb`, `grey`, or `mono` for black and white.
+#: :ivar int quality: The JPEG quality, from 1 to 95.
+#: :ivar bool progressive: Whether to write progressive JPEGs.
+ImageProfile = namedtuple("ImageProfile", ["dpi", "colour", "quality", "progressive"])
+
+#: The default profile matches what `pdftoppm -jpeg` writes with no other options.
+DEFAULT_PROFILE = ImageProfile(dpi=150, colour="rgb", quality=75, progressive=False)
+
+PROFILES = {
+    "default": DEFAULT_PROFILE,
+    "grey": DEFAULT_PROFILE._replace(colour="grey"),
+    "compact": ImageProfile(dpi=100, colour="grey", quality=60, progressive=True),
+    "mono": DEFAULT_PROFILE._replace(colour="mono"),
+}
+
+
+def get_profile(survey_id=None):
+    """Return the image profile configured for `survey_id`.
+
+    :raises ValueError: If the configured profile does not exist.
+
+    """
+    name = settings.IMAGE_SURVEY_PROFILES.get(survey_id, settings.IMAGE_PROFILE)
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError("Unknown image profile: {0}".format(name))
+
+
+def configured_profiles():
+    """Return every profile in use, the one of `IMAGE_PROFILE` first.
+
+    :raises ValueError: If a configured profile does not exist.
+
+    """
+    names = [settings.IMAGE_PROFILE] + sorted(set(settings.IMAGE_SURVEY_PROFILES.values()) - {settings.IMAGE_PROFILE})
+    try:
+        return [PROFILES[name] for name in names]
+    except KeyError as e:
+        raise ValueError("Unknown image profile: {0}".format(e.args[0]))
+
+
+def encode(image, profile):
+    """Convert a Pillow image to the colour of `profile` and return it as a JPEG."""
+    if profile.colour == "grey":
+        image = image.convert("L")
+    elif profile.colour == "mono":
+        # A threshold rather than dithering, which would fill the JPEG with noise
+        image = image.convert("L").point(lambda v: 255 if v >= 128 else 0)
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=profile.quality, progressive=profile.progressive,
+               dpi=(profile.dpi, profile.dpi))
+    return buffer.getvalue()
@@ -0,0 +1,88 @@
+from transform.transformers.survey import Survey
+from transform.utilities.dates import LOCALISED_FORMAT, SHORT_FORMAT, format_datetime, parse_datetime
+from transform.utilities.formatter import Formatter
+from transform.views.image_filters import format_period, statistical_unit_id_filter
+
+__doc__ = """
+Values derived from a single survey response.
+
+A transform writes the submission date, period and reporting unit reference, and
+file names built from the transaction id, into several outputs. A :py:class:`ResponseContext` is created once
+per response and passed to each stage, so every value is worked out at most once.
+"""
+
+
+class ResponseContext:
+    """Derives values from a survey response on first use and keeps them for the request.
+
+    :param dict response: A survey response.
+    :param ids: The :py:attr:`Survey.Identifiers` of the response, if already parsed.
+
+    """
+
+    def __init__(self, response, ids=None):
+        self.response = response
+        self._values = {}
+        if ids is not None:
+            self._values["ids"] = ids
+
+    def _memoised(self, name, derive):
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = derive()
+            return value
+
+    @property
+    def ids(self):
+        """The :py:attr:`Survey.Identifiers` of the response."""
+        return self._memoised("ids", lambda: Survey.identifiers(self.response))
+
+    @property
+    def submitted_at(self):
+        """The `submitted_at` timestamp as a datetime."""
+        return self._memoised("submitted_at", lambda: parse_datetime(self.response['submitted_at']))
+
+    @property
+    def submission_date(self):
+        """The date of submission in the UK, as `YYYYMMDD`."""
+        return self._memoised("submission_date", lambda: format_datetime(self.submitted_at, SHORT_FORMAT))
+
+    @property
+    def localised_submitted_at(self):
+        """The time of submission in the UK, as `DD MMMM YYYY HH:mm:ss`."""
+        return self._memoised("localised_submitted_at",
+                              lambda: format_datetime(self.submitted_at, LOCALISED_FORMAT))
+
+    @property
+    def pck_submission_date(self):
+        """The date of submission as written to a pck, `dd/mm/yy`."""
+        return self._memoised("pck_submission_date", lambda: self.submitted_at.strftime("%d/%m/%y"))
+
+    @property
+    def period(self):
+        """The collection period as written to the index file."""
+        return self._memoised("period", lambda: format_period(self.response['collection']['period']))
+
+    @property
+    def statistical_unit_id(self):
+        """The reporting unit reference without its check letter, as written to the index file."""
+        return self._memoised("statistical_unit_id",
+                              lambda: statistical_unit_id_filter(self.response['metadata']['ru_ref']))
+
+    @property
+    def index_name(self):
+        """The name of the index file."""
+        return self._memoised("index_name", lambda: Formatter.get_index_name(
+            self.response['survey_id'], self.submission_date, self.response['tx_id']))
+
+    @property
+    def idbr_name(self):
+        """The name of the IDBR receipt, from the date of submission."""
+        return self._memoised("idbr_name", lambda: Formatter.idbr_name(self.submitted_at, self.response['tx_id']))
+
+    def image_names(self, count):
+        """The names of the images of `count` pages."""
+        return self._memoised(("image_names", count), lambda: [
+            Formatter.get_image_name(self.response['tx_id'], i) for i in range(1, count + 1)
+        ])
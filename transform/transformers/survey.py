@@ -1,11 +1,16 @@
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 import datetime
 import json
 import logging
+import os
+import threading
 from json import JSONDecodeError
 
 from structlog import wrap_logger
 
+from transform import settings
+from transform.utilities.dates import parse_timestamp
+
 logger = wrap_logger(logging.getLogger(__name__))
 
 
@@ -17,6 +22,65 @@ class MissingSurveyException(Exception):
     pass
 
 
+class SurveyCache:
+    """A process wide cache of parsed survey definitions.
+
+    Entries are keyed by survey id, instrument id and file pattern, and remember
+    the modification time of the file they were parsed from so that a changed
+    definition on disk is read again. Once the cache holds `max_size` entries the
+    least recently used one is evicted.
+
+    Cached definitions are shared between requests and must be treated as read only.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, mtime):
+        """Return the cached definition for `key`, or None if it is missing or stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, mtime, survey):
+        with self._lock:
+            self._entries[key] = (mtime, survey)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, entries, removed=()):
+        """Put several entries and remove others in one step.
+
+        :param dict entries: `(mtime, survey)` pairs by key.
+        :param removed: Keys to remove.
+
+        """
+        with self._lock:
+            for key in removed:
+                self._entries.pop(key, None)
+            for key, entry in entries.items():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+survey_cache = SurveyCache(settings.SURVEY_CACHE_SIZE)
+
+
 class Survey:
     """Provide operations and accessors to survey data."""
 
@@ -33,7 +97,9 @@ class Survey:
         """Retrieve the survey definition by id.
 
         This function takes metadata from a survey reply, finds the JSON definition of
-        that survey, and loads it as a Python object.
+        that survey, and loads it as a Python object. Parsed definitions are kept in
+        :py:data:`survey_cache`, so repeat requests for an unchanged file do not read
+        or parse it again.
 
         :param ids: Survey response ids.
         :type ids: :py:class:`sdx.common.survey.Survey.Identifiers`
@@ -50,11 +116,15 @@ class Survey:
         :rtype: dict
 
         """
+        key = (ids.survey_id, ids.inst_id, pattern)
         try:
             file_name = pattern.format(**ids._asdict())
-            with open(file_name, encoding="utf-8") as fh:
-                content = fh.read()
-                return json.loads(content)
+            mtime = os.stat(file_name).st_mtime_ns
+            survey = survey_cache.get(key, mtime)
+            if survey is None:
+                survey = Survey.read_survey(file_name)
+                survey_cache.put(key, mtime, survey)
+            return survey
         except FileNotFoundError:
             logger.error("File not found", file_name=file_name)
             raise MissingSurveyException()
@@ -65,6 +135,24 @@ class Survey:
             logger.exception("File is not valid JSON", file=file_name)
             raise Exception("invalid file")
 
+    @staticmethod
+    def read_survey(file_name):
+        """Parse a survey definition file without consulting the cache."""
+        with open(file_name, encoding="utf-8") as fh:
+            content = fh.read()
+        return json.loads(content)
+
+    @staticmethod
+    def cache_survey(ids, survey, pattern=file_pattern):
+        """Place an already parsed survey definition in :py:data:`survey_cache`.
+
+        The definition is recorded against the current modification time of its
+        file, so :py:meth:`load_survey` returns it until the file changes.
+
+        """
+        file_name = pattern.format(**ids._asdict())
+        survey_cache.put((ids.survey_id, ids.inst_id, pattern), os.stat(file_name).st_mtime_ns, survey)
+
     @staticmethod
     def bind_logger(log, ids):
         """Bind a structured logger with survey response metadata.
@@ -85,47 +173,14 @@ class Survey:
         """Parse a text field for a date or timestamp.
 
         Date and time formats vary across surveys.
-        This method reads those formats.
+        This method reads those formats; see
+        :py:func:`transform.utilities.dates.parse_timestamp`.
 
         :param str text: The date or timestamp value.
         :rtype: Python date or datetime.
 
         """
-
-        cls = datetime.datetime
-
-        if text.endswith("Z"):
-            return cls.strptime(text, "%Y-%m-%dT%H:%M:%SZ").replace(
-                tzinfo=datetime.timezone.utc
-            )
-
-        try:
-            return cls.strptime(text, "%Y-%m-%dT%H:%M:%S.%f%z")
-        except ValueError:
-            pass
-
-        try:
-            return cls.strptime(text.partition(".")[0], "%Y-%m-%dT%H:%M:%S")
-        except ValueError:
-            pass
-
-        try:
-            return cls.strptime(text, "%Y-%m-%d").date()
-        except ValueError:
-            pass
-
-        try:
-            return cls.strptime(text, "%d/%m/%Y").date()
-        except ValueError:
-            pass
-
-        if len(text) != 6:
-            return None
-
-        try:
-            return cls.strptime(text + "01", "%Y%m%d").date()
-        except ValueError:
-            return None
+        return parse_timestamp(text)
 
     @staticmethod
     def identifiers(data, batch_nr=0, seq_nr=0, log=None):
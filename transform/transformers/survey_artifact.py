@@ -0,0 +1,131 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+from structlog import wrap_logger
+
+from transform import settings
+from transform.transformers.survey import Survey
+from transform.transformers.survey_registry import CompiledSurvey, DefinitionInterner
+
+__doc__ = """
+Precompiled survey definitions.
+
+The survey JSON files are compiled at build time into a single pickle file, so a
+starting worker reads one file instead of parsing and compiling every definition.
+Each compiled survey is stored with the size, modification time and checksum of its
+source file. A source whose size and modification time are unchanged is taken as
+it was, so loading only reads the files which were touched since the build, and
+uses their compiled surveys while their checksum still matches. Definitions are interned before they are written,
+and pickling keeps that sharing when the artifact is read back.
+
+Build the artifact with::
+
+    python -m transform.transformers.survey_artifact
+
+"""
+
+logger = wrap_logger(logging.getLogger(__name__))
+
+#: Increase whenever the layout of :py:class:`CompiledSurvey` changes.
+ARTIFACT_VERSION = 4
+
+
+def _checksum(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _stamp(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _source_files(pattern):
+    return sorted(glob.glob(pattern.format(survey_id="*", inst_id="*")))
+
+
+def build(path=settings.SURVEY_ARTIFACT, pattern=Survey.file_pattern):
+    """Compile every survey definition matching `pattern` into the artifact at `path`.
+
+    :returns: The number of definitions written.
+
+    """
+    interner = DefinitionInterner()
+    surveys = {}
+    for file_name in _source_files(pattern):
+        with open(file_name, "rb") as fh:
+            content = fh.read()
+            stamp = _stamp(os.fstat(fh.fileno()))
+        definition = interner.intern(json.loads(content.decode("utf-8")))
+        surveys[os.path.basename(file_name)] = (stamp, _checksum(content), CompiledSurvey(definition, interner))
+
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "python": tuple(sys.version_info[:2]),
+        "surveys": surveys,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        pickle.dump(artifact, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+    logger.info("Built survey artifact", path=path, count=len(surveys), **interner.report())
+    return len(surveys)
+
+
+def load(path=settings.SURVEY_ARTIFACT, pattern=Survey.file_pattern):
+    """Read the compiled surveys which still match their source files.
+
+    :returns: A dict from source file name to :py:class:`CompiledSurvey`. Surveys whose
+        size or modification time changed and whose checksum no longer matches, or an
+        artifact which is missing or was built by another version, are left out so the
+        caller falls back to the JSON.
+
+    """
+    try:
+        with open(path, "rb") as fh:
+            artifact = pickle.load(fh)
+    except FileNotFoundError:
+        logger.info("No survey artifact found", path=path)
+        return {}
+    except (EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError):
+        logger.warning("Survey artifact is unreadable", path=path)
+        return {}
+
+    if artifact.get("version") != ARTIFACT_VERSION or artifact.get("python") != tuple(sys.version_info[:2]):
+        logger.warning("Survey artifact was built by a different version", path=path)
+        return {}
+
+    surveys = {}
+    stale = []
+    checked = 0
+    for file_name in _source_files(pattern):
+        entry = artifact["surveys"].get(os.path.basename(file_name))
+        if entry is None:
+            stale.append(os.path.basename(file_name))
+            continue
+        stamp, checksum, compiled = entry
+        try:
+            if _stamp(os.stat(file_name)) != stamp:
+                # Touched since the build, perhaps by a copy, so only the content can tell
+                checked += 1
+                with open(file_name, "rb") as fh:
+                    if _checksum(fh.read()) != checksum:
+                        stale.append(os.path.basename(file_name))
+                        continue
+        except FileNotFoundError:
+            continue
+        surveys[file_name] = compiled
+
+    if stale:
+        logger.warning("Survey artifact is out of date for some definitions", files=stale)
+    if checked:
+        logger.info("Checked survey definitions touched since the artifact was built", count=checked)
+    return surveys
+
+
+if __name__ == "__main__":
+    build()
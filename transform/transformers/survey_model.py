@@ -0,0 +1,62 @@
+from collections import namedtuple
+
+__doc__ = """
+Typed, immutable views of a survey definition.
+
+The JSON definitions are turned into these once, when they are compiled, so code
+which walks every question on each request can use attribute access on compact
+tuples rather than repeated dict lookups.
+"""
+
+
+class Question(namedtuple("Question", [
+    "question_id", "text", "number", "type", "title", "options"
+])):
+    """A single question. Fields missing from the definition are None."""
+    __slots__ = ()
+
+    @property
+    def display_text(self):
+        """The text shown in the images, prefixed with the question number unless it already starts with one."""
+        # Worked out when asked, as the images are rendered far less often than the survey is held
+        if self.text and not self.text[0].isdigit():
+            return " ".join((self.number or "", self.text))
+        return self.text
+
+    @classmethod
+    def from_dict(cls, question):
+        options = question.get("options")
+        return cls(
+            question["question_id"],
+            question.get("text"),
+            question.get("number"),
+            question.get("type"),
+            question.get("title"),
+            tuple(options) if options is not None else None,
+        )
+
+
+class QuestionGroup(namedtuple("QuestionGroup", ["title", "questions"])):
+    """A section of a survey holding a tuple of :py:class:`Question`."""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, question_group):
+        return cls(
+            question_group.get("title"),
+            tuple(Question.from_dict(q) for q in question_group["questions"]),
+        )
+
+
+class SurveyDefinition(namedtuple("SurveyDefinition", ["survey_id", "form_type", "title", "question_groups"])):
+    """A survey definition holding a tuple of :py:class:`QuestionGroup`."""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, definition):
+        return cls(
+            definition.get("survey_id"),
+            definition.get("form_type"),
+            definition.get("title"),
+            tuple(QuestionGroup.from_dict(g) for g in definition["question_groups"]),
+        )
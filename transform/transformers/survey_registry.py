@@ -0,0 +1,432 @@
+from collections import namedtuple, OrderedDict
+import glob
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from structlog import wrap_logger
+
+from transform import settings
+from transform.transformers.survey import Survey, survey_cache
+from transform.transformers.survey_model import SurveyDefinition
+
+logger = wrap_logger(logging.getLogger(__name__))
+
+#: Question ids which hold comments. They are shown in the images but never written to a pck.
+COMMENTS_QUESTIONS = ['147', '146a', '146b', '146c', '146d', '146e', '146f', '146g', '146h', '146i', '146j', '146k']
+
+
+class DefinitionInterner:
+    """Shares identical parts of survey definitions.
+
+    Many instruments are near copies of each other. Passing each definition through
+    :py:meth:`intern` replaces every string, question and question group which is
+    equal to one seen before with that earlier object, so the copies share memory.
+    The tuples of the :py:mod:`survey_model` are shared the same way.
+
+    Interned definitions share structure and must be treated as read only. The pool
+    of an interner is about as large as the memory it saves, so an interner should
+    only live as long as one load of the definitions.
+
+    :ivar int seen: The number of strings, lists and dicts interned.
+    :ivar int shared: How many of those were replaced by an earlier equal object.
+    :ivar int bytes_saved: The size of the objects which were replaced, not counting
+        their contents, which are counted separately.
+
+    """
+
+    _scalars = (int, float, bool, type(None))
+
+    def __init__(self):
+        self._pool = {}
+        self.seen = 0
+        self.shared = 0
+        self.bytes_saved = 0
+
+    def intern(self, value):
+        """Return `value`, or an equal object already held by this interner."""
+        # The parser already shares dict keys within one document, so count each replaced object once
+        return self._intern(value, set())
+
+    def _intern(self, value, replaced):
+        if isinstance(value, self._scalars):
+            return value
+
+        original = value
+        if isinstance(value, str):
+            key = value
+        elif isinstance(value, list):
+            items = [self._intern(v, replaced) for v in value]
+            # Keep the original unless one of its items was replaced
+            if any(a is not b for a, b in zip(items, value)):
+                value = items
+            key = ("list",) + tuple(self._ref(v) for v in value)
+        elif isinstance(value, dict):
+            items = [(self._intern(k, replaced), self._intern(v, replaced)) for k, v in value.items()]
+            if any(a is not k or b is not v for (a, b), (k, v) in zip(items, value.items())):
+                value = dict(items)
+            key = ("dict",) + tuple((id(k), self._ref(v)) for k, v in items)
+        elif isinstance(value, tuple):
+            items = [self._intern(v, replaced) for v in value]
+            if any(a is not b for a, b in zip(items, value)):
+                # The named tuples of the survey model are rebuilt as their own type
+                value = type(value)(*items) if hasattr(value, "_fields") else tuple(items)
+            key = ("tuple", type(value)) + tuple(self._ref(v) for v in items)
+        else:
+            return value
+
+        self.seen += 1
+        existing = self._pool.get(key)
+        if existing is None:
+            self._pool[key] = value
+            return value
+        if existing is not original and id(original) not in replaced:
+            replaced.add(id(original))
+            self.shared += 1
+            self.bytes_saved += sys.getsizeof(original)
+        return existing
+
+    def seed(self, value):
+        """Make the parts of `value` available to share with what is interned later.
+
+        Seeding with a definition which is already in use keeps that definition as it
+        is, and is left out of :py:meth:`report`.
+
+        """
+        counts = self.seen, self.shared, self.bytes_saved
+        self.intern(value)
+        self.seen, self.shared, self.bytes_saved = counts
+
+    def _ref(self, value):
+        # Interned objects are equal exactly when they are identical
+        return (type(value), value) if isinstance(value, self._scalars) else id(value)
+
+    def report(self):
+        return {
+            "interned": self.seen,
+            "shared": self.shared,
+            "shared_pct": round(100 * self.shared / self.seen, 1) if self.seen else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "pool_bytes": self.pool_size(),
+        }
+
+    def pool_size(self):
+        """Return the size of the pool itself, which is freed with the interner."""
+        # String keys are the interned strings themselves; the others are tuples of ids made for the pool
+        return sys.getsizeof(self._pool) + sum(self._key_size(k) for k in self._pool if isinstance(k, tuple))
+
+    @classmethod
+    def _key_size(cls, key):
+        if isinstance(key, tuple):
+            return sys.getsizeof(key) + sum(cls._key_size(k) for k in key)
+        return sys.getsizeof(key) if isinstance(key, int) else 0
+
+
+class CompiledDefinition(dict):
+    """The fields of a survey definition other than its question groups.
+
+    The question groups are only kept as the model of the :py:class:`CompiledSurvey`
+    this belongs to, which is held as `compiled`.
+
+    """
+
+    __slots__ = ("compiled",)
+
+
+class CompiledSurvey:
+    """Lookups derived from a survey definition.
+
+    These are built once per definition rather than on every request. Pass the
+    `interner` the definition came from to share the model with other surveys too.
+
+    :ivar definition: The survey definition the lookups were built from as a
+        :py:class:`CompiledDefinition`, without its question groups.
+    :ivar model: The definition as a :py:class:`SurveyDefinition`.
+    :ivar form_questions: The integer ids of the questions which may be written to a pck.
+    :ivar dict form_question_types: A lookup from question id to question type.
+    :ivar contains_questions: The ids of questions of type `contains`.
+    :ivar dict question_index: A lookup from question id to the `(group, position)` pairs
+        at which that question appears in the images, which show the questions with
+        text in each titled question group.
+
+    """
+
+    def __init__(self, definition, interner=None):
+        self.model = SurveyDefinition.from_dict(definition)
+        if interner is not None:
+            self.model = interner.intern(self.model)
+        # Keeping the question groups in the dict as well would hold every question twice
+        self.definition = CompiledDefinition((k, v) for k, v in definition.items() if k != "question_groups")
+        self.definition.compiled = self
+
+        form_questions = set()
+        form_question_types = {}
+        question_index = {}
+        for group_position, question_group in enumerate(self.model.question_groups):
+            for position, question in enumerate(question_group.questions):
+                question_id = question.question_id
+                if question_group.title is not None and question.text is not None:
+                    question_index.setdefault(question_id, []).append((group_position, position))
+                if question_id in COMMENTS_QUESTIONS:
+                    continue
+                if question.type is not None:
+                    form_question_types[question_id] = question.type
+                try:
+                    form_questions.add(int(question_id))
+                except ValueError:
+                    # Only surveys with numeric qcodes are written to a pck
+                    pass
+
+        self.form_questions = frozenset(form_questions)
+        self.form_question_types = form_question_types
+        self.contains_questions = tuple(k for k, v in form_question_types.items() if v == 'contains')
+        self.question_index = {k: tuple(v) for k, v in question_index.items()}
+
+    def answered_positions(self, data):
+        """Return the sorted `(group, position)` pairs of the questions answered in `data`."""
+        return sorted(
+            position
+            for question_id in data
+            for position in self.question_index.get(question_id, ())
+        )
+
+
+class SurveyRegistry:
+    """Holds the compiled form of each survey definition in use by this process.
+
+    The definitions served from the :py:meth:`Survey.load_survey` cache carry their
+    compiled survey, so one replaced while a request still holds it stays usable.
+    Those loaded from a file are kept until the file is reloaded or removed. Any
+    other definition is found by its identity, never by its content, as some
+    definition files declare the form type of another instrument, and is kept
+    among the `max_others` most recently used.
+
+    """
+
+    #: A named tuple type to describe the outcome of :py:meth:`reload`.
+    ReloadReport = namedtuple("ReloadReport", ["added", "changed", "removed", "failed", "duration_ms"])
+
+    def __init__(self, max_others=settings.SURVEY_CACHE_SIZE):
+        self.max_others = max_others
+        self._sources = {}
+        self._by_source = {}
+        self._others = OrderedDict()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def get(self, definition):
+        """Return the compiled form of a survey definition.
+
+        The compiled survey is reused for as long as the same definition object is in use.
+
+        """
+        if isinstance(definition, CompiledDefinition):
+            return definition.compiled
+
+        # The entry holds the definition, so the id can't be reused while it is remembered
+        key = id(definition)
+        with self._lock:
+            entry = self._others.get(key)
+            if entry is not None:
+                self._others.move_to_end(key)
+        if entry is not None and entry[0] is definition:
+            return entry[1]
+
+        compiled = CompiledSurvey(definition)
+        with self._lock:
+            self._others[key] = (definition, compiled)
+            self._others.move_to_end(key)
+            while len(self._others) > self.max_others:
+                self._others.popitem(last=False)
+        return compiled
+
+    def add(self, compiled, source):
+        """Register an already compiled survey.
+
+        :param source: The `(survey_id, inst_id, pattern)` of the file it was loaded from.
+            It replaces the survey previously loaded from that file.
+
+        """
+        with self._lock:
+            self._by_source[source] = compiled
+        return compiled
+
+    def _remove(self, source):
+        with self._lock:
+            self._by_source.pop(source, None)
+
+    @staticmethod
+    def _ids(file_name):
+        survey_id, inst_id, _ = os.path.basename(file_name).split(".")
+        blank_ids = Survey.Identifiers(*[None] * len(Survey.Identifiers._fields))
+        return blank_ids._replace(survey_id=survey_id, inst_id=inst_id)
+
+    @staticmethod
+    def _scan(pattern):
+        """Return the modification time of every survey definition file by name."""
+        sources = {}
+        for file_name in glob.glob(pattern.format(survey_id="*", inst_id="*")):
+            try:
+                sources[file_name] = os.stat(file_name).st_mtime_ns
+            except FileNotFoundError:
+                continue
+        return sources
+
+    def load_all(self, pattern=Survey.file_pattern, precompiled=None):
+        """Load and compile every survey definition matching `pattern`.
+
+        Parsed definitions are interned so near identical instruments share memory.
+        The definitions are placed in the :py:meth:`Survey.load_survey` cache, so
+        later requests are served from it and find the compiled lookups here.
+
+        :param dict precompiled: Compiled surveys by file name, as read by
+            :py:func:`transform.transformers.survey_artifact.load`. These are used in
+            place of parsing the JSON.
+        :returns: The number of definitions loaded.
+
+        A file which cannot be parsed is logged and skipped, so only requests for that
+        survey fail, and it is tried again by the next :py:meth:`reload`.
+
+        """
+        start = time.perf_counter()
+        precompiled = precompiled or {}
+        interner = DefinitionInterner()
+        sources = self._scan(pattern)
+        count = 0
+        failed = []
+        for file_name in sorted(sources):
+            ids = self._ids(file_name)
+            if file_name in precompiled:
+                compiled = precompiled[file_name]
+            else:
+                try:
+                    compiled = CompiledSurvey(interner.intern(Survey.read_survey(file_name)), interner)
+                except Exception:
+                    logger.exception("Could not load survey definition", file=file_name)
+                    failed.append(file_name)
+                    continue
+            self.add(compiled, (ids.survey_id, ids.inst_id, pattern))
+            Survey.cache_survey(ids, compiled.definition, pattern)
+            count += 1
+        for file_name in failed:
+            del sources[file_name]
+        self._sources[pattern] = sources
+
+        logger.info("Loaded survey definitions", count=count, precompiled=len(precompiled), failed=failed,
+                    duration_ms=round((time.perf_counter() - start) * 1000, 1), **interner.report())
+        return count
+
+    def reload(self, pattern=Survey.file_pattern):
+        """Pick up survey definitions which were added, changed or removed since the last load.
+
+        The new definitions are parsed and compiled first and then swapped into the
+        :py:meth:`Survey.load_survey` cache in one step. Requests already in flight keep
+        the definitions they started with. A file which cannot be parsed is reported as
+        failed and its previous definition stays in use.
+
+        :rtype: :py:attr:`SurveyRegistry.ReloadReport`
+
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            previous = self._sources.get(pattern, {})
+            current = self._scan(pattern)
+
+            added = sorted(set(current) - set(previous))
+            removed = sorted(set(previous) - set(current))
+            changed = sorted(f for f in set(current) & set(previous) if current[f] != previous[f])
+            if not (added or changed or removed):
+                return self.ReloadReport([], [], [], [], round((time.perf_counter() - start) * 1000, 1))
+
+            # Share structure with the definitions in use rather than with ones since replaced
+            interner = DefinitionInterner()
+            with self._lock:
+                live = list(self._by_source.values())
+            for compiled_survey in live:
+                interner.seed(compiled_survey.definition)
+                interner.seed(compiled_survey.model)
+
+            entries = {}
+            compiled = {}
+            failed = []
+            for file_name in added + changed:
+                ids = self._ids(file_name)
+                try:
+                    definition = interner.intern(Survey.read_survey(file_name))
+                    compiled_survey = CompiledSurvey(definition, interner)
+                except Exception:
+                    logger.exception("Could not reload survey definition", file=file_name)
+                    failed.append(file_name)
+                    current[file_name] = previous.get(file_name)
+                    continue
+                compiled[(ids.survey_id, ids.inst_id, pattern)] = compiled_survey
+                entries[(ids.survey_id, ids.inst_id, pattern)] = (current[file_name], compiled_survey.definition)
+
+            removed_keys = [(ids.survey_id, ids.inst_id, pattern) for ids in map(self._ids, removed)]
+            survey_cache.update(entries, removed_keys)
+            for source, compiled_survey in compiled.items():
+                self.add(compiled_survey, source)
+            for source in removed_keys:
+                self._remove(source)
+            self._sources[pattern] = {k: v for k, v in current.items() if v is not None}
+
+            report = self.ReloadReport(
+                [f for f in added if f not in failed],
+                [f for f in changed if f not in failed],
+                removed,
+                failed,
+                round((time.perf_counter() - start) * 1000, 1),
+            )
+
+        if added or changed or removed:
+            logger.info("Reloaded survey definitions", **report._asdict())
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._by_source.clear()
+            self._others.clear()
+        self._sources.clear()
+
+    def __len__(self):
+        return len(self._by_source) + len(self._others)
+
+
+survey_registry = SurveyRegistry()
+
+
+class SurveyWatcher(threading.Thread):
+    """A background thread which reloads survey definitions when they change.
+
+    The registry is checked every `interval` seconds, if one is given, and whenever
+    :py:meth:`trigger` is called, for example from a SIGHUP handler. Reloads run on
+    this thread so a signal never interrupts a request part way through the cache.
+
+    """
+
+    def __init__(self, registry, interval=None, pattern=Survey.file_pattern):
+        super().__init__(name="survey-watcher", daemon=True)
+        self.registry = registry
+        self.interval = interval or None
+        self.pattern = pattern
+        self._wake = threading.Event()
+
+    def trigger(self):
+        """Request a reload as soon as possible."""
+        self._wake.set()
+
+    def install_signal_handler(self, signum=signal.SIGHUP):
+        """Trigger a reload when this process receives `signum`."""
+        signal.signal(signum, lambda *args: self.trigger())
+
+    def run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.registry.reload(self.pattern)
+            except Exception:
+                logger.exception("Survey reload failed")
@@ -7,6 +7,8 @@ from structlog import wrap_logger
 
 from transform.settings import SDX_FTP_IMAGE_PATH, SDX_FTP_DATA_PATH, SDX_FTP_RECEIPT_PATH, SDX_RESPONSE_JSON_PATH
 from transform.transformers import ImageTransformer
+from transform.transformers.in_memory_zip import StreamingZip
+from transform.transformers.response_context import ResponseContext
 from transform.transformers.survey import Survey
 from transform.utilities.formatter import Formatter
 
@@ -27,8 +29,10 @@ class SurveyTransformer(ABC):
         self.logger = logger
         self.ids = Survey.identifiers(response, seq_nr=sequence_no)
         self.survey = Survey.load_survey(self.ids)
+        self.context = ResponseContext(response, self.ids)
         self.image_transformer = ImageTransformer(self.logger, self.survey, self.response,
-                                                  sequence_no=self.sequence_no, base_image_path=SDX_FTP_IMAGE_PATH)
+                                                  sequence_no=self.sequence_no, base_image_path=SDX_FTP_IMAGE_PATH,
+                                                  context=self.context)
 
     @abstractmethod
     def create_pck(self):
@@ -54,25 +58,46 @@ class SurveyTransformer(ABC):
 
     def _create_images(self, img_seq=None):
         """
-        Create the image files within the zip.
+        Create the image files within the zip, yielding after each one.
         """
-        self.image_transformer.get_zipped_images(img_seq)
+        return self.image_transformer.append_images(img_seq)
 
     def get_zip(self, img_seq=None):
+        for _ in self._append_files(img_seq):
+            pass
+
+        self.logger.info("Built zip", tx_id=self.ids.tx_id, **self.image_transformer.zip.stats())
+        return self.image_transformer.get_zip()
+
+    def stream_zip(self, img_seq=None):
+        """
+        Yield the zip in pieces, each image as soon as it is made and the central directory last.
+        Nothing is yielded until the first image is made, so most failures happen before the first byte.
+        """
+        zip_file = self.image_transformer.zip = StreamingZip()
+        for _ in self._append_files(img_seq):
+            data = zip_file.take()
+            if data:
+                yield data
+
+        zip_file.close()
+        self.logger.info("Streamed zip", tx_id=self.ids.tx_id, **zip_file.stats())
+        yield zip_file.take()
+
+    def _append_files(self, img_seq=None):
+        """Append the files to the zip, yielding after each image"""
+        zip_file = self.image_transformer.zip
 
         pck_name, pck = self.create_pck()
         if pck is not None:
-            self.image_transformer.zip.append(os.path.join(SDX_FTP_DATA_PATH, pck_name), pck)
+            zip_file.append(os.path.join(SDX_FTP_DATA_PATH, pck_name), pck, kind="data")
 
         receipt_name, receipt = self.create_receipt()
         if receipt is not None:
-            self.image_transformer.zip.append(os.path.join(SDX_FTP_RECEIPT_PATH, receipt_name), receipt)
+            zip_file.append(os.path.join(SDX_FTP_RECEIPT_PATH, receipt_name), receipt, kind="receipt")
 
-        self._create_images(img_seq)
+        yield from self._create_images(img_seq)
 
         # add original json to zip
         response_json_name = Formatter.response_json_name(self.ids.survey_id, self.ids.tx_id)
-        self.image_transformer.zip.append(os.path.join(SDX_RESPONSE_JSON_PATH, response_json_name),
-                                          json.dumps(self.response))
-
-        return self.image_transformer.get_zip()
+        zip_file.append(os.path.join(SDX_RESPONSE_JSON_PATH, response_json_name), json.dumps(self.response), kind="json")
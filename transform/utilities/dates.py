@@ -0,0 +1,303 @@
+import datetime
+import functools
+import re
+
+import dateutil.parser
+import dateutil.tz
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+__doc__ = """
+Date and time helpers shared by the transformers.
+"""
+
+#: The number of distinct values :py:func:`parse_timestamp` remembers.
+PARSE_CACHE_SIZE = 1024
+
+_utc = datetime.timezone.utc
+
+_date_time = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})")
+_zulu = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})Z")
+_fraction_offset = re.compile(r"\.(\d{1,6})([+-])(\d{2}):?([0-5]\d)")
+_iso_date = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_diary_date = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+_period = re.compile(r"(\d{4})(\d{2})")
+_iso_datetime = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(?:(Z)|([+-])(\d{2}):?(\d{2}))?"
+)
+
+_months = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+#: The timezone dates are shown in unless another is given.
+LOCAL_TIMEZONE = "Europe/London"
+
+#: `DD/MM/YYYY HH:mm:ss`, for example `12/03/2016 10:39:40`.
+LONG_FORMAT = "{0.day:02d}/{0.month:02d}/{0.year:04d} {0.hour:02d}:{0.minute:02d}:{0.second:02d}"
+
+#: `YYYYMMDD`, for example `20160312`.
+SHORT_FORMAT = "{0.year:04d}{0.month:02d}{0.day:02d}"
+
+#: `DD MMMM YYYY HH:mm:ss`, for example `12 March 2016 10:39:40`.
+LOCALISED_FORMAT = "{0.day:02d} {1} {0.year:04d} {0.hour:02d}:{0.minute:02d}:{0.second:02d}"
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_timestamp(text):
+    """Parse a text field for a date or timestamp.
+
+    Date and time formats vary across surveys. The supported formats are, in order
+    of precedence:
+
+    * `2017-01-11T17:18:53Z`, a UTC datetime.
+    * `2017-01-11T17:18:53.020222+00:00`, a datetime with a UTC offset.
+    * `2017-01-11T17:18:53`, a naive datetime, ignoring anything after a `.`.
+    * `2017-01-11`, a date.
+    * `11/01/2017`, a date.
+    * `201701`, the first day of a month.
+
+    The common zero padded forms are recognised by their shape and built with
+    `fromisoformat`, or on Python 3.6, which has no `fromisoformat`, from the fields
+    matched by a regular expression. Anything else goes through the equivalent
+    `strptime` formats, which also accept unpadded fields, so the result is the same
+    either way. Results are memoised, as
+    the same values recur within and across submissions.
+
+    :param str text: The date or timestamp value.
+    :rtype: Python date or datetime, or None if the value is empty or not recognised.
+    :raises ValueError: If the value ends in `Z` but is not a UTC datetime.
+
+    """
+    if not text:
+        return None
+
+    try:
+        rv = _parse_known_format(text)
+    except ValueError:
+        rv = None
+    return rv if rv is not None else _parse_with_strptime(text)
+
+
+def _is_iso_datetime(text):
+    """Whether `text` starts with a zero padded `YYYY-MM-DDTHH:MM:SS`, judged by its separators."""
+    if len(text) < 19:
+        return False
+    return text[4] == "-" and text[7] == "-" and text[10] == "T" and text[13] == ":" and text[16] == ":"
+
+
+def _parse_iso_format(text):
+    """Build the value with `fromisoformat` for the zero padded formats, or return None.
+
+    `fromisoformat` accepts more than the `strptime` formats do, and more again from
+    Python 3.11, so it is only given text of the shapes both read the same way.
+
+    """
+    length = len(text)
+
+    if _is_iso_datetime(text):
+        rest = text[19:]
+        if not rest:
+            return datetime.datetime.fromisoformat(text)
+        if rest == "Z":
+            return datetime.datetime.fromisoformat(text[:19]).replace(tzinfo=_utc)
+        if rest[0] == ".":
+            # `.fff` or `.ffffff`, then `+HH:MM` or `-HH:MM`
+            if len(rest) in (10, 13) and rest[-6] in "+-" and rest[-3] == ":":
+                return datetime.datetime.fromisoformat(text)
+            if not any(c in rest for c in "+-Z"):
+                # Without an offset only the part before the "." is used
+                return datetime.datetime.fromisoformat(text[:19])
+        return None
+
+    if length == 10 and text[4] == "-" and text[7] == "-":
+        return datetime.date.fromisoformat(text)
+
+    return _parse_other_dates(text)
+
+
+def _parse_by_shape(text):
+    """Build the value directly for the zero padded formats, or return None."""
+    length = len(text)
+
+    if length == 20:
+        match = _zulu.fullmatch(text)
+        if match:
+            return datetime.datetime(*map(int, match.groups()), tzinfo=_utc)
+
+    if length >= 19:
+        match = _date_time.match(text)
+        if match:
+            rest = text[19:]
+            if not rest:
+                return datetime.datetime(*map(int, match.groups()))
+            if rest[0] == ".":
+                offset = _fraction_offset.fullmatch(rest)
+                if offset:
+                    fraction, sign, hours, minutes = offset.groups()
+                    delta = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+                    tz = _utc if not delta else datetime.timezone(-delta if sign == "-" else delta)
+                    return datetime.datetime(*map(int, match.groups()), int(fraction.ljust(6, "0")), tzinfo=tz)
+                if not any(c in rest for c in "+-Z"):
+                    # Without an offset only the part before the "." is used
+                    return datetime.datetime(*map(int, match.groups()))
+        return None
+
+    if length == 10:
+        match = _iso_date.fullmatch(text)
+        if match:
+            return datetime.date(*map(int, match.groups()))
+
+    return _parse_other_dates(text)
+
+
+def _parse_other_dates(text):
+    """Build the value directly for the zero padded dates which are not ISO 8601, or return None."""
+    length = len(text)
+
+    if length == 10:
+        match = _diary_date.fullmatch(text)
+        if match:
+            day, month, year = map(int, match.groups())
+            return datetime.date(year, month, day)
+
+    if length == 6:
+        match = _period.fullmatch(text)
+        if match:
+            return datetime.date(*map(int, match.groups()), 1)
+
+    return None
+
+
+# fromisoformat is only in Python 3.7 and later, and runtime.txt still names 3.6
+_parse_known_format = _parse_iso_format if hasattr(datetime.datetime, "fromisoformat") else _parse_by_shape
+
+
+def _parse_with_strptime(text):
+    """Try each supported format in turn with `strptime`."""
+    cls = datetime.datetime
+
+    if text.endswith("Z"):
+        return cls.strptime(text, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=_utc)
+
+    try:
+        return cls.strptime(text, "%Y-%m-%dT%H:%M:%S.%f%z")
+    except ValueError:
+        pass
+
+    try:
+        return cls.strptime(text.partition(".")[0], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        pass
+
+    try:
+        return cls.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        pass
+
+    try:
+        return cls.strptime(text, "%d/%m/%Y").date()
+    except ValueError:
+        pass
+
+    if len(text) != 6:
+        return None
+
+    try:
+        return cls.strptime(text + "01", "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(name):
+    """Return the timezone called `name`, looked up once per process.
+
+    :raises ValueError: If there is no timezone called `name`.
+
+    """
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+
+    # Fall back to the copy of the database which ships with dateutil
+    tz = dateutil.tz.gettz(name)
+    if tz is None:
+        raise ValueError("Unknown timezone: {0}".format(name))
+    return tz
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_datetime(text):
+    """Parse an ISO 8601 timestamp, such as the `submitted_at` value of a submission.
+
+    Timestamps like `2016-03-12T10:39:40.123Z` or `2016-03-12T10:39:40+01:00` are
+    built directly. Anything else is handed to `dateutil.parser.parse`, so the result
+    matches it either way. Results are memoised.
+
+    :param str text: The timestamp.
+    :rtype: Python datetime, which is naive if the timestamp has no offset.
+
+    """
+    match = _iso_datetime.fullmatch(text)
+    if match is None:
+        return dateutil.parser.parse(text)
+
+    year, month, day, hour, minute, second, fraction, zulu, sign, hours, minutes = match.groups()
+    if zulu:
+        tz = _utc
+    elif sign:
+        delta = datetime.timedelta(hours=int(hours), minutes=int(minutes))
+        tz = _utc if not delta else datetime.timezone(-delta if sign == "-" else delta)
+    else:
+        tz = None
+    return datetime.datetime(
+        int(year), int(month), int(day), int(hour), int(minute), int(second),
+        int(fraction.ljust(6, "0")) if fraction else 0, tzinfo=tz
+    )
+
+
+def to_timezone(value, timezone=LOCAL_TIMEZONE):
+    """Return `value` as a datetime in `timezone`.
+
+    :param value: A datetime, date or timestamp. Values without an offset are taken to be UTC.
+    :param str timezone: The name of the timezone.
+
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    elif not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=_utc)
+    return value.astimezone(get_timezone(timezone))
+
+
+def format_datetime(value, fmt=LONG_FORMAT, timezone=LOCAL_TIMEZONE):
+    """Format `value` in `timezone`.
+
+    Timestamps given as text are memoised, as the same `submitted_at` value is
+    formatted several times while transforming a submission.
+
+    :param value: A datetime, date or timestamp. Values without an offset are taken to be UTC.
+    :param str fmt: One of the format patterns in this module.
+    :param str timezone: The name of the timezone.
+    :rtype: str
+
+    """
+    if isinstance(value, str):
+        return _format_text(value, fmt, timezone)
+    local = to_timezone(value, timezone)
+    return fmt.format(local, _months[local.month - 1])
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _format_text(text, fmt, timezone):
+    local = to_timezone(text, timezone)
+    return fmt.format(local, _months[local.month - 1])
@@ -1,16 +1,16 @@
 import os
 from jinja2 import Environment, PackageLoader
-import arrow
+
+from transform.utilities.dates import LONG_FORMAT, SHORT_FORMAT, format_datetime
 
 
 def format_date(value, style='long'):
     """convert a datetime to a different format."""
 
-    timezone = 'Europe/London'
     if style == 'short':
-        return arrow.get(value).to(timezone).format("YYYYMMDD")
+        return format_datetime(value, SHORT_FORMAT)
 
-    return arrow.get(value).to(timezone).format("DD/MM/YYYY HH:mm:ss")
+    return format_datetime(value, LONG_FORMAT)
 
 
 def statistical_unit_id_filter(value):
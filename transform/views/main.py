@@ -1,10 +1,14 @@
 import logging
 
-from flask import request, send_file, jsonify
+from flask import Response, request, send_file, jsonify
 from jinja2 import Environment, PackageLoader
 from structlog import wrap_logger
 
 from transform import app, settings
+from transform.transformers.image_cache import image_cache
+from transform.transformers.rasterisers.limits import RasterisationError, limiter
+from transform.transformers.rasterisers.pillow import render_page
+from transform.transformers.rasterisers.pool import get_pool
 from transform.transformers.survey import MissingSurveyException, MissingIdsException
 from transform.transformers.transform_selector import get_transformer
 from transform.views.logger_config import logger_initial_config
@@ -47,6 +51,18 @@ def server_error(error=None):
     return resp
 
 
+def service_unavailable(error=None):
+    logger.error("Service unavailable", error=repr(error))
+    message = {
+        'status': 503,
+        'message': "Service unavailable: " + str(error),
+    }
+    resp = jsonify(message)
+    resp.status_code = 503
+
+    return resp
+
+
 @app.route('/common-software', methods=['POST'])
 @app.route('/common-software/<sequence_no>', methods=['POST'])
 @app.route('/cora', methods=['POST'])
@@ -63,6 +79,13 @@ def transform(sequence_no=1000):
 
     try:
         transformer = get_transformer(survey_response, sequence_no)
+        if settings.ZIP_STREAMING:
+            chunks = transformer.stream_zip()
+            # Fail with the right status if the first image can't be made, before the response starts
+            first = next(chunks)
+            logger.info("Transformation has started, streaming zip file")
+            return Response(_stream(survey_response, first, chunks), mimetype='application/zip')
+
         zip_file = transformer.get_zip()
         logger.info("Transformation was a success, returning zip file")
         return send_file(zip_file, mimetype='application/zip', add_etags=False)
@@ -73,6 +96,12 @@ def transform(sequence_no=1000):
     except MissingSurveyException:
         return client_error("Unsupported survey/instrument id")
 
+    except RasterisationError as e:
+        # The images could not be made in time; the submission can be sent again later
+        logger.error("TRANSFORM:could not create images for survey", survey_id=survey_response.get("survey_id"),
+                     tx_id=survey_response.get("tx_id"), error=str(e))
+        return service_unavailable(e)
+
     except Exception as e:
         tx_id = survey_response.get("tx_id")
         survey_id = survey_response.get("survey_id")
@@ -85,3 +114,27 @@ def transform(sequence_no=1000):
 def healthcheck():
     """A simple endpoint that reports the health of the application"""
     return jsonify({'status': 'OK'})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Counters for the rasterisers of this worker, including how long rasterisations waited for a slot"""
+    counters = {
+        'rasteriser': limiter.stats(),
+        'image_cache': image_cache.stats(),
+    }
+    pool = get_pool(render_page)
+    if pool is not None:
+        counters['rasteriser_pool'] = pool.stats()
+    return jsonify(counters)
+
+
+def _stream(survey_response, first, chunks):
+    """Send the pieces of a zip, logging a failure part way through as the response can only be cut short"""
+    try:
+        yield first
+        yield from chunks
+    except Exception:
+        logger.exception("TRANSFORM:could not stream files for survey", survey_id=survey_response.get("survey_id"),
+                         tx_id=survey_response.get("tx_id"))
+        raise